@@ -1,43 +1,64 @@
 import jax.numpy as np
 from jax.scipy.linalg import cho_factor, cho_solve
 from jax.scipy.linalg import inv as inv_any
-from utils import inv, symmetric_cubature_third_order, symmetric_cubature_fifth_order, gauss_hermite
+from utils import inv, CubatureRule, PytreeModel
 pi = 3.141592653589793
 
 
-def compute_cavity(post_mean, post_cov, site_mean, site_cov, power):
+def natural_params(site_mean, site_cov, jitter=0.):
     """
-    remove local likelihood approximation  from the posterior to obtain the marginal cavity distribution
+    convert a site from moment parameters (mean, cov) to natural parameters (precision-mean, precision).
+    The sites are stored, filtered and smoothed in moment form, so the natural parameters only exist within a
+    site update, where they are computed once and shared by the cavity and the damping step
     """
-    post_precision, site_precision = inv(post_cov), inv(site_cov)
-    cav_cov = inv(post_precision - power * site_precision)  # cavity covariance
-    cav_mean = cav_cov @ (post_precision @ post_mean - power * site_precision @ site_mean)  # cavity mean
+    site_nat2 = inv(site_cov + jitter * np.eye(site_cov.shape[0]))
+    return site_nat2 @ site_mean, site_nat2
+
+
+def compute_cavity(post_mean, post_cov, site_nat1, site_nat2, power):
+    """
+    remove local likelihood approximation  from the posterior to obtain the marginal cavity distribution.
+    The site is given in natural parameters (η, Λ), such that the cavity only requires a single solve,
+        cav_cov = (P⁻¹ - aΛ)⁻¹ = (I - aPΛ)⁻¹P,  cav_mean = cav_cov(P⁻¹m - aη) = (I - aPΛ)⁻¹(m - aPη)
+    """
+    B = np.eye(post_cov.shape[0]) - power * post_cov @ site_nat2
+    rhs = np.concatenate([post_cov, post_mean - power * post_cov @ site_nat1], axis=1)
+    cav = rhs / B if B.shape == (1, 1) else np.linalg.solve(B, rhs)
+    cav_cov, cav_mean = cav[:, :-1], cav[:, -1:]
+    cav_cov = 0.5 * (cav_cov + cav_cov.T)  # cavity covariance
     return cav_mean, cav_cov
 
 
+def damp_site(site_mean, site_cov, site_nat1_prev, site_nat2_prev, damping, jitter=0.):
+    """
+    damp the site update in natural parameters, reusing the natural parameters of the previous site.
+    The damped site is returned in moment form
+    """
+    site_nat1, site_nat2 = natural_params(site_mean, site_cov, jitter)
+    site_cov = inv((1. - damping) * site_nat2_prev + damping * site_nat2 + jitter * np.eye(site_cov.shape[0]))
+    site_mean = site_cov @ ((1. - damping) * site_nat1_prev + damping * site_nat1)
+    return site_mean, site_cov
+
+
 def ensure_positive_variance(K):
     K = np.where(np.any(np.diag(K) < 0), np.diag(np.diag(K)), K)
     K = np.where(K < 0, 99., K)
     return K
 
 
-class ApproxInf(object):
+class ApproxInf(PytreeModel):
     """
     The approximate inference class.
     Each approximate inference scheme implements an 'update' method which is called during
     filtering and smoothing in order to update the local likelihood approximation (the sites).
     See the paper for derivations of each update rule.
     """
+    # the current sites are passed explicitly to the jitted filter and smoother, so are not part of the pytree
+    transient_attributes = ('site_params',)
+
     def __init__(self, site_params=None, intmethod='GH', num_cub_pts=20):
         self.site_params = site_params
-        if intmethod == 'GH':
-            self.cubature_func = lambda dim: gauss_hermite(dim, num_cub_pts)  # Gauss-Hermite
-        elif intmethod == 'UT3':
-            self.cubature_func = lambda dim: symmetric_cubature_third_order(dim)  # Unscented transform (3rd order)
-        elif (intmethod == 'UT5') or (intmethod == 'UT'):
-            self.cubature_func = lambda dim: symmetric_cubature_fifth_order(dim)  # Unscented transform (5th order)
-        else:
-            raise NotImplementedError('integration method not recognised')
+        self.cubature_func = CubatureRule(intmethod, num_cub_pts)
 
     def update(self, likelihood, y, m, v, hyp=None, site_params=None):
         raise NotImplementedError('the update function for this approximate inference method is not implemented')
@@ -65,9 +86,10 @@ class ExpectationPropagation(ApproxInf):
             site_cov = ensure_positive_variance(site_cov)
             return lml, site_mean, site_cov
         else:
-            site_mean_prev, site_cov_prev = site_params  # previous site params
+            # the natural parameters of the previous site are used for both the cavity and the damping
+            site_nat1_prev, site_nat2_prev = natural_params(*site_params)
             # --- Compute the cavity distribution ---
-            cav_mean, cav_cov = compute_cavity(post_mean, post_cov, site_mean_prev, site_cov_prev, self.power)
+            cav_mean, cav_cov = compute_cavity(post_mean, post_cov, site_nat1_prev, site_nat2_prev, self.power)
             # check that the cavity variances are positive
             cav_cov = ensure_positive_variance(cav_cov)
             # calculate log marginal likelihood and the new sites via moment matching:
@@ -75,10 +97,7 @@ class ExpectationPropagation(ApproxInf):
             site_mean, site_cov = np.atleast_2d(site_mean), np.atleast_2d(site_cov)
             site_cov = ensure_positive_variance(site_cov)
             if self.damping != 1.:
-                site_nat2, site_nat2_prev = inv(site_cov), inv(site_cov_prev)
-                site_nat1, site_nat1_prev = site_nat2 @ site_mean, site_nat2_prev @ site_mean_prev
-                site_cov = inv((1. - self.damping) * site_nat2_prev + self.damping * site_nat2)
-                site_mean = site_cov @ ((1. - self.damping) * site_nat1_prev + self.damping * site_nat1)
+                site_mean, site_cov = damp_site(site_mean, site_cov, site_nat1_prev, site_nat2_prev, self.damping)
             return lml, site_mean, site_cov
 
 
@@ -111,12 +130,14 @@ class ExtendedEP(ApproxInf):
         order Taylor series expansion) to update the site parameters
         """
         power = 1. if site_params is None else self.power
+        if (site_params is not None) and ((power != 0) or (self.damping != 1.)):
+            # the natural parameters of the previous site are used for both the cavity and the damping
+            site_nat1_prev, site_nat2_prev = natural_params(*site_params, jitter=1e-10)
         if (site_params is None) or (power == 0):  # avoid cavity calc if power is 0
             cav_mean, cav_cov = post_mean, post_cov
         else:
-            site_mean, site_cov = site_params
             # --- Compute the cavity distribution ---
-            cav_mean, cav_cov = compute_cavity(post_mean, post_cov, site_mean, site_cov, power)
+            cav_mean, cav_cov = compute_cavity(post_mean, post_cov, site_nat1_prev, site_nat2_prev, power)
         # calculate the Jacobian of the observation model w.r.t. function fₙ and noise term rₙ
         Jf, Jsigma = likelihood.analytical_linearisation(cav_mean, np.zeros_like(y), hyp)  # evaluate at mean
         obs_cov = np.eye(y.shape[0])  # observation noise scale is w.l.o.g. 1
@@ -128,15 +149,20 @@ class ExtendedEP(ApproxInf):
         site_mean = cav_mean + (site_cov + power * cav_cov) @ Jf.T @ inv(sigma) @ residual
         # now compute the marginal likelihood approx.
         sigma_marg_lik = Jsigma @ obs_cov @ Jsigma.T + Jf @ cav_cov @ Jf.T
-        chol_sigma, low = cho_factor(sigma_marg_lik)
-        log_marg_lik = -1 * (
-                .5 * site_cov.shape[0] * np.log(2 * pi)
-                + np.sum(np.log(np.diag(chol_sigma)))
-                + .5 * (residual.T @ cho_solve((chol_sigma, low), residual)))
+        if site_cov.shape == (1, 1) and sigma_marg_lik.shape == (1, 1):  # scalar f and y, so avoid the Cholesky
+            log_marg_lik = -1 * (
+                    .5 * np.log(2 * pi)
+                    + .5 * np.log(sigma_marg_lik)
+                    + .5 * residual ** 2 / sigma_marg_lik)
+        else:
+            chol_sigma, low = cho_factor(sigma_marg_lik)
+            log_marg_lik = -1 * (
+                    .5 * site_cov.shape[0] * np.log(2 * pi)
+                    + np.sum(np.log(np.diag(chol_sigma)))
+                    + .5 * (residual.T @ cho_solve((chol_sigma, low), residual)))
         if (site_params is not None) and (self.damping != 1.):
-            site_mean_prev, site_cov_prev = site_params  # previous site params
-            site_nat2_prev = inv(site_cov_prev + 1e-10 * np.eye(Jf.shape[1]))
-            site_nat1, site_nat1_prev = site_nat2 @ site_mean, site_nat2_prev @ site_mean_prev
+            # the linearised site is already available in natural parameters, so only the damped site is inverted
+            site_nat1 = site_nat2 @ site_mean
             site_cov = inv((1. - self.damping) * site_nat2_prev + self.damping * site_nat2 + 1e-10 * np.eye(Jf.shape[1]))
             site_mean = site_cov @ ((1. - self.damping) * site_nat1_prev + self.damping * site_nat1)
         return log_marg_lik, site_mean, site_cov
@@ -193,29 +219,28 @@ class StatisticallyLinearisedEP(ApproxInf):
         """
         power = 1. if site_params is None else self.power
         log_marg_lik, _, _ = likelihood.moment_match(y, post_mean, post_cov, hyp, 1.0, self.cubature_func)
+        if (site_params is not None) and ((power != 0) or (self.damping != 1.)):
+            # the natural parameters of the previous site are used for both the cavity and the damping
+            site_nat1_prev, site_nat2_prev = natural_params(*site_params, jitter=1e-10)
         if (site_params is None) or (power == 0):
             cav_mean, cav_cov = post_mean, post_cov
         else:
-            site_mean_prev, site_cov_prev = site_params  # previous site params
             # --- Compute the cavity distribution ---
-            cav_mean, cav_cov = compute_cavity(post_mean, post_cov, site_mean_prev, site_cov_prev, power)
+            cav_mean, cav_cov = compute_cavity(post_mean, post_cov, site_nat1_prev, site_nat2_prev, power)
         # SLR gives a likelihood approximation p(yₙ|fₙ) ≈ 𝓝(yₙ|Afₙ+b,Ω+Var[yₙ|fₙ])
         mu, S, C, omega = likelihood.statistical_linear_regression(cav_mean, cav_cov, hyp, self.cubature_func)
         # convert to a Gaussian site (a function of fₙ):
         residual = y - mu
         sigma = S + (power - 1) * C.T @ inv(cav_cov + 1e-10 * np.eye(cav_cov.shape[0])) @ C
-        om_sig_om = omega.T @ inv(sigma) @ omega
+        sigma_inv = inv(sigma)
+        om_sig_om = omega.T @ sigma_inv @ omega
         om_sig_om = np.diag(np.diag(om_sig_om))  # discard cross terms
         osigo = inv(om_sig_om + 1e-10 * np.eye(omega.shape[1]))
-        site_mean = cav_mean + osigo @ omega.T @ inv(sigma) @ residual  # approx. likelihood (site) mean
+        site_mean = cav_mean + osigo @ omega.T @ sigma_inv @ residual  # approx. likelihood (site) mean
         site_cov = -power * cav_cov + osigo  # approx. likelihood var.
         if (site_params is not None) and (self.damping != 1.):
-            site_mean_prev, site_cov_prev = site_params  # previous site params
-            jitter = 1e-10 * np.eye(site_cov.shape[0])
-            site_nat2, site_nat2_prev = inv(site_cov + jitter), inv(site_cov_prev + jitter)
-            site_nat1, site_nat1_prev = site_nat2 @ site_mean, site_nat2_prev @ site_mean_prev
-            site_cov = inv((1. - self.damping) * site_nat2_prev + self.damping * site_nat2 + jitter)
-            site_mean = site_cov @ ((1. - self.damping) * site_nat1_prev + self.damping * site_nat1)
+            site_mean, site_cov = damp_site(site_mean, site_cov, site_nat1_prev, site_nat2_prev, self.damping,
+                                            jitter=1e-10)
         return log_marg_lik, site_mean, site_cov
 
 
@@ -0,0 +1,95 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+from jax.experimental import optimizers
+import time
+from sde_gp import CrossValidatedSDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+import pickle
+
+# all 10 folds of the cross-validation in coal.py, trained and evaluated together in a single compiled pass
+
+print('loading coal data ...')
+cvind = np.loadtxt('cvind.csv').astype(int)
+# 10-fold cross-validation
+nt = np.floor(cvind.shape[0]/10).astype(int)
+cvind = cvind[:10*nt]
+
+D = np.loadtxt('binned.csv')
+x = D[cvind, 0:1]  # the inputs used in the cross-validation, with the folds indexing into them
+y = D[cvind, 1:]
+folds = np.reshape(np.arange(10*nt), (10, nt))
+
+np.random.seed(123)
+
+if len(sys.argv) > 1:
+    method = int(sys.argv[1])
+else:
+    method = 0
+
+print('method number', method)
+
+var_f = 1.0  # GP variance
+len_f = 1.0  # GP lengthscale
+
+prior = priors.Matern52(variance=var_f, lengthscale=len_f)
+lik = likelihoods.Poisson()
+
+if method == 0:
+    inf_method = approx_inf.EEP(power=1)
+elif method == 1:
+    inf_method = approx_inf.EEP(power=0.5)
+elif method == 2:
+    inf_method = approx_inf.EKS()
+
+elif method == 3:
+    inf_method = approx_inf.UEP(power=1)
+elif method == 4:
+    inf_method = approx_inf.UEP(power=0.5)
+elif method == 5:
+    inf_method = approx_inf.UKS()
+
+elif method == 6:
+    inf_method = approx_inf.GHEP(power=1)
+elif method == 7:
+    inf_method = approx_inf.GHEP(power=0.5)
+elif method == 8:
+    inf_method = approx_inf.GHKS()
+
+elif method == 9:
+    inf_method = approx_inf.EP(power=1, intmethod='UT')
+elif method == 10:
+    inf_method = approx_inf.EP(power=0.5, intmethod='UT')
+elif method == 11:
+    inf_method = approx_inf.EP(power=0.01, intmethod='UT')
+
+elif method == 12:
+    inf_method = approx_inf.EP(power=1, intmethod='GH')
+elif method == 13:
+    inf_method = approx_inf.EP(power=0.5, intmethod='GH')
+elif method == 14:
+    inf_method = approx_inf.EP(power=0.01, intmethod='GH')
+
+elif method == 15:
+    inf_method = approx_inf.VI(intmethod='UT')
+elif method == 16:
+    inf_method = approx_inf.VI(intmethod='GH')
+
+model = CrossValidatedSDEGP(prior=prior, likelihood=lik, t=x, y=y, folds=folds, approx_inf=inf_method)
+
+opt_init, opt_update, get_params = optimizers.adam(step_size=2.5e-1)
+
+print('optimising the hyperparameters of all folds ...')
+t0 = time.time()
+nlpd = model.cross_validate(optimiser=(opt_init, opt_update, get_params), num_iters=250, chunk_size=250,
+                            verbose=True)
+t1 = time.time()
+print('cross-validation time (including compilation): %2.2f secs' % (t1-t0))
+print('NLPD of each fold:', np.array(nlpd))
+print('mean NLPD: %1.2f' % np.mean(nlpd))
+
+for fold in range(10):
+    with open("output/" + str(method) + "_" + str(fold) + "_nlpd.txt", "wb") as fp:
+        pickle.dump(nlpd[fold], fp)
@@ -9,6 +9,7 @@ from numpy import pi
 from scipy.io import loadmat
 import time
 import pickle
+import resource
 
 print('loading data ...')
 y = loadmat('../audio/speech_female')['y']
@@ -95,6 +96,12 @@ time_taken = np.mean(time_taken)
 with open("output/audio_" + str(method) + ".txt", "wb") as fp:
     pickle.dump(time_taken, fp)
 
+peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak resident set size (MB)
+print('peak memory usage: %2.2f MB' % peak_memory)
+
+with open("output/audio_" + str(method) + "_memory.txt", "wb") as fp:
+    pickle.dump(peak_memory, fp)
+
 # with open("output/audio_" + str(method) + ".txt", "rb") as fp:
 #     time_taken = pickle.load(fp)
 # print(time_taken)
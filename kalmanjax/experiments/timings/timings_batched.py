@@ -0,0 +1,76 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+from sde_gp import SDEGP, BatchedSDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+from jax.experimental import optimizers
+import time
+import pickle
+
+# throughput (series per second) of hyperparameter optimisation for a batch of independent time series, comparing
+# a Python loop over one SDEGP model per series with a single BatchedSDEGP model, which filters and smooths all of
+# the series in one vmapped call. each series has its own hyperparameters.
+
+num_series_list = [10, 100, 1000]
+
+if len(sys.argv) > 1:
+    method = int(sys.argv[1])
+else:
+    method = 0
+
+batched = method % 2 == 1
+num_series = num_series_list[method // 2]
+print('number of series:', num_series, ', batched:', batched)
+
+np.random.seed(123)
+N = 200
+num_iters = 20
+t = np.sort(100 * np.random.rand(num_series, N, 1), axis=1)
+f = np.sin(t / np.random.uniform(2., 10., [num_series, 1, 1]))
+y = f + 0.2 * np.random.randn(num_series, N, 1)
+y[::3, -N // 10:] = np.nan  # some of the series are shorter than the others
+
+opt_init, opt_update, get_params = optimizers.adam(step_size=5e-2)
+
+
+def build(t_, y_, batch=False):
+    prior = priors.Matern32(variance=1., lengthscale=5.)
+    lik = likelihoods.Gaussian(variance=0.1)
+    inf_method = approx_inf.EP(power=0.5)
+    if batch:
+        return BatchedSDEGP(prior=prior, likelihood=lik, t=t_, y=y_, approx_inf=inf_method, shared_hyp=False)
+    return SDEGP(prior=prior, likelihood=lik, t=t_, y=y_, approx_inf=inf_method)
+
+
+def gradient_step(i, state, mod):
+    params = get_params(state)
+    mod.prior.hyp = params[0]
+    mod.likelihood.hyp = params[1]
+    neg_log_marg_lik, gradients = mod.run()
+    return opt_update(i, gradients, state)
+
+
+if batched:
+    models = [build(t, y, batch=True)]
+else:
+    models = []
+    for b in range(num_series):
+        observed = ~np.isnan(y[b, :, 0])
+        models.append(build(t[b][observed], y[b][observed]))
+opt_states = [opt_init([model.prior.hyp, model.likelihood.hyp]) for model in models]
+
+# the first step initialises the sites and compiles the filter and smoother
+opt_states = [gradient_step(0, opt_state, model) for opt_state, model in zip(opt_states, models)]
+t0 = time.time()
+for j in range(num_iters):
+    opt_states = [gradient_step(j, opt_state, model) for opt_state, model in zip(opt_states, models)]
+get_params(opt_states[-1])[0].block_until_ready()
+t1 = time.time()
+
+series_per_sec = num_series * num_iters / (t1 - t0)
+print('optimisation throughput: %2.2f series per second' % series_per_sec)
+
+with open("output/batched_" + str(method) + ".txt", "wb") as fp:
+    pickle.dump([num_series, batched, series_per_sec], fp)
@@ -0,0 +1,75 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+from sde_gp import SDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+from numpy import pi
+from scipy.io import loadmat
+import time
+import pickle
+import resource
+
+# wall-clock time and peak memory of a single model.run() on the audio task, against the number of steps per
+# checkpointed segment of the filter (None stores every step, 'sqrt' uses √N steps per segment).
+# the energy is stored too, so that the results can be checked against the unsegmented filter.
+
+segment_length_list = [None, 'sqrt', 10000, 1000, 100]
+
+if len(sys.argv) > 1:
+    method = int(sys.argv[1])
+else:
+    method = 0
+
+segment_length = segment_length_list[method]
+print('steps per segment:', segment_length)
+
+print('loading data ...')
+y = loadmat('../audio/speech_female')['y']
+fs = 44100  # sampling rate (Hz)
+scale = 1000  # convert to milliseconds
+
+normaliser = 0.5 * np.sqrt(np.var(y))
+y = y / normaliser  # rescale the data
+
+N = y.shape[0]
+x = np.linspace(0., N, num=N) / fs * scale  # arbitrary evenly spaced inputs inputs
+
+fundamental_freq = 220  # Hz
+radial_freq = 2 * pi * fundamental_freq / scale  # radial freq = 2pi * f / scale
+sub1 = priors.SubbandExponentialFixedVar(variance=.1, lengthscale=75., radial_frequency=radial_freq)
+sub2 = priors.SubbandExponentialFixedVar(variance=.1, lengthscale=75., radial_frequency=2 * radial_freq)  # 1st harmonic
+sub3 = priors.SubbandExponentialFixedVar(variance=.1, lengthscale=75., radial_frequency=3 * radial_freq)  # 2nd harmonic
+mod1 = priors.Matern52FixedVar(variance=.5, lengthscale=10.)
+mod2 = priors.Matern52FixedVar(variance=.5, lengthscale=10.)
+mod3 = priors.Matern52FixedVar(variance=.5, lengthscale=10.)
+
+prior = priors.Independent([sub1, sub2, sub3, mod1, mod2, mod3])
+
+lik = likelihoods.AudioAmplitudeDemodulation(variance=0.3)
+inf_method = approx_inf.EEP(power=1, damping=0.05)
+
+model = SDEGP(prior=prior, likelihood=lik, t=x, y=y, approx_inf=inf_method, segment_length=segment_length)
+
+# the first two calls initialise the sites and compile the filter and smoother
+neg_log_marg_lik, gradients = model.run()
+neg_log_marg_lik, gradients = model.run()
+
+time_taken = np.zeros([5, 1])
+for j in range(5):
+    t0 = time.time()
+    neg_log_marg_lik, gradients = model.run()
+    gradients[0][0].block_until_ready()
+    t1 = time.time()
+    time_taken[j] = t1-t0
+    print('run time: %2.4f secs' % (t1-t0))
+
+time_taken = np.mean(time_taken)
+print('energy:', neg_log_marg_lik)
+
+peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak resident set size (MB)
+print('peak memory usage: %2.2f MB' % peak_memory)
+
+with open("output/checkpoint_" + str(method) + ".txt", "wb") as fp:
+    pickle.dump([segment_length, time_taken, peak_memory, float(neg_log_marg_lik)], fp)
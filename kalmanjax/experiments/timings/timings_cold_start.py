@@ -0,0 +1,58 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+from sde_gp import SDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+import time
+import pickle
+
+# the time to build a model and take its first optimisation step, for each of the 10 cross-validation folds of the
+# coal mining data. a new model, prior, likelihood and approximate inference object is built for every fold, as in
+# the experiments. the first fold pays the compilation cost; the others should reuse the compiled filter and smoother.
+
+if len(sys.argv) > 1:
+    method = int(sys.argv[1])
+else:
+    method = 0
+
+print('method number', method)
+
+print('loading coal data ...')
+cvind = np.loadtxt('../coal/cvind.csv').astype(int)
+# 10-fold cross-validation
+nt = np.floor(cvind.shape[0]/10).astype(int)
+cvind = np.reshape(cvind[:10*nt], (10, nt))
+
+D = np.loadtxt('../coal/binned.csv')
+x = D[:, 0:1]
+y = D[:, 1:]
+
+time_taken = np.zeros([10, 1])
+for fold in range(10):
+    t0 = time.time()
+    ind_test = cvind[fold, :]
+    ind_train = np.setdiff1d(cvind, ind_test)
+
+    prior = priors.Matern52(variance=1.0, lengthscale=1.0)
+    lik = likelihoods.Poisson()
+    if method == 0:
+        inf_method = approx_inf.EEP(power=1)
+    elif method == 1:
+        inf_method = approx_inf.EP(power=0.5, intmethod='GH')
+    elif method == 2:
+        inf_method = approx_inf.VI(intmethod='UT')
+
+    model = SDEGP(prior=prior, likelihood=lik, t=x[ind_train], y=y[ind_train], t_test=x[ind_test],
+                  y_test=y[ind_test], approx_inf=inf_method)
+    neg_log_marg_lik, gradients = model.run()
+    gradients[0][0].block_until_ready()
+    t1 = time.time()
+    time_taken[fold] = t1-t0
+    print('fold %d: build + first step time: %2.4f secs' % (fold, t1-t0))
+
+print('first fold: %2.4f secs, mean of remaining folds: %2.4f secs' % (time_taken[0], np.mean(time_taken[1:])))
+
+with open("output/cold_start_" + str(method) + ".txt", "wb") as fp:
+    pickle.dump(time_taken, fp)
@@ -0,0 +1,75 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+import time
+from sde_gp import SDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+import pickle
+import resource
+pi = 3.141592653589793
+
+# wall-clock time and peak memory of a single model.run() against the number of time steps N on a regression task,
+# when the sites are
+#  0: computed by EP, stored, and updated during the smoother (the default)
+#  1: the exact conjugate sites, i.e. each step is a single differentiated filtering pass
+# before timing, the conjugate energy and gradients are checked on the smallest dataset against those of a fresh
+# model with EP sites, for which the (exact) Gaussian sites are computed, and differentiated, within the filter.
+
+if len(sys.argv) > 1:
+    conjugate = bool(int(sys.argv[1]))
+else:
+    conjugate = False
+
+print('conjugate:', conjugate)
+
+N_list = [1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000]
+var_f = 1.0  # GP variance
+len_f = 5.0  # GP lengthscale
+var_y = 0.5  # observation noise
+
+
+def build_model(N, conj):
+    np.random.seed(12345)
+    x = np.sort(np.random.permutation(np.linspace(-25.0, 150.0, num=N) + 0.5 * np.random.randn(N)))
+    y = np.cos(0.04 * x + 0.33 * pi) * np.sin(0.2 * x) + np.math.sqrt(0.15) * np.random.normal(0, 1, x.shape)
+    prior = priors.Matern52(variance=var_f, lengthscale=len_f)
+    lik = likelihoods.Gaussian(variance=var_y)
+    inf_method = approx_inf.EP(power=0.5)
+    return SDEGP(prior=prior, likelihood=lik, t=x, y=y, approx_inf=inf_method, conjugate=conj)
+
+
+print('checking the conjugate energy and gradients against a fresh model ...')
+energy_exact, gradients_exact = build_model(N_list[0], False).neg_log_marg_lik()
+energy_conj, gradients_conj = build_model(N_list[0], True).run()
+energy_error = abs(float(energy_exact) - float(energy_conj))
+gradient_error = max(np.max(np.abs(np.array(g1) - np.array(g2)))
+                     for g1, g2 in zip(gradients_exact, gradients_conj))
+print('abs difference in the energy: %1.2e, max abs difference in the gradients: %1.2e'
+      % (energy_error, gradient_error))
+
+time_taken = np.zeros([len(N_list), 1])
+for i, N in enumerate(N_list):
+    print('generating some data, N =', N, '...')
+    model = build_model(N, conjugate)
+
+    # the first two calls initialise the sites and compile the filter and smoother
+    neg_log_marg_lik, gradients = model.run()
+    neg_log_marg_lik, gradients = model.run()
+
+    run_times = np.zeros([5, 1])
+    for j in range(5):
+        t0 = time.time()
+        neg_log_marg_lik, gradients = model.run()
+        gradients[0].block_until_ready()
+        t1 = time.time()
+        run_times[j] = t1 - t0
+    time_taken[i] = np.mean(run_times)
+    print('N = %d, run time: %2.4f secs' % (N, time_taken[i]))
+
+peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak resident set size (MB)
+print('peak memory usage: %2.2f MB' % peak_memory)
+
+with open("output/conjugate_" + str(int(conjugate)) + ".txt", "wb") as fp:
+    pickle.dump([N_list, time_taken, peak_memory, energy_error, gradient_error], fp)
@@ -0,0 +1,70 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+import time
+from sde_gp import SDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+from utils import discretegrid
+import pickle
+import resource
+
+# wall-clock time of a single model.run() against the number of spatial grid points, on the rainforest grids used in
+# notebooks/2d_log_gaussian_cox_process.py, with a Gaussian likelihood on the binned counts, for
+#  0: the dense filter / smoother
+#  1: the Kronecker-structured filter / smoother
+#  2: the decoupled spatial eigenbasis filter / smoother
+# all three use the exact sites of the conjugate mode, which the decoupled engine requires, so the energy is stored
+# too, so that the three methods can be checked against each other.
+
+if len(sys.argv) > 1:
+    method = int(sys.argv[1])
+else:
+    method = 0
+
+print('method number', method)
+
+print('loading rainforest data ...')
+data = np.loadtxt('../../../data/TRI2TU-data.csv', delimiter=',')
+
+nr_list = [10, 25, 50, 100]  # spatial grid points (y-axis), the notebook uses nr=100
+nt = 200  # temporal grid points (x-axis)
+
+var_f = 1  # GP variance
+len_f = 10  # lengthscale
+var_y = 1.  # observation noise
+
+time_taken = np.zeros([len(nr_list), 1])
+energy = np.zeros([len(nr_list), 1])
+for i, nr in enumerate(nr_list):
+    print('grid size', nt, 'x', nr, '...')
+    t, r, Y = discretegrid(data, [0, 1000, 0, 500], [nt, nr])
+
+    prior = priors.SpatialMatern32(variance=var_f, lengthscale=len_f, z=r[0, ...], fixed_grid=True)
+    lik = likelihoods.Gaussian(variance=var_y)
+    inf_method = approx_inf.EP(power=0.5)
+
+    model = SDEGP(prior=prior, likelihood=lik, t=t, y=Y, r=r, approx_inf=inf_method, conjugate=True,
+                  kronecker=method == 1, decoupled=method == 2)
+
+    # the first two calls initialise the sites and compile the filter and smoother
+    neg_log_marg_lik, gradients = model.run()
+    neg_log_marg_lik, gradients = model.run()
+
+    run_times = np.zeros([5, 1])
+    for j in range(5):
+        t0 = time.time()
+        neg_log_marg_lik, gradients = model.run()
+        gradients[0].block_until_ready()
+        t1 = time.time()
+        run_times[j] = t1 - t0
+    time_taken[i] = np.mean(run_times)
+    energy[i] = neg_log_marg_lik
+    print('nr = %d, run time: %2.4f secs, energy: %2.4f' % (nr, time_taken[i], energy[i]))
+
+peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak resident set size (MB)
+print('peak memory usage: %2.2f MB' % peak_memory)
+
+with open("output/decoupled_" + str(method) + ".txt", "wb") as fp:
+    pickle.dump([nr_list, time_taken, energy, peak_memory], fp)
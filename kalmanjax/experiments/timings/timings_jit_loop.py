@@ -0,0 +1,71 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+from sde_gp import SDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+from jax.experimental import optimizers
+import time
+import pickle
+
+# per-iteration wall-clock time of hyperparameter optimisation on the coal mining data, comparing the Python training
+# loop used in the experiments (model.run() + opt_update, with the energy pulled to the host every iteration) with
+# the compiled training loop (model.train), for different numbers of iterations per compiled chunk.
+
+chunk_size_list = [None, 1, 10, 50, 250]  # None = Python loop
+
+if len(sys.argv) > 1:
+    method = int(sys.argv[1])
+else:
+    method = 0
+
+chunk_size = chunk_size_list[method]
+print('iterations per chunk:', chunk_size)
+
+print('loading coal data ...')
+D = np.loadtxt('../coal/binned.csv')
+x = D[:, 0:1]
+y = D[:, 1:]
+
+num_iters = 250
+
+prior = priors.Matern52(variance=1., lengthscale=1.)
+lik = likelihoods.Poisson()
+inf_method = approx_inf.EEP(power=1)
+
+model = SDEGP(prior=prior, likelihood=lik, t=x, y=y, approx_inf=inf_method)
+
+opt_init, opt_update, get_params = optimizers.adam(step_size=5e-2)
+opt_state = opt_init([model.prior.hyp, model.likelihood.hyp])
+
+if chunk_size is None:
+    def gradient_step(i, state, mod):
+        params = get_params(state)
+        mod.prior.hyp = params[0]
+        mod.likelihood.hyp = params[1]
+        neg_log_marg_lik, gradients = mod.run()
+        print('iter %2d: nlml=%2.2f' % (i, neg_log_marg_lik))
+        return opt_update(i, gradients, state)
+
+    # the first two calls initialise the sites and compile the filter and smoother
+    opt_state = gradient_step(0, opt_state, model)
+    opt_state = gradient_step(1, opt_state, model)
+    t0 = time.time()
+    for j in range(num_iters):
+        opt_state = gradient_step(j, opt_state, model)
+    get_params(opt_state)[0][0].block_until_ready()
+    t1 = time.time()
+else:
+    # compile the chunk before timing
+    model.train(optimiser=(opt_init, opt_update, get_params), num_iters=chunk_size, chunk_size=chunk_size)
+    t0 = time.time()
+    model.train(optimiser=(opt_init, opt_update, get_params), num_iters=num_iters, chunk_size=chunk_size,
+                verbose=True)
+    t1 = time.time()
+
+time_per_iter = (t1 - t0) / num_iters
+print('time per iteration: %2.4f secs' % time_per_iter)
+
+with open("output/jit_loop_" + str(method) + ".txt", "wb") as fp:
+    pickle.dump([chunk_size, time_per_iter], fp)
@@ -0,0 +1,55 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+import time
+from sde_gp import SDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+import pickle
+pi = 3.141592653589793
+
+# wall-clock time of a single model.run() against the number of time steps N, for the sequential filter / smoother
+# and the parallel-in-time (associative scan) version. Run on a multi-core CPU to see the effect of the O(log N) span.
+
+if len(sys.argv) > 1:
+    parallel = bool(int(sys.argv[1]))
+else:
+    parallel = False
+
+print('parallel filter and smoother:', parallel)
+
+N_list = [1000, 2000, 5000, 10000, 20000, 50000, 100000]
+var_f = 1.0  # GP variance
+len_f = 5.0  # GP lengthscale
+var_y = 0.5  # observation noise
+
+time_taken = np.zeros([len(N_list), 1])
+for i, N in enumerate(N_list):
+    print('generating some data, N =', N, '...')
+    np.random.seed(12345)
+    x = np.sort(np.random.permutation(np.linspace(-25.0, 150.0, num=N) + 0.5 * np.random.randn(N)))
+    y = np.cos(0.04 * x + 0.33 * pi) * np.sin(0.2 * x) + np.math.sqrt(0.15) * np.random.normal(0, 1, x.shape)
+
+    prior = priors.Matern32(variance=var_f, lengthscale=len_f)
+    lik = likelihoods.Gaussian(variance=var_y)
+    inf_method = approx_inf.EP(power=0.5)
+
+    model = SDEGP(prior=prior, likelihood=lik, t=x, y=y, approx_inf=inf_method, parallel=parallel)
+
+    # the first two calls initialise the sites and compile the filter and smoother
+    neg_log_marg_lik, gradients = model.run()
+    neg_log_marg_lik, gradients = model.run()
+
+    run_times = np.zeros([5, 1])
+    for j in range(5):
+        t0 = time.time()
+        neg_log_marg_lik, gradients = model.run()
+        gradients[0].block_until_ready()
+        t1 = time.time()
+        run_times[j] = t1 - t0
+    time_taken[i] = np.mean(run_times)
+    print('N = %d, run time: %2.4f secs' % (N, time_taken[i]))
+
+with open("output/parallel_" + str(int(parallel)) + ".txt", "wb") as fp:
+    pickle.dump([N_list, time_taken], fp)
@@ -8,6 +8,7 @@ import priors
 import likelihoods
 from utils import discretegrid
 import pickle
+import resource
 pi = 3.141592653589793
 
 plot_intermediate = False
@@ -68,6 +69,12 @@ time_taken = np.mean(time_taken)
 with open("output/rainforest_" + str(method) + ".txt", "wb") as fp:
     pickle.dump(time_taken, fp)
 
+peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak resident set size (MB)
+print('peak memory usage: %2.2f MB' % peak_memory)
+
+with open("output/rainforest_" + str(method) + "_memory.txt", "wb") as fp:
+    pickle.dump(peak_memory, fp)
+
 # with open("output/rainforest_" + str(method) + ".txt", "rb") as fp:
 #     time_taken = pickle.load(fp)
 # print(time_taken)
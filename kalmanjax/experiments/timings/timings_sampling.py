@@ -0,0 +1,50 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+from sde_gp import SDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+import time
+import pickle
+
+# the time to draw posterior samples of the log-Gaussian Cox process on the coal mining data, for different numbers
+# of samples, comparing conditional simulation (posterior_sample: prior samples smoothed in one batched pass) with
+# forward-filtering backward-sampling (ffbs_sample: one filtering pass and one backward sampling pass).
+
+num_samps_list = [10, 100, 1000]
+sampler_list = ['conditional', 'ffbs']
+
+if len(sys.argv) > 1:
+    method = int(sys.argv[1])
+else:
+    method = 0
+
+num_samps = num_samps_list[method % 3]
+sampler = sampler_list[method // 3]
+print('number of samples:', num_samps, ', sampler:', sampler)
+
+print('loading coal data ...')
+D = np.loadtxt('../coal/binned.csv')
+x = D[:, 0:1]
+y = D[:, 1:]
+
+prior = priors.Matern52(variance=1., lengthscale=1.)
+lik = likelihoods.Poisson()
+inf_method = approx_inf.EEP(power=1)
+
+model = SDEGP(prior=prior, likelihood=lik, t=x, y=y, approx_inf=inf_method)
+for i in range(5):
+    model.run()
+
+sample = model.posterior_sample if sampler == 'conditional' else model.ffbs_sample
+# the first call compiles the sampler
+sample(num_samps, seed=0).block_until_ready()
+t0 = time.time()
+posterior_samp = sample(num_samps, seed=1)
+posterior_samp.block_until_ready()
+t1 = time.time()
+print('sampling time: %2.4f secs' % (t1-t0))
+
+with open("output/sampling_" + str(method) + ".txt", "wb") as fp:
+    pickle.dump([num_samps, sampler, t1-t0], fp)
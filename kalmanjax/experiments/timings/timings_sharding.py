@@ -0,0 +1,70 @@
+import sys
+import os
+if len(sys.argv) > 1:
+    method = int(sys.argv[1])
+else:
+    method = 0
+num_devices_list = [1, 2, 4, 8, 16, 32, 64]
+num_devices = num_devices_list[method]
+# the number of host devices must be set before jax is imported
+os.environ['XLA_FLAGS'] = '--xla_force_host_platform_device_count=' + str(num_devices)
+sys.path.insert(0, '../../')
+import numpy as np
+from sde_gp import BatchedSDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+from jax.experimental import optimizers
+import time
+import pickle
+
+# core scaling of hyperparameter optimisation for a batch of independent time series, sharded across 1 to 64 host
+# devices. the series are noisy draws from GPs with Matern-3/2 kernels of different lengthscales.
+
+print('number of devices:', num_devices)
+
+np.random.seed(123)
+num_series = 1024
+N = 200
+num_iters = 20
+t = np.tile(np.linspace(0., 100., N)[None, :, None], [num_series, 1, 1])
+y = np.zeros([num_series, N, 1])
+for b in range(num_series):
+    ell = np.random.uniform(2., 10.)
+    r = np.sqrt(3.) * np.abs(t[b] - t[b].T) / ell
+    K = (1. + r) * np.exp(-r)
+    y[b] = np.linalg.cholesky(K + 1e-8 * np.eye(N)) @ np.random.randn(N, 1) + 0.3 * np.random.randn(N, 1)
+
+prior = priors.Matern32(variance=1., lengthscale=5.)
+lik = likelihoods.Gaussian(variance=0.1)
+inf_method = approx_inf.EP(power=0.5)
+model = BatchedSDEGP(prior=prior, likelihood=lik, t=t, y=y, approx_inf=inf_method, shared_hyp=False,
+                     num_devices=num_devices)
+
+opt_init, opt_update, get_params = optimizers.adam(step_size=5e-2)
+opt_state = opt_init([model.prior.hyp, model.likelihood.hyp])
+
+
+def gradient_step(i, state, mod):
+    params = get_params(state)
+    mod.prior.hyp = params[0]
+    mod.likelihood.hyp = params[1]
+    neg_log_marg_lik, gradients = mod.run()
+    print('iter %2d: nlml=%2.2f' % (i, neg_log_marg_lik))
+    return opt_update(i, gradients, state)
+
+
+# the first step initialises the sites and compiles the filter and smoother
+opt_state = gradient_step(0, opt_state, model)
+t0 = time.time()
+for j in range(num_iters):
+    opt_state = gradient_step(j, opt_state, model)
+get_params(opt_state)[0].block_until_ready()
+t1 = time.time()
+
+time_per_iter = (t1 - t0) / num_iters
+print('time per iteration: %2.4f secs, throughput: %2.2f series per second' % (time_per_iter,
+                                                                              num_series / time_per_iter))
+
+with open("output/sharding_" + str(method) + ".txt", "wb") as fp:
+    pickle.dump([num_devices, time_per_iter], fp)
@@ -0,0 +1,70 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+import time
+from sde_gp import SDEGP
+from jax.config import config
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+import pickle
+import resource
+pi = 3.141592653589793
+
+# wall-clock time and peak memory of a single model.run() on the binary classification task, for
+#  0: the covariance form filter / smoother in double precision (the default)
+#  1: the square-root filter / smoother in double precision
+#  2: the square-root filter / smoother in single precision
+# the energy is stored too, so that the single precision result can be compared against double precision.
+
+if len(sys.argv) > 1:
+    method = int(sys.argv[1])
+else:
+    method = 0
+
+print('method number', method)
+
+square_root = method > 0
+if method == 2:
+    config.update("jax_enable_x64", False)  # sde_gp.py enables x64 at import time
+
+print('generating some data ...')
+np.random.seed(99)
+N = 10000  # number of training points
+x = np.sort(70 * np.random.rand(N))
+sn = 0.25
+f = lambda x_: 12. * np.sin(4 * pi * x_) / (0.25 * pi * x_ + 1)
+y_ = f(x) + np.math.sqrt(sn)*np.random.randn(x.shape[0])
+y = np.sign(y_)
+y[y == -1] = 0
+
+var_f = 1.  # GP variance
+len_f = 0.25  # GP lengthscale
+
+prior = priors.Matern72(variance=var_f, lengthscale=len_f)
+lik = likelihoods.Bernoulli(link='logit')
+inf_method = approx_inf.EP(power=0.5, intmethod='GH')
+
+model = SDEGP(prior=prior, likelihood=lik, t=x, y=y, approx_inf=inf_method, square_root=square_root)
+
+# the first two calls initialise the sites and compile the filter and smoother
+neg_log_marg_lik, gradients = model.run()
+neg_log_marg_lik, gradients = model.run()
+
+time_taken = np.zeros([10, 1])
+for j in range(10):
+    t0 = time.time()
+    neg_log_marg_lik, gradients = model.run()
+    gradients[0].block_until_ready()
+    t1 = time.time()
+    time_taken[j] = t1-t0
+    print('run time: %2.4f secs' % (t1-t0))
+
+time_taken = np.mean(time_taken)
+print('energy:', neg_log_marg_lik)
+
+peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak resident set size (MB)
+print('peak memory usage: %2.2f MB' % peak_memory)
+
+with open("output/square_root_" + str(method) + ".txt", "wb") as fp:
+    pickle.dump([time_taken, peak_memory, float(neg_log_marg_lik)], fp)
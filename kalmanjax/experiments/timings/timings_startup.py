@@ -0,0 +1,44 @@
+import sys
+import time
+t_start = time.time()
+sys.path.insert(0, '../../')
+import numpy as np
+import subprocess
+import pickle
+
+# start-up time of a job on the coal mining data: a new process is launched which builds the model and takes the
+# first optimisation step and prediction, either
+#   - compiling the filter, smoother and predictor lazily on the first calls to run() and predict(), or
+#   - compiling them ahead of time (model.precompile) before the first step.
+# the time is measured from the launch of the process, so includes the Python and JAX imports. precompile also
+# compiles the paths taken by the later steps (with sites) and by run_two_stage, so the start-up takes longer, but
+# the first step runs at close to the compiled speed.
+
+if len(sys.argv) > 1 and sys.argv[1] == 'job':
+    # the job itself, launched as a subprocess below
+    from sde_gp import SDEGP
+    import approximate_inference as approx_inf
+    import priors
+    import likelihoods
+
+    D = np.loadtxt('../coal/binned.csv')
+    model = SDEGP(prior=priors.Matern52(variance=1.0, lengthscale=1.0), likelihood=likelihoods.Poisson(),
+                  t=D[:, 0:1], y=D[:, 1:], approx_inf=approx_inf.EEP(power=1))
+    compile_time = model.precompile() if sys.argv[2] == 'precompile' else 0.
+    t0 = time.time()
+    model.run()
+    model.predict()
+    print('compile time: %2.4f secs, first step: %2.4f secs, start-up time: %2.4f secs'
+          % (compile_time, time.time() - t0, time.time() - t_start))
+    sys.exit()
+
+time_taken = np.zeros([2, 1])
+for j, mode in enumerate(['lazy', 'precompile']):
+    t0 = time.time()
+    subprocess.run([sys.executable, __file__, 'job', mode], check=True)
+    t1 = time.time()
+    time_taken[j] = t1-t0
+    print('%s: %2.4f secs' % (mode, t1-t0))
+
+with open("output/startup.txt", "wb") as fp:
+    pickle.dump(time_taken, fp)
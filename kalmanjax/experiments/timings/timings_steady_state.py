@@ -0,0 +1,67 @@
+import sys
+sys.path.insert(0, '../../')
+import numpy as np
+import time
+from sde_gp import SDEGP
+import priors
+import likelihoods
+from numpy import pi
+from scipy.io import loadmat
+import pickle
+
+# wall-clock time of model.neg_log_marg_lik() (the energy and its gradient) on the regularly sampled audio data with
+# a Gaussian likelihood, for
+#  0: the sum of the six audio components (three subbands and three modulators), default filter
+#  1: the sum of the six audio components, steady-state filter
+#  2: Matern-5/2, default filter
+#  3: Matern-5/2, steady-state filter
+# the steady-state filter requires scalar observations, so the components of the audio model are summed rather than
+# observed through the amplitude demodulation likelihood (the state dimension is the same).
+
+if len(sys.argv) > 1:
+    method = int(sys.argv[1])
+else:
+    method = 0
+
+print('method number', method)
+
+print('loading data ...')
+y = loadmat('../audio/speech_female')['y']
+fs = 44100  # sampling rate (Hz)
+scale = 1000  # convert to milliseconds
+normaliser = 0.5 * np.sqrt(np.var(y))
+y = y / normaliser  # rescale the data
+N = y.shape[0]
+x = np.linspace(0., N, num=N) / fs * scale  # evenly spaced inputs
+
+if method < 2:
+    fundamental_freq = 220  # Hz
+    radial_freq = 2 * pi * fundamental_freq / scale  # radial freq = 2pi * f / scale
+    subbands = [priors.SubbandExponentialFixedVar(variance=.1, lengthscale=75., radial_frequency=k * radial_freq)
+                for k in [1, 2, 3]]  # fundamental and the first two harmonics
+    modulators = [priors.Matern52FixedVar(variance=.5, lengthscale=10.) for _ in range(3)]
+    prior = priors.Sum(subbands + modulators)
+else:
+    prior = priors.Matern52(variance=1., lengthscale=10.)
+
+lik = likelihoods.Gaussian(variance=0.3)
+
+model = SDEGP(prior=prior, likelihood=lik, t=x, y=y, steady_state=(method % 2 == 1))
+
+# the first call compiles the filter and its gradient
+neg_log_marg_lik, gradients = model.neg_log_marg_lik()
+
+time_taken = np.zeros([10, 1])
+for j in range(10):
+    t0 = time.time()
+    neg_log_marg_lik, gradients = model.neg_log_marg_lik()
+    neg_log_marg_lik.block_until_ready()
+    t1 = time.time()
+    time_taken[j] = t1-t0
+    print('energy and gradient time: %2.4f secs' % (t1-t0))
+
+time_taken = np.mean(time_taken)
+print('energy:', neg_log_marg_lik)
+
+with open("output/steady_state_" + str(method) + ".txt", "wb") as fp:
+    pickle.dump([time_taken, float(neg_log_marg_lik)], fp)
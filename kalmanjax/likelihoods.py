@@ -3,7 +3,8 @@ from jax.scipy.special import erf, gammaln
 from jax import jit, partial, jacrev, random, vmap, grad
 from jax.scipy.linalg import cholesky, cho_factor, cho_solve
 from jax.scipy.linalg import inv as inv_any
-from utils import inv, softplus, sigmoid, logphi, gaussian_moment_match, softplus_inv, gauss_hermite
+from utils import (inv, softplus, sigmoid, logphi, gaussian_moment_match, softplus_inv, gauss_hermite,
+                   PytreeModel)
 pi = 3.141592653589793
 
 
@@ -17,7 +18,7 @@ def gaussian_second_derivative_wrt_mean(f, m, C, w):
     return (invC @ (f - m) @ (f - m).T @ invC - invC) * w
 
 
-class Likelihood(object):
+class Likelihood(PytreeModel):
     """
     The likelihood model class, p(yₙ|fₙ). Each likelihood implements its own parameter update methods:
         Moment matching is used for EP
@@ -46,7 +47,7 @@ class Likelihood(object):
     def conditional_moments(self, f, hyp=None):
         raise NotImplementedError('conditional moments of this likelihood are not implemented')
 
-    @partial(jit, static_argnums=(0, 6))
+    @partial(jit, static_argnums=(6,))
     def moment_match_cubature(self, y, cav_mean, cav_cov, hyp=None, power=1.0, cubature_func=None):
         """
         TODO: N.B. THIS VERSION IS SUPERCEDED BY THE FUNCTION BELOW. HOWEVER THIS ONE MAY BE MORE STABLE.
@@ -69,7 +70,10 @@ class Likelihood(object):
             x, w = gauss_hermite(cav_mean.shape[0], 20)  # Gauss-Hermite sigma points and weights
         else:
             x, w = cubature_func(cav_mean.shape[0])
-        cav_cho, low = cho_factor(cav_cov)
+        if cav_cov.shape == (1, 1):  # scalar observations, so the Cholesky factor is the standard deviation
+            cav_cho, low = np.sqrt(cav_cov), True
+        else:
+            cav_cho, low = cho_factor(cav_cov)
         # fsigᵢ=xᵢ√cₙ + mₙ: scale locations according to cavity dist.
         sigma_points = cav_cho @ np.atleast_2d(x) + cav_mean
         # pre-compute wᵢ pᵃ(yₙ|xᵢ√(2vₙ) + mₙ)
@@ -92,7 +96,10 @@ class Likelihood(object):
         # Compute derivative of partition function via cubature:
         # dZₙ/dmₙ = ∫ (fₙ-mₙ) vₙ⁻¹ pᵃ(yₙ|fₙ) 𝓝(fₙ|mₙ,vₙ) dfₙ
         #         ≈ ∑ᵢ wᵢ (fₙ-mₙ) vₙ⁻¹ pᵃ(yₙ|fsigᵢ)
-        covinv_f_m = cho_solve((cav_cho, low), sigma_points - cav_mean)
+        if cav_cov.shape == (1, 1):
+            covinv_f_m = (sigma_points - cav_mean) / cav_cov
+        else:
+            covinv_f_m = cho_solve((cav_cho, low), sigma_points - cav_mean)
         dZ = np.sum(
             # (sigma_points - cav_mean) / cav_cov
             covinv_f_m
@@ -114,11 +121,12 @@ class Likelihood(object):
         #              = (d²Zₙ/dmₙ² * Zₙ - (dZₙ/dmₙ)²) / Zₙ²
         #              = d²Zₙ/dmₙ² / Zₙ - (dlogZₙ/dmₙ)²
         d2lZ = -dlZ @ dlZ.T + Zinv * d2Z
-        site_mean = cav_mean - inv_any(d2lZ) @ dlZ  # approx. likelihood (site) mean (see Rasmussen & Williams p75)
-        site_cov = -power * (cav_cov + inv_any(d2lZ))  # approx. likelihood (site) variance
+        id2lZ = 1. / d2lZ if d2lZ.shape == (1, 1) else inv_any(d2lZ)
+        site_mean = cav_mean - id2lZ @ dlZ  # approx. likelihood (site) mean (see Rasmussen & Williams p75)
+        site_cov = -power * (cav_cov + id2lZ)  # approx. likelihood (site) variance
         return lZ, site_mean, site_cov
 
-    @partial(jit, static_argnums=(0, 6))
+    @partial(jit, static_argnums=(6,))
     def moment_match_cubature(self, y, cav_mean, cav_cov, hyp=None, power=1.0, cubature_func=None):
         """
         TODO: N.B. THIS VERSION ALLOWS MULTI-DIMENSIONAL MOMENT MATCHING, BUT CAN BE UNSTABLE
@@ -141,7 +149,10 @@ class Likelihood(object):
             x, w = gauss_hermite(cav_mean.shape[0], 20)  # Gauss-Hermite sigma points and weights
         else:
             x, w = cubature_func(cav_mean.shape[0])
-        cav_cho, low = cho_factor(cav_cov)
+        if cav_cov.shape == (1, 1):  # scalar observations, so the Cholesky factor is the standard deviation
+            cav_cho, low = np.sqrt(cav_cov), True
+        else:
+            cav_cho, low = cho_factor(cav_cov)
         # fsigᵢ=xᵢ√cₙ + mₙ: scale locations according to cavity dist.
         sigma_points = cav_cho @ np.atleast_2d(x) + cav_mean
         # pre-compute wᵢ pᵃ(yₙ|xᵢ√(2vₙ) + mₙ)
@@ -178,12 +189,15 @@ class Likelihood(object):
         #              = (d²Zₙ/dmₙ² * Zₙ - (dZₙ/dmₙ)²) / Zₙ²
         #              = d²Zₙ/dmₙ² / Zₙ - (dlogZₙ/dmₙ)²
         d2lZ = -dlZ @ dlZ.T + Zinv * d2Z
-        id2lZ = inv_any(d2lZ + 1e-10 * np.eye(d2lZ.shape[0]))
+        if d2lZ.shape == (1, 1):  # scalar observations, so avoid the matrix inverse
+            id2lZ = 1. / (d2lZ + 1e-10)
+        else:
+            id2lZ = inv_any(d2lZ + 1e-10 * np.eye(d2lZ.shape[0]))
         site_mean = cav_mean - id2lZ @ dlZ  # approx. likelihood (site) mean (see Rasmussen & Williams p75)
         site_cov = -power * (cav_cov + id2lZ)  # approx. likelihood (site) variance
         return lZ, site_mean, site_cov
 
-    @partial(jit, static_argnums=(0, 6))
+    @partial(jit, static_argnums=(6,))
     def moment_match(self, y, m, v, hyp=None, power=1.0, cubature_func=None):
         """
         If no custom moment matching method is provided, we use cubature.
@@ -199,7 +213,7 @@ class Likelihood(object):
         lik_std = cholesky(np.diag(np.expand_dims(lik_variance, 0)))
         return lik_expectation + lik_std * random.normal(random.PRNGKey(rng_key), shape=f.shape)
 
-    @partial(jit, static_argnums=(0, 4))
+    @partial(jit, static_argnums=(4,))
     def statistical_linear_regression_cubature(self, cav_mean, cav_cov, hyp=None, cubature_func=None):
         """
         Perform statistical linear regression (SLR) using cubature.
@@ -240,14 +254,14 @@ class Likelihood(object):
         )[None, :]
         return mu, S, C, omega
 
-    @partial(jit, static_argnums=(0, 4))
+    @partial(jit, static_argnums=(4,))
     def statistical_linear_regression(self, m, v, hyp=None, cubature_func=None):
         """
         If no custom SLR method is provided, we use cubature.
         """
         return self.statistical_linear_regression_cubature(m, v, hyp, cubature_func)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def observation_model(self, f, sigma, hyp=None):
         """
         The implicit observation model is:
@@ -257,7 +271,7 @@ class Likelihood(object):
         obs_model = conditional_expectation + cholesky(conditional_covariance) @ sigma
         return np.squeeze(obs_model)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def analytical_linearisation(self, m, sigma=None, hyp=None):
         """
         Compute the Jacobian of the state space observation model w.r.t. the
@@ -271,7 +285,7 @@ class Likelihood(object):
         Jf, Jsigma = jacrev(self.observation_model, argnums=(0, 1))(m, sigma, hyp)
         return np.atleast_2d(np.squeeze(Jf)), np.atleast_2d(np.squeeze(Jsigma))
 
-    @partial(jit, static_argnums=(0, 5))
+    @partial(jit, static_argnums=(5,))
     def variational_expectation_cubature(self, y, post_mean, post_cov, hyp=None, cubature_func=None):
         """
         Computes the "variational expectation" via cubature, i.e. the
@@ -320,7 +334,7 @@ class Likelihood(object):
         dE_dv = np.diag(dE_dv)
         return exp_log_lik, dE_dm, dE_dv
 
-    @partial(jit, static_argnums=(0, 5))
+    @partial(jit, static_argnums=(5,))
     def variational_expectation(self, y, m, v, hyp=None, cubature_func=None):
         """
         If no custom variational expectation method is provided, we use cubature.
@@ -344,7 +358,7 @@ class Gaussian(Likelihood):
     def variance(self):
         return softplus(self.hyp)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def evaluate_likelihood(self, y, f, hyp=None):
         """
         Evaluate the Gaussian function 𝓝(yₙ|fₙ,σ²).
@@ -358,7 +372,7 @@ class Gaussian(Likelihood):
         hyp = softplus(self.hyp) if hyp is None else hyp
         return (2 * pi * hyp) ** -0.5 * np.exp(-0.5 * (y - f) ** 2 / hyp)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def evaluate_log_likelihood(self, y, f, hyp=None):
         """
         Evaluate the log-Gaussian function log𝓝(yₙ|fₙ,σ²).
@@ -372,7 +386,7 @@ class Gaussian(Likelihood):
         hyp = softplus(self.hyp) if hyp is None else hyp
         return -0.5 * np.log(2 * pi * hyp) - 0.5 * (y - f) ** 2 / hyp
 
-    @partial(jit, static_argnums=0)
+    @jit
     def conditional_moments(self, f, hyp=None):
         """
         The first two conditional moments of a Gaussian are the mean and variance:
@@ -382,7 +396,7 @@ class Gaussian(Likelihood):
         hyp = softplus(self.hyp) if hyp is None else hyp
         return f, hyp.reshape(-1, 1)
 
-    @partial(jit, static_argnums=(0, 6))
+    @partial(jit, static_argnums=(6,))
     def moment_match(self, y, cav_mean, cav_cov, hyp=None, power=1.0, cubature_func=None):
         """
         Closed form Gaussian moment matching.
@@ -420,20 +434,23 @@ class Bernoulli(Likelihood):
     """
     def __init__(self, link):
         super().__init__(hyp=None)
-        if link == 'logit':
-            self.link_fn = lambda f: 1 / (1 + np.exp(-f))
-            self.dlink_fn = lambda f: np.exp(f) / (1 + np.exp(f)) ** 2
-            self.link = link
-        elif link == 'probit':
-            jitter = 1e-10
-            self.link_fn = lambda f: 0.5 * (1.0 + erf(f / np.sqrt(2.0))) * (1 - 2 * jitter) + jitter
-            self.dlink_fn = lambda f: grad(self.link_fn)(np.squeeze(f)).reshape(-1, 1)
-            self.link = link
-        else:
+        if link not in ['logit', 'probit']:
             raise NotImplementedError('link function not implemented')
+        self.link = link
         self.name = 'Bernoulli'
 
-    @partial(jit, static_argnums=0)
+    def link_fn(self, f):
+        if self.link == 'logit':
+            return 1 / (1 + np.exp(-f))
+        jitter = 1e-10
+        return 0.5 * (1.0 + erf(f / np.sqrt(2.0))) * (1 - 2 * jitter) + jitter
+
+    def dlink_fn(self, f):
+        if self.link == 'logit':
+            return np.exp(f) / (1 + np.exp(f)) ** 2
+        return grad(self.link_fn)(np.squeeze(f)).reshape(-1, 1)
+
+    @jit
     def evaluate_likelihood(self, y, f, hyp=None):
         """
         :param y: observed data yₙ ϵ {-1, +1} [scalar]
@@ -444,7 +461,7 @@ class Bernoulli(Likelihood):
         """
         return np.where(np.equal(y, 1), self.link_fn(f), 1 - self.link_fn(f))
 
-    @partial(jit, static_argnums=0)
+    @jit
     def evaluate_log_likelihood(self, y, f, hyp=None):
         """
         :param y: observed data yₙ ϵ {-1, +1} [scalar]
@@ -455,7 +472,7 @@ class Bernoulli(Likelihood):
         """
         return np.log(self.evaluate_likelihood(y, f))
 
-    @partial(jit, static_argnums=0)
+    @jit
     def conditional_moments(self, f, hyp=None):
         """
         The first two conditional moments of a Probit likelihood are:
@@ -464,7 +481,7 @@ class Bernoulli(Likelihood):
         """
         return self.link_fn(f), self.link_fn(f)-(self.link_fn(f)**2)
 
-    @partial(jit, static_argnums=(0, 5, 6))
+    @partial(jit, static_argnums=(5, 6))
     def moment_match(self, y, m, v, hyp=None, power=1.0, cubature_func=None):
         """
         Probit likelihood moment matching.
@@ -504,7 +521,7 @@ class Bernoulli(Likelihood):
             # if a is not 1, we can calculate the moments via cubature
             return self.moment_match_cubature(y, m, v, None, power, cubature_func)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def analytical_linearisation(self, m, sigma=None, hyp=None):
         """
         Compute the Jacobian of the state space observation model w.r.t. the
@@ -568,17 +585,22 @@ class Poisson(Likelihood):
         :param link: link function, either 'exp' or 'logistic'
         """
         super().__init__(hyp=None)
-        if link == 'exp':
-            self.link_fn = lambda mu: np.exp(mu)
-            self.dlink_fn = lambda mu: np.exp(mu)
-        elif link == 'logistic':
-            self.link_fn = lambda mu: softplus(mu)
-            self.dlink_fn = lambda mu: sigmoid(mu)
-        else:
+        if link not in ['exp', 'logistic']:
             raise NotImplementedError('link function not implemented')
+        self.link = link
         self.name = 'Poisson'
 
-    @partial(jit, static_argnums=0)
+    def link_fn(self, mu):
+        if self.link == 'exp':
+            return np.exp(mu)
+        return softplus(mu)
+
+    def dlink_fn(self, mu):
+        if self.link == 'exp':
+            return np.exp(mu)
+        return sigmoid(mu)
+
+    @jit
     def evaluate_likelihood(self, y, f, hyp=None):
         """
         Evaluate the Poisson likelihood:
@@ -595,7 +617,7 @@ class Poisson(Likelihood):
         mu = self.link_fn(f)
         return mu**y * np.exp(-mu) / np.exp(gammaln(y + 1))
 
-    @partial(jit, static_argnums=0)
+    @jit
     def evaluate_log_likelihood(self, y, f, hyp=None):
         """
         Evaluate the Poisson log-likelihood:
@@ -612,7 +634,7 @@ class Poisson(Likelihood):
         mu = self.link_fn(f)
         return y * np.log(mu) - mu - gammaln(y + 1)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def observation_model(self, f, sigma, hyp=None):
         """
         TODO: sort out broadcasting so we don't need this additional function (only difference is the transpose)
@@ -623,7 +645,7 @@ class Poisson(Likelihood):
         obs_model = conditional_expectation + cholesky(conditional_covariance.T) @ sigma
         return np.squeeze(obs_model)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def conditional_moments(self, f, hyp=None):
         """
         The first two conditional moments of a Poisson distribution are equal to the intensity:
@@ -633,7 +655,7 @@ class Poisson(Likelihood):
         # return self.link_fn(f), self.link_fn(f)
         return self.link_fn(f), vmap(np.diag, 1, 2)(self.link_fn(f))
 
-    @partial(jit, static_argnums=0)
+    @jit
     def analytical_linearisation(self, m, sigma=None, hyp=None):
         """
         Compute the Jacobian of the state space observation model w.r.t. the
@@ -654,17 +676,22 @@ class HeteroscedasticNoise(Likelihood):
         :param link: link function, either 'exp' or 'softplus' (note that the link is modified with an offset)
         """
         super().__init__(hyp=None)
-        if link == 'exp':
-            self.link_fn = lambda mu: np.exp(mu - 0.5)
-            self.dlink_fn = lambda mu: np.exp(mu - 0.5)
-        elif link == 'softplus':
-            self.link_fn = lambda mu: softplus(mu - 0.5) + 1e-10
-            self.dlink_fn = lambda mu: sigmoid(mu - 0.5)
-        else:
+        if link not in ['exp', 'softplus']:
             raise NotImplementedError('link function not implemented')
+        self.link = link
         self.name = 'Heteroscedastic Noise'
 
-    @partial(jit, static_argnums=0)
+    def link_fn(self, mu):
+        if self.link == 'exp':
+            return np.exp(mu - 0.5)
+        return softplus(mu - 0.5) + 1e-10
+
+    def dlink_fn(self, mu):
+        if self.link == 'exp':
+            return np.exp(mu - 0.5)
+        return sigmoid(mu - 0.5)
+
+    @jit
     def evaluate_likelihood(self, y, f, hyp=None):
         """
         Evaluate the likelihood
@@ -672,7 +699,7 @@ class HeteroscedasticNoise(Likelihood):
         mu, var = self.conditional_moments(f)
         return (2 * pi * var) ** -0.5 * np.exp(-0.5 * (y - mu) ** 2 / var)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def evaluate_log_likelihood(self, y, f, hyp=None):
         """
         Evaluate the log-likelihood
@@ -680,13 +707,13 @@ class HeteroscedasticNoise(Likelihood):
         mu, var = self.conditional_moments(f)
         return -0.5 * np.log(2 * pi * var) - 0.5 * (y - mu) ** 2 / var
 
-    @partial(jit, static_argnums=0)
+    @jit
     def conditional_moments(self, f, hyp=None):
         """
         """
         return f[0][None, ...], self.link_fn(f[1][None, ...]) ** 2
 
-    @partial(jit, static_argnums=(0, 6))
+    @partial(jit, static_argnums=(6,))
     def moment_match(self, y, cav_mean, cav_cov, hyp=None, power=1.0, cubature_func=None):
         """
         """
@@ -726,7 +753,7 @@ class HeteroscedasticNoise(Likelihood):
         site_cov = -power * (cav_cov + id2lZ)  # approx. likelihood (site) variance
         return lZ, site_mean, site_cov
 
-    @partial(jit, static_argnums=0)
+    @jit
     def log_expected_likelihood(self, y, x, w, cav_mean, cav_var, power):
         sigma_points = np.sqrt(cav_var[1]) * x + cav_mean[1]
         f2 = self.link_fn(sigma_points) ** 2. / power
@@ -737,11 +764,11 @@ class HeteroscedasticNoise(Likelihood):
         lZ = np.log(Z + 1e-8)
         return lZ
 
-    @partial(jit, static_argnums=0)
+    @jit
     def dlZ_dm(self, y, x, w, cav_mean, cav_var, power):
         return jacrev(self.log_expected_likelihood, argnums=3)(y, x, w, cav_mean, cav_var, power)
 
-    @partial(jit, static_argnums=(0, 6))
+    @partial(jit, static_argnums=(6,))
     def moment_match_unstable(self, y, cav_mean, cav_cov, hyp=None, power=1.0, cubature_func=None):
         """
         TODO: Attempt to compute full site covariance, including cross terms. However, this makes things unstable.
@@ -759,7 +786,7 @@ class HeteroscedasticNoise(Likelihood):
         site_cov = -power * (cav_cov + id2lZ)  # approx. likelihood (site) variance
         return lZ, site_mean, site_cov
 
-    @partial(jit, static_argnums=(0, 5))
+    @partial(jit, static_argnums=(5,))
     def variational_expectation(self, y, m, v, hyp=None, cubature_func=None):
         """
         """
@@ -804,7 +831,7 @@ class HeteroscedasticNoise(Likelihood):
                           [0., dE_dv2]])
         return exp_log_lik, dE_dm, dE_dv
 
-    @partial(jit, static_argnums=(0, 4))
+    @partial(jit, static_argnums=(4,))
     def statistical_linear_regression(self, cav_mean, cav_cov, hyp=None, cubature_func=None):
         """
         Perform statistical linear regression (SLR) using cubature.
@@ -841,7 +868,7 @@ class HeteroscedasticNoise(Likelihood):
         omega = np.block([[1., 0.]])
         return mu, S, C, omega
 
-    @partial(jit, static_argnums=0)
+    @jit
     def analytical_linearisation(self, m, sigma=None, hyp=None):
         """
         Compute the Jacobian of the state space observation model w.r.t. the
@@ -860,14 +887,20 @@ class AudioAmplitudeDemodulation(Likelihood):
         """
         super().__init__(hyp=variance)
         self.name = 'Audio Amplitude Demodulation'
-        self.link_fn = lambda f: softplus(f)
-        self.dlink_fn = lambda f: sigmoid(f)  # derivative of the link function
 
     @property
     def variance(self):
         return softplus(self.hyp)
 
-    @partial(jit, static_argnums=0)
+    @staticmethod
+    def link_fn(f):
+        return softplus(f)
+
+    @staticmethod
+    def dlink_fn(f):
+        return sigmoid(f)  # derivative of the link function
+
+    @jit
     def evaluate_likelihood(self, y, f, hyp=None):
         """
         Evaluate the likelihood
@@ -875,7 +908,7 @@ class AudioAmplitudeDemodulation(Likelihood):
         mu, var = self.conditional_moments(f, hyp)
         return (2 * pi * var) ** -0.5 * np.exp(-0.5 * (y - mu) ** 2 / var)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def evaluate_log_likelihood(self, y, f, hyp=None):
         """
         Evaluate the log-likelihood
@@ -883,7 +916,7 @@ class AudioAmplitudeDemodulation(Likelihood):
         mu, var = self.conditional_moments(f, hyp)
         return -0.5 * np.log(2 * pi * var) - 0.5 * (y - mu) ** 2 / var
 
-    @partial(jit, static_argnums=0)
+    @jit
     def conditional_moments(self, f, hyp=None):
         """
         """
@@ -893,7 +926,7 @@ class AudioAmplitudeDemodulation(Likelihood):
         return np.atleast_2d(np.sum(subbands * modulators, axis=0)), np.atleast_2d(obs_noise_var)
         # return np.atleast_2d(modulators.T @ subbands),  np.atleast_2d(obs_noise_var)
 
-    @partial(jit, static_argnums=(0, 6))
+    @partial(jit, static_argnums=(6,))
     def moment_match(self, y, cav_mean, cav_cov, hyp=None, power=1.0, cubature_func=None):
         """
         """
@@ -933,7 +966,7 @@ class AudioAmplitudeDemodulation(Likelihood):
         site_cov = -power * (cav_cov + id2lZ)  # approx. likelihood (site) variance
         return lZ, site_mean, site_cov
 
-    @partial(jit, static_argnums=0)
+    @jit
     def analytical_linearisation(self, m, sigma=None, hyp=None):
         """
         """
@@ -944,7 +977,7 @@ class AudioAmplitudeDemodulation(Likelihood):
         Jsigma = np.array([[np.sqrt(obs_noise_var)]])
         return np.atleast_2d(Jf).T, np.atleast_2d(Jsigma).T
 
-    @partial(jit, static_argnums=(0, 4))
+    @partial(jit, static_argnums=(4,))
     def statistical_linear_regression(self, cav_mean, cav_cov, hyp=None, cubature_func=None):
         """
         This gives the same result as above - delete
@@ -986,7 +1019,7 @@ class AudioAmplitudeDemodulation(Likelihood):
         )[None, :]
         return mu, S, C, omega
 
-    @partial(jit, static_argnums=(0, 5))
+    @partial(jit, static_argnums=(5,))
     def variational_expectation(self, y, post_mean, post_cov, hyp=None, cubature_func=None):
         """
         """
@@ -1020,7 +1053,7 @@ class AudioAmplitudeDemodulation(Likelihood):
         dE_dv = np.diag(np.block([d2E1, d2E2]))
         return exp_log_lik, dE_dm, dE_dv
 
-    @partial(jit, static_argnums=0)
+    @jit
     def analytical_linearisation(self, m, sigma=None, hyp=None):
         """
         Compute the Jacobian of the state space observation model w.r.t. the
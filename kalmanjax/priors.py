@@ -1,10 +1,10 @@
 import jax.numpy as np
-from jax import jit, partial
+from jax import jit
 from jax.scipy.linalg import expm
-from utils import softplus, softplus_inv, softplus_list, rotation_matrix, solve
+from utils import softplus, softplus_inv, softplus_list, rotation_matrix, solve, PytreeModel
 
 
-class Prior(object):
+class Prior(PytreeModel):
     """
     The GP Kernel / prior class.
     Implements methods for converting GP priors,
@@ -25,15 +25,15 @@ class Prior(object):
     def __init__(self, hyp=None):
         self.hyp = softplus_inv(np.array(hyp))
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         raise NotImplementedError('kernel to state space mapping not implemented for this prior')
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         raise NotImplementedError('measurement model not implemented for this prior')
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the discrete-time state transition matrix A = expm(FΔt).
@@ -72,7 +72,7 @@ class Exponential(Prior):
     def lengthscale(self):
         return softplus(self.hyp[1])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         # uses variance and lengthscale hyperparameters to construct the state space model
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
@@ -84,12 +84,12 @@ class Exponential(Prior):
         Pinf = np.array([[var]])
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H = np.array([[1.0]])
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the discrete-time state transition matrix A = expm(FΔt) for the exponential prior.
@@ -138,7 +138,7 @@ class Matern32(Prior):
     def lengthscale(self):
         return softplus(self.hyp[1])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         # uses variance and lengthscale hyperparameters to construct the state space model
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
@@ -154,12 +154,12 @@ class Matern32(Prior):
                          [0.0, 3.0 * var / ell ** 2.0]])
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H = np.array([[1.0, 0.0]])
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the discrete-time state transition matrix A = expm(FΔt) for the Matern-3/2 prior.
@@ -209,7 +209,7 @@ class Matern52(Prior):
     def lengthscale(self):
         return softplus(self.hyp[1])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         # uses variance and lengthscale hyperparameters to construct the state space model
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
@@ -229,12 +229,12 @@ class Matern52(Prior):
                          [-kappa, 0.0,   25.0*var / ell**4.0]])
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H = np.array([[1.0, 0.0, 0.0]])
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the discrete-time state transition matrix A = expm(FΔt) for the Matern-5/2 prior.
@@ -292,7 +292,7 @@ class Matern72(Prior):
     def lengthscale(self):
         return softplus(self.hyp[1])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         # uses variance and lengthscale hyperparameters to construct the state space model
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
@@ -316,12 +316,12 @@ class Matern72(Prior):
                          [0.0,    -kappa2, 0.0,    343.0*var / ell**6.0]])
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H = np.array([[1, 0, 0, 0]])
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the discrete-time state transition matrix A = expm(FΔt) for the Matern-7/2 prior.
@@ -375,7 +375,7 @@ class Cosine(Prior):
     def frequency(self):
         return softplus(self.hyp)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         omega = hyperparams[0]
@@ -387,12 +387,12 @@ class Cosine(Prior):
         Pinf = np.eye(2)
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H = np.array([[1.0, 0.0]])
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the closed form discrete-time state
@@ -447,7 +447,7 @@ class SubbandMatern12(Prior):
     def radial_frequency(self):
         return softplus(self.hyp[2])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         var, ell, omega = hyperparams
@@ -468,14 +468,14 @@ class SubbandMatern12(Prior):
         Pinf = np.kron(Pinf_mat, np.eye(2))
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H_mat = np.array([[1.0]])
         H_cos = np.array([[1.0, 0.0]])
         H = np.kron(H_mat, H_cos)
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the closed form discrete-time state
@@ -547,7 +547,7 @@ class SubbandMatern32(Prior):
     def radial_frequency(self):
         return softplus(self.hyp[2])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         var, ell, omega = hyperparams
@@ -574,14 +574,14 @@ class SubbandMatern32(Prior):
         Pinf = np.kron(Pinf_mat, np.eye(2))
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H_mat = np.array([[1.0, 0.0]])
         H_cos = np.array([[1.0, 0.0]])
         H = np.kron(H_mat, H_cos)
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the closed form discrete-time state
@@ -659,7 +659,7 @@ class SubbandMatern52(Prior):
     def radial_frequency(self):
         return softplus(self.hyp[2])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         var, ell, omega = hyperparams
@@ -692,14 +692,14 @@ class SubbandMatern52(Prior):
         Pinf = np.kron(Pinf_mat, np.eye(2))
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H_mat = np.array([[1.0, 0.0, 0.0]])
         H_cos = np.array([[1.0, 0.0]])
         H = np.kron(H_mat, H_cos)
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the closed form discrete-time state
@@ -765,7 +765,7 @@ class Periodic(Prior):
     def period(self):
         return softplus(self.hyp[2])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         var, ell, period = hyperparams
@@ -781,12 +781,12 @@ class Periodic(Prior):
         H = np.kron(np.ones([1, self.order + 1]), np.array([1., 0.]))
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H = np.kron(np.ones([1, self.order + 1]), np.array([1., 0.]))
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the closed form discrete-time state
@@ -871,7 +871,7 @@ class QuasiPeriodicMatern12(Prior):
     def lengthscale_matern(self):
         return softplus(self.hyp[3])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         var, ell_p, period, ell_m = hyperparams
@@ -898,14 +898,14 @@ class QuasiPeriodicMatern12(Prior):
         Pinf = np.kron(Pinf_m, Pinf_p)
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H_p = np.kron(np.ones([1, self.order + 1]), np.array([1., 0.]))
         H_m = np.array([[1.0]])
         H = np.kron(H_m, H_p)
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the closed form discrete-time state
@@ -992,7 +992,7 @@ class QuasiPeriodicMatern32(Prior):
     def lengthscale_matern(self):
         return softplus(self.hyp[3])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         var, ell_p, period, ell_m = hyperparams
@@ -1033,14 +1033,14 @@ class QuasiPeriodicMatern32(Prior):
         ])
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H_p = np.kron(np.ones([1, self.order + 1]), np.array([1., 0.]))
         H_m = np.array([[1.0, 0.0]])
         H = np.kron(H_m, H_p)
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the closed form discrete-time state
@@ -1118,12 +1118,12 @@ class SpatioTemporalMatern52(Prior):
         tau = np.sqrt(5) * np.abs(z - z_prime.T) / ell
         return (1 + tau + tau**2 / 3) * np.exp(-tau)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         # uses variance and lengthscale hyperparameters to construct the state space model
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         var, ell_time, ell_space = hyperparams[0], hyperparams[1], hyperparams[2]
-        Kmm = self.spatial_covariance(self.z, self.z, ell_space)
+        Kmm, Pinf_time, _ = self.kronecker_factors(hyperparams)
         lam = 5.0**0.5 / ell_time
         F_time = np.array([[0.0, 1.0, 0.0],
                            [0.0, 0.0, 1.0],
@@ -1134,29 +1134,54 @@ class SpatioTemporalMatern52(Prior):
                       [1.0]])
         Qc = np.array([[var * 400.0 * 5.0 ** 0.5 / 3.0 / ell_time ** 5.0]])
         H = None
+        Pinf = np.kron(Kmm, Pinf_time)
+        return F, L, Qc, H, Pinf
+
+    @jit
+    def kronecker_factors(self, hyperparams=None):
+        """
+        The factors of the Kronecker-structured state space model, Pinf = Kmm ⊗ Pinf_time and H = Kx ⊗ H_time.
+        :param hyperparams: the kernel hyperparameters [3]
+        :return:
+            Kmm: the spatial covariance at the inducing points z [M, M]
+            Pinf_time: the stationary covariance of the temporal state [3, 3]
+            H_time: the temporal measurement model [1, 3]
+        """
+        hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
+        var, ell_time, ell_space = hyperparams[0], hyperparams[1], hyperparams[2]
+        Kmm = self.spatial_covariance(self.z, self.z, ell_space)
         kappa = 5.0 / 3.0 * var / ell_time**2.0
         Pinf_time = np.array([[var,    0.0,   -kappa],
                               [0.0,    kappa, 0.0],
                               [-kappa, 0.0,   25.0*var / ell_time**4.0]])
-        Pinf = np.kron(Kmm, Pinf_time)
-        return F, L, Qc, H, Pinf
+        H_time = np.array([[1.0, 0.0, 0.0]])
+        return Kmm, Pinf_time, H_time
 
-    @partial(jit, static_argnums=0)
-    def measurement_model(self, r, hyperparams=None):
-        # uses variance and lengthscale hyperparameters to construct the state space model
+    @jit
+    def spatial_measurement_model(self, r, hyperparams=None):
+        """
+        The spatial factor of the measurement model, Kx = Kxz / Kzz, which projects the inducing points z onto the
+        spatial locations r. This is the identity when the data lie on a fixed grid at z.
+        """
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         ell_space = hyperparams[2]
-        H_time = np.array([[1.0, 0.0, 0.0]])
         if self.fixed_grid:
             Kx = np.eye(self.z.shape[0])
         else:
             Kzz = self.spatial_covariance(self.z, self.z, ell_space)
             Kxz = self.spatial_covariance(r.reshape(-1, 1), self.z, ell_space)
             Kx = solve(Kzz, Kxz.T).T  # Kxz / Kzz
+        return Kx
+
+    @jit
+    def measurement_model(self, r, hyperparams=None):
+        # uses variance and lengthscale hyperparameters to construct the state space model
+        H_time = np.array([[1.0, 0.0, 0.0]])
+        Kx = self.spatial_measurement_model(r, hyperparams)
         H = np.kron(Kx, H_time)
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the discrete-time state transition matrix A = expm(FΔt) for the Matern-5/2 prior.
@@ -1164,6 +1189,18 @@ class SpatioTemporalMatern52(Prior):
         :param hyperparams: the kernel hyperparameters, lengthscale is in index 1 [2]
         :return: state transition matrix A [3, 3]
         """
+        A_time = self.temporal_state_transition(dt, hyperparams)
+        A = np.kron(np.eye(self.M), A_time)
+        return A
+
+    @jit
+    def temporal_state_transition(self, dt, hyperparams=None):
+        """
+        The temporal factor of the state transition matrix, A = I ⊗ A_time.
+        :param dt: step size(s), Δtₙ = tₙ - tₙ₋₁ [scalar]
+        :param hyperparams: the kernel hyperparameters, lengthscale is in index 1
+        :return: temporal state transition matrix A_time [3, 3]
+        """
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         ell = hyperparams[1]
         lam = np.sqrt(5.0) / ell
@@ -1173,8 +1210,7 @@ class SpatioTemporalMatern52(Prior):
                               [-0.5 * dtlam * lam ** 2,        lam * (1.0 - dtlam),    1.0 - 0.5 * dtlam],
                               [lam ** 3 * (0.5 * dtlam - 1.0), lam ** 2 * (dtlam - 3), lam * (0.5 * dtlam - 2.0)]])
                + np.eye(3))
-        A = np.kron(np.eye(self.M), A_time)
-        return A
+        return A_time
 
 
 class SpatialMatern52(Prior):
@@ -1208,12 +1244,12 @@ class SpatialMatern52(Prior):
         tau = np.sqrt(5) * np.abs(z - z_prime.T) / ell
         return (1 + tau + tau**2 / 3) * np.exp(-tau)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         # uses variance and lengthscale hyperparameters to construct the state space model
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         var, ell = hyperparams[0], hyperparams[1]
-        Kmm = self.spatial_covariance(self.z, self.z, ell)
+        Kmm, Pinf_time, _ = self.kronecker_factors(hyperparams)
         lam = 5.0**0.5 / ell
         F_time = np.array([[0.0, 1.0, 0.0],
                            [0.0, 0.0, 1.0],
@@ -1224,29 +1260,54 @@ class SpatialMatern52(Prior):
                       [1.0]])
         Qc = np.array([[var * 400.0 * 5.0 ** 0.5 / 3.0 / ell ** 5.0]])
         H = None
+        Pinf = np.kron(Kmm, Pinf_time)
+        return F, L, Qc, H, Pinf
+
+    @jit
+    def kronecker_factors(self, hyperparams=None):
+        """
+        The factors of the Kronecker-structured state space model, Pinf = Kmm ⊗ Pinf_time and H = Kx ⊗ H_time.
+        :param hyperparams: the kernel hyperparameters [2]
+        :return:
+            Kmm: the spatial covariance at the inducing points z [M, M]
+            Pinf_time: the stationary covariance of the temporal state [3, 3]
+            H_time: the temporal measurement model [1, 3]
+        """
+        hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
+        var, ell = hyperparams[0], hyperparams[1]
+        Kmm = self.spatial_covariance(self.z, self.z, ell)
         kappa = 5.0 / 3.0 * var / ell**2.0
         Pinf_time = np.array([[var,    0.0,   -kappa],
                               [0.0,    kappa, 0.0],
                               [-kappa, 0.0,   25.0*var / ell**4.0]])
-        Pinf = np.kron(Kmm, Pinf_time)
-        return F, L, Qc, H, Pinf
+        H_time = np.array([[1.0, 0.0, 0.0]])
+        return Kmm, Pinf_time, H_time
 
-    @partial(jit, static_argnums=0)
-    def measurement_model(self, r, hyperparams=None):
-        # uses variance and lengthscale hyperparameters to construct the state space model
+    @jit
+    def spatial_measurement_model(self, r, hyperparams=None):
+        """
+        The spatial factor of the measurement model, Kx = Kxz / Kzz, which projects the inducing points z onto the
+        spatial locations r. This is the identity when the data lie on a fixed grid at z.
+        """
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         ell = hyperparams[1]
-        H_time = np.array([[1.0, 0.0, 0.0]])
         if self.fixed_grid:
             Kx = np.eye(self.z.shape[0])
         else:
             Kzz = self.spatial_covariance(self.z, self.z, ell)
             Kxz = self.spatial_covariance(r.reshape(-1, 1), self.z, ell)
             Kx = solve(Kzz, Kxz.T).T  # Kxz / Kzz
+        return Kx
+
+    @jit
+    def measurement_model(self, r, hyperparams=None):
+        # uses variance and lengthscale hyperparameters to construct the state space model
+        H_time = np.array([[1.0, 0.0, 0.0]])
+        Kx = self.spatial_measurement_model(r, hyperparams)
         H = np.kron(Kx, H_time)
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the discrete-time state transition matrix A = expm(FΔt) for the Matern-5/2 prior.
@@ -1254,6 +1315,18 @@ class SpatialMatern52(Prior):
         :param hyperparams: the kernel hyperparameters, lengthscale is in index 1 [2]
         :return: state transition matrix A [3, 3]
         """
+        A_time = self.temporal_state_transition(dt, hyperparams)
+        A = np.kron(np.eye(self.M), A_time)
+        return A
+
+    @jit
+    def temporal_state_transition(self, dt, hyperparams=None):
+        """
+        The temporal factor of the state transition matrix, A = I ⊗ A_time.
+        :param dt: step size(s), Δtₙ = tₙ - tₙ₋₁ [scalar]
+        :param hyperparams: the kernel hyperparameters, lengthscale is in index 1
+        :return: temporal state transition matrix A_time [3, 3]
+        """
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         ell = hyperparams[1]
         lam = np.sqrt(5.0) / ell
@@ -1263,8 +1336,7 @@ class SpatialMatern52(Prior):
                               [-0.5 * dtlam * lam ** 2,        lam * (1.0 - dtlam),    1.0 - 0.5 * dtlam],
                               [lam ** 3 * (0.5 * dtlam - 1.0), lam ** 2 * (dtlam - 3), lam * (0.5 * dtlam - 2.0)]])
                + np.eye(3))
-        A = np.kron(np.eye(self.M), A_time)
-        return A
+        return A_time
 
 
 class SpatialMatern32(Prior):
@@ -1298,12 +1370,12 @@ class SpatialMatern32(Prior):
         tau = np.sqrt(3) * np.abs(z - z_prime.T) / ell
         return (1 + tau) * np.exp(-tau)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         # uses variance and lengthscale hyperparameters to construct the state space model
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         var, ell = hyperparams[0], hyperparams[1]
-        Kmm = self.spatial_covariance(self.z, self.z, ell)
+        Kmm, Pinf_time, _ = self.kronecker_factors(hyperparams)
         lam = 3.0 ** 0.5 / ell
         F_time = np.array([[0.0, 1.0],
                            [-lam ** 2, -2 * lam]])
@@ -1312,27 +1384,52 @@ class SpatialMatern32(Prior):
                       [1.0]])
         Qc = np.array([[12.0 * 3.0 ** 0.5 / ell ** 3.0 * var]])
         H = None
-        Pinf_time = np.array([[var, 0.0],
-                              [0.0, 3.0 * var / ell ** 2.0]])
         Pinf = np.kron(Kmm, Pinf_time)
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
-    def measurement_model(self, r, hyperparams=None):
-        # uses variance and lengthscale hyperparameters to construct the state space model
+    @jit
+    def kronecker_factors(self, hyperparams=None):
+        """
+        The factors of the Kronecker-structured state space model, Pinf = Kmm ⊗ Pinf_time and H = Kx ⊗ H_time.
+        :param hyperparams: the kernel hyperparameters [2]
+        :return:
+            Kmm: the spatial covariance at the inducing points z [M, M]
+            Pinf_time: the stationary covariance of the temporal state [2, 2]
+            H_time: the temporal measurement model [1, 2]
+        """
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
-        ell = hyperparams[1]
+        var, ell = hyperparams[0], hyperparams[1]
+        Kmm = self.spatial_covariance(self.z, self.z, ell)
+        Pinf_time = np.array([[var, 0.0],
+                              [0.0, 3.0 * var / ell ** 2.0]])
         H_time = np.array([[1.0, 0.0]])
+        return Kmm, Pinf_time, H_time
+
+    @jit
+    def spatial_measurement_model(self, r, hyperparams=None):
+        """
+        The spatial factor of the measurement model, Kx = Kxz / Kzz, which projects the inducing points z onto the
+        spatial locations r. This is the identity when the data lie on a fixed grid at z.
+        """
+        hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
+        ell = hyperparams[1]
         if self.fixed_grid:
             Kx = np.eye(self.z.shape[0])
         else:
             Kzz = self.spatial_covariance(self.z, self.z, ell)
             Kxz = self.spatial_covariance(r.reshape(-1, 1), self.z, ell)
             Kx = solve(Kzz, Kxz.T).T  # Kxz / Kzz
+        return Kx
+
+    @jit
+    def measurement_model(self, r, hyperparams=None):
+        # uses variance and lengthscale hyperparameters to construct the state space model
+        H_time = np.array([[1.0, 0.0]])
+        Kx = self.spatial_measurement_model(r, hyperparams)
         H = np.kron(Kx, H_time)
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the discrete-time state transition matrix A = expm(FΔt) for the Matern-5/2 prior.
@@ -1340,15 +1437,26 @@ class SpatialMatern32(Prior):
         :param hyperparams: the kernel hyperparameters, lengthscale is in index 1 [2]
         :return: state transition matrix A [3, 3]
         """
+        A_time = self.temporal_state_transition(dt, hyperparams)
+        A = np.kron(np.eye(self.M), A_time)
+        return A
+
+    @jit
+    def temporal_state_transition(self, dt, hyperparams=None):
+        """
+        The temporal factor of the state transition matrix, A = I ⊗ A_time.
+        :param dt: step size(s), Δtₙ = tₙ - tₙ₋₁ [scalar]
+        :param hyperparams: the kernel hyperparameters, lengthscale is in index 1
+        :return: temporal state transition matrix A_time [2, 2]
+        """
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         ell = hyperparams[1]
         lam = np.sqrt(3.0) / ell
         A_time = np.exp(-dt * lam) * (dt * np.array([[lam, 1.0], [-lam**2.0, -lam]]) + np.eye(2))
-        A = np.kron(np.eye(self.M), A_time)
-        return A
+        return A_time
 
 
-class Sum(object):
+class Sum(PytreeModel):
     """
     A sum of GP priors. 'components' is a list of GP kernels, and this class stacks
     the state space models to produce their sum.
@@ -1361,7 +1469,7 @@ class Sum(object):
         self.hyp = hyp
         self.name = 'Sum'
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         hyperparams = softplus_list(self.hyp) if hyperparams is None else hyperparams
         F, L, Qc, H, Pinf = self.components[0].kernel_to_state_space(hyperparams[0])
@@ -1388,7 +1496,7 @@ class Sum(object):
             ])
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         hyperparams = softplus_list(self.hyp) if hyperparams is None else hyperparams
         H = self.components[0].measurement_model(r, hyperparams[0])
@@ -1399,7 +1507,7 @@ class Sum(object):
             ])
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the discrete-time state transition matrix A = expm(FΔt) for a sum of GPs
@@ -1418,7 +1526,7 @@ class Sum(object):
         return A
 
 
-class Independent(object):
+class Independent(PytreeModel):
     """
     A stack of independent GP priors. 'components' is a list of GP kernels, and this class stacks
     the state space models such that each component is fed to the likelihood.
@@ -1432,7 +1540,7 @@ class Independent(object):
         self.hyp = hyp
         self.name = 'Independent'
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         hyperparams = softplus_list(self.hyp) if hyperparams is None else hyperparams
         F, L, Qc, H, Pinf = self.components[0].kernel_to_state_space(hyperparams[0])
@@ -1460,7 +1568,7 @@ class Independent(object):
             ])
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         hyperparams = softplus_list(self.hyp) if hyperparams is None else hyperparams
         H = self.components[0].measurement_model(r, hyperparams[0])
@@ -1472,7 +1580,7 @@ class Independent(object):
             ])
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         """
         Calculation of the discrete-time state transition matrix A = expm(FΔt) for a sum of GPs
@@ -1515,7 +1623,7 @@ class SubbandExponentialFixedVar(Prior):
     def radial_frequency(self):
         return softplus(self.hyp[1])
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         ell, omega = hyperparams
@@ -1537,14 +1645,14 @@ class SubbandExponentialFixedVar(Prior):
         Pinf = np.kron(Pinf_mat, np.eye(2))
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H_mat = np.array([[1.0]])
         H_cos = np.array([[1.0, 0.0]])
         H = np.kron(H_mat, H_cos)
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         ell, omega = hyperparams[0], hyperparams[1]
@@ -1564,7 +1672,7 @@ class Matern52FixedVar(Prior):
     def lengthscale(self):
         return softplus(self.hyp)
 
-    @partial(jit, static_argnums=0)
+    @jit
     def kernel_to_state_space(self, hyperparams=None):
         # uses variance and lengthscale hyperparameters to construct the state space model
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
@@ -1585,12 +1693,12 @@ class Matern52FixedVar(Prior):
                           [-kappa, 0.0,   25.0*var / ell**4.0]])
         return F, L, Qc, H, Pinf
 
-    @partial(jit, static_argnums=0)
+    @jit
     def measurement_model(self, r=None, hyperparams=None):
         H = np.array([[1.0, 0.0, 0.0]])
         return H
 
-    @partial(jit, static_argnums=0)
+    @jit
     def state_transition(self, dt, hyperparams=None):
         hyperparams = softplus(self.hyp) if hyperparams is None else hyperparams
         ell = hyperparams
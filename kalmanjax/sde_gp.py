@@ -1,15 +1,21 @@
 import jax.numpy as np
+import time
+import numpy as nnp
 from jax.ops import index, index_update, index_add
-from jax.experimental import loops
-from jax import value_and_grad, jit, partial, random, vmap
-from utils import softplus, softplus_list, sample_gaussian_noise, solve, input_admin
+from jax.experimental import optimizers
+from jax import value_and_grad, jit, partial, random, vmap, pmap, lax, device_count
+from jax.tree_util import tree_map
+from jax.scipy.linalg import cho_factor, cho_solve, solve_triangular
+from utils import (softplus, softplus_list, sample_gaussian_noise, solve, input_admin, compress_steps,
+                   filtering_operator, smoothing_operator, solve_discrete_riccati, tria, checkpointed_scan,
+                   PytreeModel, pad_to_bucket, stack_steps, associative_scan)
 from approximate_inference import EP
 from jax.config import config
 config.update("jax_enable_x64", True)
 pi = 3.141592653589793
 
 
-class SDEGP(object):
+class SDEGP(PytreeModel):
     """
     The stochastic differential equation (SDE) form of a Gaussian process (GP) model.
     Implements methods for inference and learning in models with GP priors of the form
@@ -25,8 +31,48 @@ class SDEGP(object):
         - Statistically Linearised EP (SLEP / UEP / GHEP / PL)
         - Classical Kalman smoothers (EKS / UKS / GHKS)
         - Variational Inference - with natural gradients (VI)
+    Filtering and smoothing can either be performed sequentially (the default), or in parallel across time via
+    associative scans (Särkkä & García-Fernández 2021), which reduces the sequential depth from O(N) to O(log N).
+    For Gaussian likelihoods on regularly sampled data, a steady-state filter can be used, in which the Kalman gain
+    is computed once by solving the discrete algebraic Riccati equation.
+    A square-root filter and smoother, which propagate Cholesky factors of the state covariance via QR
+    decompositions, can be used for improved numerical stability (e.g. when running in single precision).
+    For spatio-temporal priors with Kronecker structure (A = I ⊗ A_time, Pinf = Kmm ⊗ Pinf_time), the filter and
+    smoother apply the model matrices via their factors rather than forming the dense (M·ν)×(M·ν) model matrices.
+    The state covariances are not Kronecker structured after the updates, so they are dense, but the filter and the
+    smoother used to update the sites (which is in the modified Bryson-Frazier form) cost O(M³ν² + M²ν³) per step
+    rather than O((M·ν)³). Prediction still uses the dense RTS smoother.
+    If the data lie on a fixed spatial grid and the likelihood is Gaussian (with the exact sites of the conjugate
+    mode), the model decouples into M independent temporal GPs in the eigenbasis of the spatial covariance, which are
+    filtered and smoothed in parallel.
+    New observations can be filtered online (online_update), which continues from the most recent filtering
+    distribution rather than re-filtering all the data. Similarly, the posterior at new test inputs can be computed
+    from the stored smoothed training states (bridge_predict).
+    The memory required to differentiate the filter can be bounded by checkpointing: only the states at the
+    boundaries of segments of the time axis are stored, and the steps in between are recomputed in the backward pass.
+    The fit method iterates the site and hyperparameter updates until the energy and the sites have converged,
+    recording the wall time, energy and site change of each sweep. The train method instead compiles chunks of
+    optimisation steps into a single scan, removing the per-iteration Python dispatch and host synchronisation.
+    The model, prior, likelihood and approximate inference objects are pytrees whose hyperparameters are traced, so
+    models with the same structure reuse the same compiled filter and smoother. The data are passed to the filter
+    and smoother as arguments, and can be padded with masked dummy steps up to a multiple of bucket_size, so that
+    data sets of similar sizes also share the compiled functions.
+    For the Gaussian likelihood, the conjugate mode uses the observations and the observation noise directly as the
+    sites, so that the sites need not be computed, stored or updated, and each step of the optimisation is a single
+    (differentiated) filtering pass. Its energy is the exact marginal likelihood, which equals the energy of the
+    converged sites, but the gradient w.r.t. the observation noise differs: the exact sites depend on the noise,
+    whereas the energy of the computed sites is differentiated with the sites held fixed.
     """
-    def __init__(self, prior, likelihood, t, y, r=None, t_test=None, y_test=None, r_test=None, approx_inf=None):
+    # the data are passed to the jitted methods as arguments, and the cached results are not used by them, so
+    # neither is part of the model pytree (and the compiled functions do not depend on the size of the data set)
+    transient_attributes = ('t_all', 'y_all', 'r_all', 't_train', 'y_train', 'r_train', 'r_test', 'dt_all',
+                            'dt_train', 'train_id', 'test_id', 'mask', 'train_steps', 'all_steps', 'train_inputs',
+                            'online_state', 'online_neg_log_marg_lik', 'online_site_params', 'bridge_cache',
+                            'fit_log')
+
+    def __init__(self, prior, likelihood, t, y, r=None, t_test=None, y_test=None, r_test=None, approx_inf=None,
+                 parallel=False, steady_state=False, square_root=False, segment_length=None,
+                 bucket_size=None, conjugate=False, kronecker=False, decoupled=False):
         """
         :param prior: the model prior p(f|0,k(t,t')) object which constructs the required state space model matrices
         :param likelihood: the likelihood model object which performs parameter updates and evaluates p(y|f)
@@ -37,6 +83,21 @@ class SDEGP(object):
         :param y_test: test data / observations
         :param r_test: test spatial points
         :param approx_inf: the approximate inference algorithm for computing the sites (EP, VI, UKS, ...)
+        :param parallel: flag to notify whether to use the parallel-in-time (associative scan) filter and smoother
+        :param steady_state: flag to notify whether to use the steady-state (fixed gain) filter on regular grids
+        :param square_root: flag to notify whether to use the square-root (Cholesky factor) filter and smoother
+        :param segment_length: the number of steps per checkpointed segment of the filter, which trades memory for
+                               compute when differentiating the filter (see utils.checkpointed_scan). 'sqrt' uses
+                               √N steps per segment, and None (the default) stores every step
+        :param bucket_size: if supplied, the inputs to the filter and smoother are padded with masked dummy steps up
+                            to a multiple of bucket_size, so that data sets of similar sizes share the compiled
+                            filter and smoother (see bucket_inputs)
+        :param conjugate: flag to notify whether to use the exact sites of the Gaussian likelihood, 𝓝(yₙ|fₙ,σ²),
+                          rather than computing them with the approximate inference method (see conjugate_sites)
+        :param kronecker: flag to notify whether to use the Kronecker-structured filter and smoother (spatio-temporal
+                          priors only, see kronecker_kalman_filter)
+        :param decoupled: flag to notify whether to filter and smooth the independent spatial eigenmodes (conjugate
+                          mode on a fixed spatial grid only, see decoupled_kalman_filter)
         """
         (self.t_all, self.y_all, self.r_all,
          self.t_train, self.y_train, self.r_train,
@@ -44,6 +105,9 @@ class SDEGP(object):
          self.dt_all, self.dt_train,
          self.train_id, self.test_id, self.mask
          ) = input_admin(t, y, r, t_test, y_test, r_test)
+        # the unique step sizes, so that the transition matrices are computed once per unique step
+        self.train_steps = compress_steps(self.dt_train)
+        self.all_steps = compress_steps(self.dt_all)
         self.prior = prior
         self.likelihood = likelihood
         # construct the state space model:
@@ -55,6 +119,71 @@ class SDEGP(object):
         self.minf = np.zeros([self.state_dim, 1])  # stationary state mean
         self.sites = EP() if approx_inf is None else approx_inf
         print('inference method is', self.sites.name)
+        self.parallel = parallel
+        if self.parallel:
+            print('using the parallel-in-time filter and smoother')
+        self.steady_state = steady_state
+        if self.steady_state:
+            if self.likelihood.name != 'Gaussian':
+                raise NotImplementedError('the steady-state filter is only implemented for the Gaussian likelihood')
+            if not nnp.allclose(self.r_train, self.r_train[:1], equal_nan=True):
+                raise NotImplementedError('the steady-state filter requires a time-invariant measurement model')
+            if self.train_steps[0].shape[0] > 2:
+                print('training data is not regularly sampled, the full Kalman filter will be used')
+            else:
+                print('using the steady-state Kalman filter')
+        self.square_root = square_root
+        if self.square_root:
+            if self.parallel or self.steady_state:
+                raise NotImplementedError('the square-root filter cannot be combined with the parallel or '
+                                          'steady-state filters')
+            print('using the square-root filter and smoother')
+        self.kronecker = kronecker
+        if self.kronecker:
+            # spatio-temporal priors expose the factors of their Kronecker-structured state space model
+            if not hasattr(self.prior, 'kronecker_factors'):
+                raise NotImplementedError('the Kronecker-structured filter requires a spatio-temporal prior')
+            if self.parallel or self.steady_state or self.square_root:
+                raise NotImplementedError('the Kronecker-structured filter cannot be combined with the parallel, '
+                                          'steady-state or square-root filters')
+            print('using the Kronecker-structured filter and smoother')
+        if segment_length == 'sqrt':
+            segment_length = int(nnp.ceil(nnp.sqrt(self.t_train.shape[0])))
+        self.segment_length = segment_length
+        if self.segment_length is not None:
+            print('using checkpointed filtering with', self.segment_length, 'steps per segment')
+        self.conjugate = conjugate
+        if self.conjugate:
+            if self.likelihood.name != 'Gaussian':
+                raise NotImplementedError('the conjugate mode is only implemented for the Gaussian likelihood')
+            print('using the exact conjugate sites, the approximate inference method is not used')
+        self.decoupled = decoupled
+        if self.decoupled:
+            # on a fixed grid with homoscedastic Gaussian noise, the spatial eigenmodes are independent. The sites
+            # must be the exact ones, 𝓝(fₙ|yₙ,σ²I), since the decoupled filter uses σ² rather than the site covariances
+            if not (hasattr(self.prior, 'kronecker_factors') and self.prior.fixed_grid):
+                raise NotImplementedError('the decoupled filter requires a spatio-temporal prior on a fixed grid')
+            if not self.conjugate:
+                raise NotImplementedError('the decoupled filter requires the exact sites of the conjugate mode')
+            if self.parallel or self.steady_state or self.square_root:
+                raise NotImplementedError('the decoupled filter cannot be combined with the parallel, '
+                                          'steady-state or square-root filters')
+            print('using the decoupled spatial eigenbasis filter and smoother')
+        self.bucket_size = bucket_size
+        if self.bucket_size is not None:
+            if self.steady_state:
+                raise NotImplementedError('shape bucketing relies on masking, so cannot be combined with the '
+                                          'steady-state filter')
+            print('padding the data to a multiple of', self.bucket_size, 'steps')
+        # the (padded) inputs to the filter and smoother during training: y, dt, r, mask, steps
+        self.train_inputs = self.bucket_inputs(self.y_train, self.dt_train, self.r_train, None, self.train_steps)
+        # the state of the online filter: the most recent input and the filtering distribution there
+        self.online_state = None
+        self.online_neg_log_marg_lik = None
+        self.online_site_params = []
+        # the smoothed training states used for fast prediction at new test inputs (see bridge_fit)
+        self.bridge_cache = None
+        self.fit_log = []
 
     def predict(self, y=None, dt=None, mask=None, site_params=None, sampling=False,
                 r=None, return_full=False, compute_nlpd=True):
@@ -79,22 +208,22 @@ class SDEGP(object):
         """
         y = self.y_all if y is None else y
         r = self.r_all if r is None else r
+        steps = self.all_steps if dt is None else compress_steps(dt)
         dt = self.dt_all if dt is None else dt
         mask = self.mask if mask is None else mask
         params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
         site_params = self.sites.site_params if site_params is None else site_params
         if site_params is not None and not sampling:
-            # construct a vector of site parameters that is the full size of the test data
-            # test site parameters are 𝓝(0,∞), and will not be used
-            site_mean = np.zeros([dt.shape[0], self.func_dim, 1])
-            site_cov = 1e5 * np.tile(np.eye(self.func_dim), (dt.shape[0], 1, 1))
-            # replace parameters at training locations with the supplied sites
-            site_mean = index_add(site_mean, index[self.train_id], site_params[0])
-            site_cov = index_update(site_cov, index[self.train_id], site_params[1])
-            site_params = (site_mean, site_cov)
-        _, (filter_mean, filter_cov, site_params) = self.kalman_filter(y, dt, params, True, mask, site_params, r)
+            site_params = self.expand_sites(site_params, dt.shape[0], self.train_id)
+        num_steps = dt.shape[0]
+        y, dt, r, mask, steps = self.bucket_inputs(y, dt, r, mask, steps)
+        site_params = self.bucket_sites(site_params)
+        _, (filter_mean, filter_cov, site_params) = self.kalman_filter(y, dt, params, True, mask, site_params, r,
+                                                                       steps)
         _, posterior_mean, posterior_cov = self.rauch_tung_striebel_smoother(params, filter_mean, filter_cov, dt,
-                                                                             True, return_full, None, None, r)
+                                                                             True, return_full, None, None, r, steps)
+        posterior_mean, posterior_cov, site_params = self.unbucket((posterior_mean, posterior_cov, site_params),
+                                                                   num_steps)
         if compute_nlpd:
             nlpd_test = self.negative_log_predictive_density(self.t_all[self.test_id], self.y_all[self.test_id],
                                                              posterior_mean[self.test_id],
@@ -113,11 +242,214 @@ class SDEGP(object):
                                                          softplus_list(self.prior.hyp))
         return posterior_mean, posterior_cov, site_params, nlpd_test
 
-    @partial(jit, static_argnums=0)
+    def expand_sites(self, site_params, num_steps, train_id):
+        """
+        Construct a vector of site parameters that is the full size of the training and test data, by placing the
+        supplied sites at the training locations. The test site parameters are 𝓝(0,∞), and will not be used.
+        :param site_params: the sites at the training locations [2, N, obs_dim]
+        :param num_steps: the number of training and test locations [scalar]
+        :param train_id: the index of each training location [N]
+        :return:
+            site_params: the sites at the training and test locations [2, M, obs_dim]
+        """
+        site_mean = np.zeros([num_steps, self.func_dim, 1])
+        site_cov = 1e5 * np.tile(np.eye(self.func_dim), (num_steps, 1, 1))
+        site_mean = index_add(site_mean, index[train_id], site_params[0])
+        site_cov = index_update(site_cov, index[train_id], site_params[1])
+        return site_mean, site_cov
+
+    @jit
     def compute_measurement(self, r, mean, cov, hyp_prior):
         H = self.prior.measurement_model(r, hyp_prior)
         return H @ mean, H @ cov @ H.T
 
+    def bucket_inputs(self, y, dt, r, mask=None, steps=None):
+        """
+        Pad the inputs to the filter and smoother up to the next multiple of bucket_size with dummy steps at the end
+        of the time series. The dummy steps have Δt=0 and are masked, so they do not change the filtering and
+        smoothing distributions at the real steps or the energy. Data sets of similar sizes (e.g. the folds of a
+        cross-validation, or a growing data set) then have the same shapes, and share the compiled filter and smoother.
+        If bucket_size is None then the inputs are returned unchanged.
+        :param y: observed data [N, obs_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param r: spatial input locations [N, R]
+        :param mask: boolean array signifying which elements of y are masked [N, obs_dim]
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            the padded y, dt, r, mask and steps
+        """
+        steps = compress_steps(dt) if steps is None else steps
+        if self.bucket_size is None:
+            return y, dt, r, mask, steps
+        mask = nnp.zeros(y.shape, dtype=bool) if mask is None else mask
+        return (pad_to_bucket(y, self.bucket_size, 0.), pad_to_bucket(dt, self.bucket_size, 0.),
+                pad_to_bucket(r, self.bucket_size), pad_to_bucket(mask, self.bucket_size, True),
+                (steps[0], pad_to_bucket(steps[1], self.bucket_size, 0)))  # index 0 is always Δt=0
+
+    def bucket_sites(self, site_params):
+        """
+        Pad the sites to match the inputs returned by bucket_inputs. The sites of the dummy steps are never used.
+        """
+        if self.bucket_size is None or site_params is None:
+            return site_params
+        return tree_map(lambda x: pad_to_bucket(x, self.bucket_size), site_params)
+
+    def unbucket(self, outputs, num_steps):
+        """
+        Remove the dummy steps added by bucket_inputs from the filter / smoother outputs.
+        """
+        if self.bucket_size is None:
+            return outputs
+        return tree_map(lambda x: x[:num_steps], outputs)
+
+    def bridge_fit(self, params=None):
+        """
+        Compute and store the smoothed training states used by bridge_predict(), i.e. the marginals p(xₙ|y) and
+        the cross-covariances Cov[xₙ,xₙ₊₁|y] of neighbouring states. This should be called again after the
+        hyperparameters or sites have been updated.
+        :param params: the model parameters. If not supplied then defaults to the model's
+                       assigned parameters [num_params]
+        """
+        if params is None:
+            params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
+        site_params = self.sites.site_params
+        if site_params is None:  # initialise the sites with a single filtering pass
+            _, (_, _, site_params) = self.kalman_filter(self.y_train, self.dt_train, params, True, None, None,
+                                                        self.r_train, self.train_steps)
+        smoothed_mean, smoothed_cov, smoothed_cross_cov = self.bridge_states(params, site_params, self.dt_train,
+                                                                             self.r_train, self.train_steps)
+        self.bridge_cache = (params, np.array(self.t_train[:, 0]), smoothed_mean, smoothed_cov, smoothed_cross_cov)
+
+    def bridge_predict(self, t_test, r_test=None):
+        """
+        Calculate the posterior predictive distribution p(f*|y) at arbitrary test inputs without re-filtering the
+        data. Each test state is conditioned on its two neighbouring training states (found by binary search),
+        using the smoothed marginals and cross-covariances stored by bridge_fit(). By the Markov property,
+            p(x*|y) = ∫ p(x*|xₙ,xₙ₊₁) p(xₙ,xₙ₊₁|y) dxₙ dxₙ₊₁,
+        where p(x*|xₙ,xₙ₊₁) is the prior bridge between the two training inputs, tₙ ≤ t* ≤ tₙ₊₁. Test inputs
+        outside the training range are conditioned on the nearest training state only. The cost is O(N* state_dim³).
+        The test inputs are padded to a power of two, so that new sets of test inputs rarely trigger a recompile.
+        :param t_test: the test inputs [N*, 1]
+        :param r_test: the spatial test inputs [N*, R]. Defaults to the spatial inputs of the last training point.
+        :return:
+            posterior_mean: the posterior predictive mean [N*, func_dim, 1]
+            posterior_cov: the posterior predictive covariance [N*, func_dim, func_dim]
+        """
+        if self.bridge_cache is None:
+            self.bridge_fit()
+        # here we use non-JAX numpy to sort out the padding of the test inputs
+        t_test = nnp.asarray(t_test, dtype=nnp.float64).reshape(-1)
+        num_test = t_test.shape[0]
+        if r_test is None:
+            r_test = nnp.tile(nnp.asarray(self.r_train[-1:]), (num_test, 1))
+        r_test = nnp.asarray(r_test, dtype=nnp.float64).reshape(num_test, -1)
+        num_pad = 2 ** int(nnp.ceil(nnp.log2(max(num_test, 1)))) - num_test
+        t_test = nnp.concatenate([t_test, nnp.repeat(t_test[-1:], num_pad)])
+        r_test = nnp.concatenate([r_test, nnp.repeat(r_test[-1:], num_pad, axis=0)])
+        posterior_mean, posterior_cov = self.bridge_query(np.array(t_test), np.array(r_test), *self.bridge_cache)
+        return posterior_mean[:num_test], posterior_cov[:num_test]
+
+    @jit
+    def bridge_states(self, params, site_params, dt, r, steps):
+        """
+        Run the Kalman filter and RTS smoother across the training data with fixed sites, and return the smoothed
+        marginals and the cross-covariances of neighbouring states, Cov[xₙ,xₙ₊₁|y] = Gₙ Pₙ₊₁ˢ, where Gₙ is the
+        smoother gain.
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
+        :param dt: the step sizes, Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param r: the spatial inputs [N, R]
+        :param steps: the compressed step sizes and their indices (see compress_steps)
+        :return:
+            smoothed_mean: the smoothed state means [N, state_dim, 1]
+            smoothed_cov: the smoothed state covariances [N, state_dim, state_dim]
+            smoothed_cross_cov: Cov[xₙ,xₙ₊₁|y], padded with zeros at the last input [N, state_dim, state_dim]
+        """
+        theta_prior = softplus_list(params[0])
+        self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
+        A_table, dt_index = self.transition_table(dt, theta_prior, steps)
+
+        def forward_step(carry, inputs):
+            m, P = carry
+            dt_index_n, r_n, site_mean, site_cov = inputs
+            A = A_table[dt_index_n]
+            m_ = A @ m
+            P_ = A @ (P - self.Pinf) @ A.T + self.Pinf
+            H = self.prior.measurement_model(r_n, theta_prior)
+            S = H @ P_ @ H.T + site_cov
+            K = solve(S, H @ P_).T  # HP(S^-1)
+            m = m_ + K @ (site_mean - H @ m_)
+            P = P_ - K @ S @ K.T
+            return (m, P), (m, P)
+
+        def backward_step(carry, inputs):
+            m, P = carry
+            m_filtered_n, P_filtered_n, dt_index_n = inputs  # dt_index_n is the index of the step tₙ -> tₙ₊₁
+            A = A_table[dt_index_n]
+            m_predicted = A @ m_filtered_n
+            P_predicted = A @ (P_filtered_n - self.Pinf) @ A.T + self.Pinf
+            G_transpose = solve(P_predicted, A @ P_filtered_n)  # (P^-1)AF
+            cross_cov = G_transpose.T @ P
+            m = m_filtered_n + G_transpose.T @ (m - m_predicted)
+            P = P_filtered_n + G_transpose.T @ (P - P_predicted) @ G_transpose
+            return (m, P), (m, P, cross_cov)
+
+        _, (m_filtered, P_filtered) = lax.scan(forward_step, (self.minf, self.Pinf),
+                                               (dt_index, r, site_params[0], site_params[1]))
+        flip = partial(tree_map, lambda x: x[::-1])
+        _, smoothed = lax.scan(backward_step, (m_filtered[-1], P_filtered[-1]),
+                               flip((m_filtered[:-1], P_filtered[:-1], dt_index[1:])))
+        smoothed_mean, smoothed_cov, smoothed_cross_cov = flip(smoothed)
+        smoothed_mean = np.concatenate([smoothed_mean, m_filtered[-1:]])
+        smoothed_cov = np.concatenate([smoothed_cov, P_filtered[-1:]])
+        smoothed_cross_cov = np.concatenate([smoothed_cross_cov, np.zeros_like(P_filtered[-1:])])
+        return smoothed_mean, smoothed_cov, smoothed_cross_cov
+
+    @jit
+    def bridge_query(self, t_test, r_test, params, t_train, smoothed_mean, smoothed_cov, smoothed_cross_cov):
+        """
+        Condition each test state on its neighbouring smoothed training states (see bridge_predict). With
+        A₁ = A(t*-tₙ), A₂ = A(tₙ₊₁-t*) and process noise covariances Q₁, Q₂, the prior bridge is
+            p(x*|xₙ,xₙ₊₁) = 𝓝(x*|B xₙ + W xₙ₊₁, Q₁ - W (A₂Q₁A₂' + Q₂) W'),
+        where W = Q₁A₂'(A₂Q₁A₂' + Q₂)⁻¹ and B = (I - WA₂)A₁. A missing neighbour is handled by setting its
+        transition matrix to zero, which recovers the stationary prior at that side.
+        :param t_test: the test inputs [N*]
+        :param r_test: the spatial test inputs [N*, R]
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param t_train: the training inputs [N]
+        :param smoothed_mean: the smoothed training state means [N, state_dim, 1]
+        :param smoothed_cov: the smoothed training state covariances [N, state_dim, state_dim]
+        :param smoothed_cross_cov: Cov[xₙ,xₙ₊₁|y] [N, state_dim, state_dim]
+        :return:
+            posterior_mean: the posterior predictive mean [N*, func_dim, 1]
+            posterior_cov: the posterior predictive covariance [N*, func_dim, func_dim]
+        """
+        theta_prior = softplus_list(params[0])
+        self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
+        N = t_train.shape[0]
+        right_index = np.searchsorted(t_train, t_test)  # the index of the first training input with tₙ ≥ t*
+
+        def query(t_n, r_n, right_index_n):
+            has_left, has_right = right_index_n > 0, right_index_n < N
+            left, right = np.maximum(right_index_n - 1, 0), np.minimum(right_index_n, N - 1)
+            dt_left = np.where(has_left, t_n - t_train[left], 0.)
+            dt_right = np.where(has_right, t_train[right] - t_n, 0.)
+            A1 = np.where(has_left, self.prior.state_transition(dt_left, theta_prior), 0.)
+            A2 = np.where(has_right, self.prior.state_transition(dt_right, theta_prior), 0.)
+            Q1 = self.Pinf - A1 @ self.Pinf @ A1.T
+            Q2 = self.Pinf - A2 @ self.Pinf @ A2.T
+            Q12 = A2 @ Q1 @ A2.T + Q2
+            W = solve(Q12, A2 @ Q1).T  # Q₁A₂'(Q₁₂^-1)
+            B = A1 - W @ A2 @ A1
+            cross_cov = smoothed_cross_cov[left]
+            m = B @ smoothed_mean[left] + W @ smoothed_mean[right]
+            P = (B @ smoothed_cov[left] @ B.T + B @ cross_cov @ W.T + W @ cross_cov.T @ B.T
+                 + W @ smoothed_cov[right] @ W.T + Q1 - W @ Q12 @ W.T)
+            H = self.prior.measurement_model(r_n, theta_prior)
+            return H @ m, H @ P @ H.T
+
+        return vmap(query)(t_test, r_test, right_index)
+
     def negative_log_predictive_density(self, t_test, y_test, m_test, v_test, hyp_prior, hyp_lik, full_cov):
         """
         Compute the (normalised) negative log predictive density (NLPD) of the test data yₙ*:
@@ -159,18 +491,21 @@ class SDEGP(object):
         if params is None:
             # fetch the model parameters from the prior and the likelihood
             params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
-        neg_log_marg_lik, dlZ = value_and_grad(self.kalman_filter, argnums=2)(self.y_train, self.dt_train,
-                                                                              params, False, None,
-                                                                              self.sites.site_params, self.r_train)
+        y, dt, r, mask, steps = self.train_inputs
+        neg_log_marg_lik, dlZ = value_and_grad(self.kalman_filter, argnums=2)(y, dt, params, False, mask,
+                                                                              self.bucket_sites(self.sites.site_params),
+                                                                              r, steps)
         return neg_log_marg_lik, dlZ
 
-    def run(self, params=None):
+    def run(self, params=None, batch_sites=False):
         """
         A single parameter update step - to be fed to a gradient-based optimiser.
          - we first compute the marginal likelihood and its gradient w.r.t. the hyperparameters via filtering
          - then update the site parameters via smoothing (site mean and variance)
         :param params: the model parameters. If not supplied then defaults to the model's
                        assigned parameters [num_params]
+        :param batch_sites: flag to notify whether to update all the sites in one batch after the backward pass of
+                            the smoother, rather than inside its sequential loop (see rauch_tung_striebel_smoother)
         :return:
             neg_log_marg_lik: the negative log-marginal likelihood -log p(y), i.e. the energy [scalar]
             dlZ: the derivative of the energy w.r.t. the model parameters [num_params]
@@ -178,20 +513,23 @@ class SDEGP(object):
         if params is None:
             # fetch the model parameters from the prior and the likelihood
             params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
+        y, dt, r, mask, steps = self.train_inputs
+        if self.conjugate:  # the sites are exact, so only the energy and its gradient are required
+            return value_and_grad(self.kalman_filter, argnums=2)(y, dt, params, False, mask, None, r, steps)
         # run the forward filter to calculate the filtering distribution and compute the negative
         # log-marginal likelihood and its gradient in order to update the hyperparameters
+        site_params = self.bucket_sites(self.sites.site_params)
         (neg_log_marg_lik, aux), dlZ = value_and_grad(self.kalman_filter,
-                                                      argnums=2, has_aux=True)(self.y_train, self.dt_train, params,
-                                                                               True, None, self.sites.site_params,
-                                                                               self.r_train)
-        filter_mean, filter_cov, self.sites.site_params = aux
+                                                      argnums=2, has_aux=True)(y, dt, params, True, mask,
+                                                                               site_params, r, steps)
+        filter_mean, filter_cov, site_params = aux
         # run the smoother and update the sites
-        self.sites.site_params = self.rauch_tung_striebel_smoother(params, filter_mean, filter_cov, self.dt_train,
-                                                                   False, False, self.y_train,
-                                                                   self.sites.site_params, self.r_train)
+        site_params = self.rauch_tung_striebel_smoother(params, filter_mean, filter_cov, dt, False, False, y,
+                                                        site_params, r, steps, batch_sites, mask)
+        self.sites.site_params = self.unbucket(site_params, self.y_train.shape[0])
         return neg_log_marg_lik, dlZ
 
-    def run_two_stage(self, params=None):
+    def run_two_stage(self, params=None, batch_sites=False):
         """
         Note: This 2-stage version has been replaced by the more elegant implementation above, however we
         keep this method because it is more accurate, and faster in practice for small datasets.
@@ -200,6 +538,8 @@ class SDEGP(object):
          - then compute the marginal lilelihood and its gradient w.r.t. the hyperparameters
         :param params: the model parameters. If not supplied then defaults to the model's
                        assigned parameters [num_params]
+        :param batch_sites: flag to notify whether to update all the sites in one batch after the backward pass of
+                            the smoother, rather than inside its sequential loop (see rauch_tung_striebel_smoother)
         :return:
             neg_log_marg_lik: the negative log-marginal likelihood -log p(y), i.e. the energy [scalar]
             dlZ: the derivative of the energy w.r.t. the model parameters [num_params]
@@ -207,21 +547,325 @@ class SDEGP(object):
         if params is None:
             # fetch the model parameters from the prior and the likelihood
             params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
+        if self.conjugate:  # the sites are exact, so there is no site update stage
+            return self.run(params, batch_sites)
         # run the forward filter to calculate the filtering distribution
         # if self.sites.site_params=None then the filter initialises the sites too
-        _, (filter_mean, filter_cov, self.sites.site_params) = self.kalman_filter(self.y_train, self.dt_train, params,
-                                                                                  True, None, self.sites.site_params,
-                                                                                  self.r_train)
+        y, dt, r, mask, steps = self.train_inputs
+        _, (filter_mean, filter_cov, site_params) = self.kalman_filter(y, dt, params, True, mask,
+                                                                       self.bucket_sites(self.sites.site_params),
+                                                                       r, steps)
         # run the smoother and update the sites
-        self.sites.site_params = self.rauch_tung_striebel_smoother(params, filter_mean, filter_cov, self.dt_train,
-                                                                   False, False, self.y_train,
-                                                                   self.sites.site_params, self.r_train)
+        site_params = self.rauch_tung_striebel_smoother(params, filter_mean, filter_cov, dt, False, False, y,
+                                                        site_params, r, steps, batch_sites, mask)
+        self.sites.site_params = self.unbucket(site_params, self.y_train.shape[0])
         # compute the negative log-marginal likelihood and its gradient in order to update the hyperparameters
-        neg_log_marg_lik, dlZ = value_and_grad(self.kalman_filter, argnums=2)(self.y_train, self.dt_train, params,
-                                                                              False, None, self.sites.site_params,
-                                                                              self.r_train)
+        neg_log_marg_lik, dlZ = value_and_grad(self.kalman_filter, argnums=2)(y, dt, params, False, mask,
+                                                                              site_params, r, steps)
         return neg_log_marg_lik, dlZ
 
+    def precompile(self, batch_sites=False):
+        """
+        Compile the filter, smoother and predictor for the model's configuration and data shapes ahead of time,
+        rather than on the first calls to run() and predict(), so that the compilation is paid when the model is built
+        rather than inside the training loop. The executables are cached in memory, so models with the same structure
+        and data shapes (see bucket_size) reuse them. The model's sites and hyperparameters are not modified.
+        :param batch_sites: flag to notify whether to compile the batched site update of the smoother (see run)
+        :return:
+            time_taken: the wall-clock time spent compiling the executables [scalar]
+        """
+        t0 = time.time()
+        params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
+        y, dt, r, mask, steps = self.train_inputs
+        site_params = self.bucket_sites(self.sites.site_params)
+        if self.conjugate:
+            value_and_grad(self.kalman_filter, argnums=2)(y, dt, params, False, mask, None, r, steps)
+            posterior_mean, _, _, _ = self.predict(compute_nlpd=False)
+            posterior_mean.block_until_ready()
+            return time.time() - t0
+        if site_params is None:  # the first run() differentiates the filtering pass that initialises the sites
+            (_, (_, _, site_params)), _ = value_and_grad(self.kalman_filter,
+                                                         argnums=2, has_aux=True)(y, dt, params, True, mask, None,
+                                                                                  r, steps)
+        # run()
+        (_, (filter_mean, filter_cov, _)), _ = value_and_grad(self.kalman_filter,
+                                                              argnums=2, has_aux=True)(y, dt, params, True, mask,
+                                                                                       site_params, r, steps)
+        site_params = self.rauch_tung_striebel_smoother(params, filter_mean, filter_cov, dt, False, False, y,
+                                                        site_params, r, steps, batch_sites, mask)
+        # run_two_stage() and neg_log_marg_lik()
+        value_and_grad(self.kalman_filter, argnums=2)(y, dt, params, False, mask, site_params, r, steps)
+        # predict()
+        site_params = self.unbucket(site_params, self.y_train.shape[0])
+        posterior_mean, _, _, _ = self.predict(site_params=site_params, compute_nlpd=False)
+        posterior_mean.block_until_ready()
+        return time.time() - t0
+
+    def fit(self, optimiser=None, num_iters=250, energy_tol=1e-4, site_tol=1e-4, two_stage=False, batch_sites=False,
+            verbose=False):
+        """
+        Iterate the site and hyperparameter updates until convergence. Each sweep calls run() (or run_two_stage()),
+        which updates the sites, followed by a single optimiser step on the hyperparameters. The loop stops early
+        once both the change in the energy and the largest change in the site parameters between consecutive sweeps
+        fall below their tolerances, so no iterations are spent after the model has converged.
+        The per-sweep telemetry is stored in self.fit_log.
+        :param optimiser: a (opt_init, opt_update, get_params) triple from jax.experimental.optimizers. If not
+                          supplied then Adam with step size 0.05 is used
+        :param num_iters: the maximum number of sweeps [scalar]
+        :param energy_tol: tolerance on the change in the energy, relative to its magnitude [scalar]
+        :param site_tol: tolerance on the absolute change in the site means and covariances [scalar]
+        :param two_stage: flag to notify whether to use run_two_stage() rather than run()
+        :param batch_sites: flag to notify whether to batch the site updates in the smoother (see run)
+        :param verbose: flag to notify whether to print the telemetry of each sweep
+        :return:
+            fit_log: a list with one entry per sweep, containing the iteration number, the wall time of the sweep,
+                     the energy, and the largest change in the site parameters
+        """
+        if optimiser is None:
+            optimiser = optimizers.adam(step_size=5e-2)
+        opt_init, opt_update, get_params = optimiser
+        opt_state = opt_init([self.prior.hyp, self.likelihood.hyp])
+        step = self.run_two_stage if two_stage else self.run
+        self.fit_log = []
+        prev_energy = None
+        for i in range(num_iters):
+            t0 = time.time()
+            params = get_params(opt_state)
+            self.prior.hyp, self.likelihood.hyp = params[0], params[1]
+            prev_sites = self.sites.site_params
+            neg_log_marg_lik, dlZ = step(params, batch_sites)
+            opt_state = opt_update(i, dlZ, opt_state)
+            energy = float(neg_log_marg_lik)  # blocks until the sweep has finished
+            if self.conjugate:  # the sites are exact, so only the energy needs to converge
+                site_delta = 0.
+            elif prev_sites is None:
+                site_delta = np.inf
+            else:
+                site_delta = float(np.maximum(np.max(np.abs(self.sites.site_params[0] - prev_sites[0])),
+                                              np.max(np.abs(self.sites.site_params[1] - prev_sites[1]))))
+            energy_delta = np.inf if prev_energy is None else abs(energy - prev_energy)
+            self.fit_log.append({'iter': i, 'time': time.time() - t0, 'energy': energy, 'site_delta': site_delta})
+            if verbose:
+                print('iter %2d: nlml=%2.2f, site delta=%1.2e, time=%2.2f secs' %
+                      (i, energy, site_delta, self.fit_log[-1]['time']))
+            if energy_delta <= energy_tol * (1. + abs(energy)) and site_delta <= site_tol:
+                if verbose:
+                    print('converged after %d iterations' % (i + 1))
+                break
+            prev_energy = energy
+        params = get_params(opt_state)
+        self.prior.hyp, self.likelihood.hyp = params[0], params[1]
+        return self.fit_log
+
+    def train(self, optimiser=None, num_iters=250, chunk_size=50, two_stage=False, batch_sites=False, verbose=False):
+        """
+        Optimise the hyperparameters with the whole training loop compiled on device. The iterations are run in
+        chunks of chunk_size steps, each of which is a single lax.scan over the site updates and the optimiser
+        updates (see train_chunk), so that there is no Python dispatch or host synchronisation between the steps
+        of a chunk. The energies are only transferred to the host, and logged, at the chunk boundaries.
+        The per-chunk telemetry is stored in self.fit_log.
+        :param optimiser: a (opt_init, opt_update, get_params) triple from jax.experimental.optimizers. If not
+                          supplied then Adam with step size 0.05 is used
+        :param num_iters: the number of optimisation steps [scalar]
+        :param chunk_size: the number of steps compiled into a single call [scalar]
+        :param two_stage: flag to notify whether each step follows run_two_stage() rather than run()
+        :param batch_sites: flag to notify whether to batch the site updates in the smoother (see run)
+        :param verbose: flag to notify whether to print the telemetry of each chunk
+        :return:
+            neg_log_marg_lik: the energy at each step [num_iters]
+        """
+        if optimiser is None:
+            optimiser = optimizers.adam(step_size=5e-2)
+        opt_init, opt_update, get_params = optimiser
+        opt_state = opt_init([self.prior.hyp, self.likelihood.hyp])
+        y, dt, r, mask, steps = self.train_inputs
+        site_params = self.bucket_sites(self.sites.site_params)
+        if site_params is None and not self.conjugate:  # initialise the sites with a single filtering pass
+            _, (_, _, site_params) = self.kalman_filter(y, dt, get_params(opt_state), True, mask, None, r, steps)
+        self.fit_log = []
+        neg_log_marg_lik = []
+        for start in range(0, num_iters, chunk_size):
+            t0 = time.time()
+            num_steps = min(chunk_size, num_iters - start)
+            opt_state, site_params, energy = self.train_chunk(opt_state, site_params, self.train_inputs, opt_update,
+                                                              get_params, np.arange(start, start + num_steps),
+                                                              two_stage, batch_sites)
+            energy = nnp.array(energy)  # blocks until the chunk has finished
+            time_taken = time.time() - t0
+            neg_log_marg_lik.append(energy)
+            self.fit_log.append({'iter': start + num_steps - 1, 'time': time_taken, 'energy': energy[-1],
+                                 'time_per_iter': time_taken / num_steps})
+            if verbose:
+                print('iter %2d: nlml=%2.2f, time per iteration=%2.4f secs' %
+                      (start + num_steps - 1, energy[-1], self.fit_log[-1]['time_per_iter']))
+        self.sites.site_params = self.unbucket(site_params, self.y_train.shape[0])
+        params = get_params(opt_state)
+        self.prior.hyp, self.likelihood.hyp = params[0], params[1]
+        return nnp.concatenate(neg_log_marg_lik)
+
+    @partial(jit, static_argnums=(4, 5, 7, 8))
+    def train_chunk(self, opt_state, site_params, inputs, opt_update, get_params, iters, two_stage=False,
+                    batch_sites=False):
+        """
+        Run a chunk of optimisation steps as a single scan. Each step updates the sites and the hyperparameters in
+        the same way as run() (or run_two_stage()), followed by opt_update.
+        :param opt_state: the optimiser state
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
+        :param inputs: the training inputs to the filter and smoother, (y, dt, r, mask, steps)
+        :param opt_update: the optimiser update function
+        :param get_params: the function mapping the optimiser state to the model parameters
+        :param iters: the iteration numbers of the steps in the chunk [num_steps]
+        :param two_stage: flag to notify whether each step follows run_two_stage() rather than run()
+        :param batch_sites: flag to notify whether to batch the site updates in the smoother (see run)
+        :return:
+            opt_state: the updated optimiser state
+            site_params: the updated site parameters [2, N, obs_dim]
+            neg_log_marg_lik: the energy at each step [num_steps]
+        """
+        y, dt, r, mask, steps = inputs
+
+        def step(carry, i):
+            opt_state_, site_params_ = carry
+            params = get_params(opt_state_)
+            if self.conjugate:  # the sites are exact, so each step is a single differentiated filtering pass
+                neg_log_marg_lik, dlZ = value_and_grad(self.kalman_filter, argnums=2)(y, dt, params, False, mask,
+                                                                                      None, r, steps)
+                return (opt_update(i, dlZ, opt_state_), site_params_), neg_log_marg_lik
+            if two_stage:
+                _, (filter_mean, filter_cov, site_params_) = self.kalman_filter(y, dt, params, True, mask,
+                                                                                site_params_, r, steps)
+            else:
+                (neg_log_marg_lik, aux), dlZ = value_and_grad(self.kalman_filter,
+                                                              argnums=2, has_aux=True)(y, dt, params, True, mask,
+                                                                                       site_params_, r, steps)
+                filter_mean, filter_cov, site_params_ = aux
+            site_params_ = self.rauch_tung_striebel_smoother(params, filter_mean, filter_cov, dt, False, False, y,
+                                                             site_params_, r, steps, batch_sites, mask)
+            if two_stage:
+                neg_log_marg_lik, dlZ = value_and_grad(self.kalman_filter, argnums=2)(y, dt, params, False, mask,
+                                                                                      site_params_, r, steps)
+            return (opt_update(i, dlZ, opt_state_), site_params_), neg_log_marg_lik
+
+        (opt_state, site_params), neg_log_marg_lik = lax.scan(step, (opt_state, site_params), iters)
+        return opt_state, site_params, neg_log_marg_lik
+
+    def online_reset(self, params=None):
+        """
+        (Re)initialise the online filter (see online_update) at the filtering distribution of the last training
+        input, by filtering the training data with the current sites. This should be called again after the
+        hyperparameters or sites have been updated.
+        :param params: the model parameters. If not supplied then defaults to the model's
+                       assigned parameters [num_params]
+        :return:
+            neg_log_marg_lik: the energy of the training data, -log p(y₁,...,y_N) [scalar]
+        """
+        if params is None:
+            params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
+        y, dt, r, site_params = self.y_train, self.dt_train, self.r_train, self.bucket_sites(self.sites.site_params)
+        if self.bucket_size is not None:  # the dummy steps are marked as missing (nan) and have Δt=0
+            y, dt, r = (pad_to_bucket(y, self.bucket_size, np.nan), pad_to_bucket(dt, self.bucket_size, 0.),
+                        pad_to_bucket(r, self.bucket_size))
+        neg_log_marg_lik, filter_mean, filter_cov, _ = self.online_kalman_filter(y, dt, params, None, None, r,
+                                                                                 site_params)
+        self.online_state = (float(self.t_train[-1, 0]), filter_mean, filter_cov)
+        self.online_neg_log_marg_lik = neg_log_marg_lik
+        self.online_site_params = []
+        return neg_log_marg_lik
+
+    def online_update(self, t, y, r=None):
+        """
+        Incorporate new observations into the online filter, one at a time or as a micro-batch, without re-filtering
+        the data seen so far. The filtering distribution at the most recent input is kept in self.online_state, the
+        running energy -log p(y₁,...,yₙ) in self.online_neg_log_marg_lik, and the sites of each batch of new
+        observations are appended to self.online_site_params. The first call initialises the state from the
+        training data (see online_reset).
+        Each new observation costs O(state_dim³), and its site is computed from the predictive distribution, as in
+        the first pass of the filter. Missing observations can be passed as nans.
+        Note: the online filter always uses the dense state representation, and is compiled once per batch size.
+        :param t: the new inputs, which must not precede the most recent input [B, 1]
+        :param y: the new observations [B, obs_dim]
+        :param r: the new spatial inputs [B, R]
+        :return:
+            neg_log_marg_lik: the running energy, -log p(y₁,...,yₙ) [scalar]
+            filter_mean: the filtering mean at the most recent input [state_dim, 1]
+            filter_cov: the filtering covariance at the most recent input [state_dim, state_dim]
+        """
+        if self.online_state is None:
+            self.online_reset()
+        t_last, filter_mean, filter_cov = self.online_state
+        # here we use non-JAX numpy to sort out the new inputs
+        t = nnp.asarray(t, dtype=nnp.float64).reshape(-1)
+        y = nnp.asarray(y, dtype=nnp.float64).reshape(t.shape[0], -1)
+        r = nnp.nan * t[:, None] if r is None else nnp.asarray(r, dtype=nnp.float64).reshape(t.shape[0], -1)
+        ind = nnp.argsort(t, kind='stable')
+        t, y, r = t[ind], y[ind], r[ind]
+        if t[0] < t_last:
+            raise ValueError('the new inputs precede the most recent input of the online filter')
+        dt = nnp.diff(nnp.concatenate([[t_last], t]))[:, None]
+        params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
+        neg_log_marg_lik, filter_mean, filter_cov, site_params = self.online_kalman_filter(
+            np.array(y), np.array(dt), params, filter_mean, filter_cov, np.array(r)
+        )
+        self.online_state = (float(t[-1]), filter_mean, filter_cov)
+        self.online_neg_log_marg_lik += neg_log_marg_lik
+        self.online_site_params.append(site_params)
+        return self.online_neg_log_marg_lik, filter_mean, filter_cov
+
+    @jit
+    def online_kalman_filter(self, y, dt, params, m=None, P=None, r=None, site_params=None):
+        """
+        Continue the Kalman filter from the filtering distribution 𝓝(xₙ|m,P) by incorporating the observations
+        yₙ₊₁,...,yₙ₊ₖ one at a time. If m and P are not supplied then the filter starts from the prior.
+        The transition matrix is computed for every step, since the step sizes of live data are not known in advance.
+        :param y: observed data, with nans at missing observations [K, obs_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [K] or [K, 1]
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param m: the filtering mean at the previous input [state_dim, 1]
+        :param P: the filtering covariance at the previous input [state_dim, state_dim]
+        :param r: spatial input locations [K, R]
+        :param site_params: the Gaussian approximate likelihoods [2, K, obs_dim]. If not supplied then the sites
+                            are computed from the predictive distributions.
+        :return:
+            neg_log_marg_lik: the energy of the new observations, -log p(yₙ₊₁,...,yₙ₊ₖ|y₁,...,yₙ) [scalar]
+            filtered_mean: the filtering mean at the last input [state_dim, 1]
+            filtered_cov: the filtering covariance at the last input [state_dim, state_dim]
+            site_params: the sites of the new observations [2, K, obs_dim]
+        """
+        theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
+        self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
+        m = self.minf if m is None else m
+        P = self.Pinf if P is None else P
+        mask = np.isnan(y)
+        A_all = vmap(self.prior.state_transition, (0, None))(dt.reshape(-1), theta_prior)
+
+        def step(carry, inputs):
+            neg_log_marg_lik, m, P = carry
+            y_n, A, r_n, mask_n, site_params_n = inputs
+            y_n = y_n[..., np.newaxis]
+            # -- KALMAN PREDICT --
+            m_ = A @ m
+            P_ = A @ (P - self.Pinf) @ A.T + self.Pinf
+            # --- KALMAN UPDATE ---
+            H = self.prior.measurement_model(r_n, theta_prior)
+            predict_mean = H @ m_
+            predict_cov = H @ P_ @ H.T
+            y_n = np.where(mask_n[..., np.newaxis], predict_mean[:y_n.shape[0]], y_n)  # fill in missing obs
+            log_lik_n, site_mean, site_cov = self.sites.update(self.likelihood, y_n, predict_mean, predict_cov,
+                                                               theta_lik, None)
+            if site_params is not None:  # use supplied site parameters to perform the update
+                site_mean, site_cov = site_params_n
+            S = predict_cov + site_cov
+            K = solve(S, H @ P_).T  # HP(S^-1)
+            m = np.where(np.any(mask_n), m_, m_ + K @ (site_mean - predict_mean))
+            P = np.where(np.any(mask_n), P_, P_ - K @ S @ K.T)
+            log_lik_n = np.where(mask_n[..., 0], np.zeros_like(log_lik_n), log_lik_n)
+            neg_log_marg_lik -= np.sum(log_lik_n)
+            return (neg_log_marg_lik, m, P), (site_mean, site_cov)
+
+        (neg_log_marg_lik, m, P), (site_mean, site_cov) = lax.scan(step, (np.array(0.0), m, P),
+                                                                   (y, A_all, r, mask, site_params))
+        return neg_log_marg_lik, m, P, (site_mean, site_cov)
+
     def update_model(self, theta_prior=None):
         """
         Re-construct the SDE-GP model with latest parameters.
@@ -231,8 +875,40 @@ class SDEGP(object):
         """
         self.F, self.L, self.Qc, self.H, self.Pinf = self.prior.kernel_to_state_space(hyperparams=theta_prior)
 
-    @partial(jit, static_argnums=(0, 4))
-    def kalman_filter(self, y, dt, params, store=False, mask=None, site_params=None, r=None):
+    def conjugate_sites(self, y, params):
+        """
+        The exact sites of the Gaussian likelihood, 𝓝(fₙ|yₙ,σ²), i.e. the observations and the observation noise.
+        Missing observations are set to zero, and should be masked.
+        :param y: observed data [N, obs_dim]
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :return:
+            site_mean: the observations [N, obs_dim, 1]
+            site_cov: the observation noise covariances [N, obs_dim, obs_dim]
+        """
+        site_mean = np.where(np.isnan(y), 0., y)[..., np.newaxis]
+        site_cov = softplus(params[1]) * np.tile(np.eye(y.shape[1]), (y.shape[0], 1, 1))
+        return site_mean, site_cov
+
+    def transition_table(self, dt, theta_prior, steps=None):
+        """
+        Compute the discrete-time state transition matrices Aₙ = expm(FΔtₙ).
+        If the unique step sizes are supplied, A is computed once per unique step size, which avoids rebuilding
+        the same matrix at every step on regular grids (or irregular data with only a few distinct gaps).
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param theta_prior: the hyperparameters of the GP prior
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            A: the table of transition matrices [U, state_dim, state_dim]
+            dt_index: the index of each step into the table [N]
+        """
+        if steps is None:
+            steps = (dt, np.arange(dt.shape[0]))
+        dt_unique, dt_index = steps
+        A = vmap(self.prior.state_transition, (0, None))(dt_unique, theta_prior)
+        return A, dt_index
+
+    @partial(jit, static_argnums=(4,))
+    def kalman_filter(self, y, dt, params, store=False, mask=None, site_params=None, r=None, steps=None):
         """
         Run the Kalman filter to get p(fₙ|y₁,...,yₙ).
         The Kalman update step invloves some control flow to work out whether we are
@@ -249,6 +925,7 @@ class SDEGP(object):
         :param mask: boolean array signifying which elements of y are observed [N, obs_dim]
         :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
         :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
         :return:
             if store is True:
                 neg_log_marg_lik: the filter energy, i.e. negative log-marginal likelihood -log p(y),
@@ -261,64 +938,217 @@ class SDEGP(object):
                 neg_log_marg_lik: the filter energy, i.e. negative log-marginal likelihood -log p(y),
                                   used for hyperparameter optimisation (learning) [scalar]
         """
+        if self.conjugate and site_params is None:
+            site_params = self.conjugate_sites(y, params)
+        if self.square_root:
+            return self.square_root_kalman_filter(y, dt, params, store, mask, site_params, r, steps)
+        if self.decoupled:
+            return self.decoupled_kalman_filter(y, dt, params, store, mask, site_params, r, steps)
+        if self.kronecker:
+            return self.kronecker_kalman_filter(y, dt, params, store, mask, site_params, r, steps)
+        if self.steady_state and mask is None and steps is not None and steps[0].shape[0] <= 2:
+            # regular grid with no missing data, so the gain converges to its steady state (the step sizes are static)
+            return self.steady_state_kalman_filter(y, dt, params, store, mask, site_params, r, steps)
+        if self.parallel and site_params is not None:
+            # when the sites are supplied the updates are linear-Gaussian, so we can filter in parallel across time
+            return self.parallel_kalman_filter(y, dt, params, store, mask, site_params, r, steps)
         theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
         self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
-        N = dt.shape[0]
-        with loops.Scope() as s:
-            s.neg_log_marg_lik = 0.0  # negative log-marginal likelihood
-            s.m, s.P = self.minf, self.Pinf
-            if store:
-                s.filtered_mean = np.zeros([N, self.state_dim, 1])
-                s.filtered_cov = np.zeros([N, self.state_dim, self.state_dim])
-                s.site_mean = np.zeros([N, self.func_dim, 1])
-                s.site_cov = np.zeros([N, self.func_dim, self.func_dim])
-            for n in s.range(N):
-                y_n = y[n][..., np.newaxis]
-                # -- KALMAN PREDICT --
-                #  mₙ⁻ = Aₙ mₙ₋₁
-                #  Pₙ⁻ = Aₙ Pₙ₋₁ Aₙ' + Qₙ, where Qₙ = Pinf - Aₙ Pinf Aₙ'
-                A = self.prior.state_transition(dt[n], theta_prior)
-                m_ = A @ s.m
-                P_ = A @ (s.P - self.Pinf) @ A.T + self.Pinf
-                # --- KALMAN UPDATE ---
-                # Given previous predicted mean mₙ⁻ and cov Pₙ⁻, incorporate yₙ to get filtered mean mₙ &
-                # cov Pₙ and compute the marginal likelihood p(yₙ|y₁,...,yₙ₋₁)
-                H = self.prior.measurement_model(r[n], theta_prior)
-                predict_mean = H @ m_
-                predict_cov = H @ P_ @ H.T
+        A_table, dt_index = self.transition_table(dt, theta_prior, steps)  # A is computed once per unique step size
+
+        def step(carry, inputs):
+            neg_log_marg_lik, m, P = carry
+            y_n, dt_index_n, r_n, mask_n, site_params_n = inputs
+            y_n = y_n[..., np.newaxis]
+            # -- KALMAN PREDICT --
+            #  mₙ⁻ = Aₙ mₙ₋₁
+            #  Pₙ⁻ = Aₙ Pₙ₋₁ Aₙ' + Qₙ, where Qₙ = Pinf - Aₙ Pinf Aₙ'
+            A = A_table[dt_index_n]
+            m_ = A @ m
+            P_ = A @ (P - self.Pinf) @ A.T + self.Pinf
+            # --- KALMAN UPDATE ---
+            # Given previous predicted mean mₙ⁻ and cov Pₙ⁻, incorporate yₙ to get filtered mean mₙ &
+            # cov Pₙ and compute the marginal likelihood p(yₙ|y₁,...,yₙ₋₁)
+            H = self.prior.measurement_model(r_n, theta_prior)
+            predict_mean = H @ m_
+            predict_cov = H @ P_ @ H.T
+            if self.conjugate:  # exact update, log p(yₙ|y₁,...,yₙ₋₁) = log 𝓝(yₙ|Hmₙ⁻,HPₙ⁻H'+σ²)
+                site_mean, site_cov = site_params_n
+                S = predict_cov + site_cov
+                L = cho_factor(S)
+                K = cho_solve(L, H @ P_).T  # HP(S^-1)
+                v = site_mean - predict_mean
+                log_lik_n = -0.5 * (2. * np.sum(np.log(np.abs(np.diag(L[0])))) + S.shape[0] * np.log(2. * pi)
+                                    + np.sum(v * cho_solve(L, v)))
+            else:
                 if mask is not None:  # note: this is a bit redundant but may come in handy in multi-output problems
-                    y_n = np.where(mask[n][..., np.newaxis], predict_mean[:y_n.shape[0]], y_n)  # fill in masked obs with expectation
+                    y_n = np.where(mask_n[..., np.newaxis], predict_mean[:y_n.shape[0]], y_n)  # fill in masked obs with expectation
                 log_lik_n, site_mean, site_cov = self.sites.update(self.likelihood, y_n, predict_mean, predict_cov,
                                                                    theta_lik, None)
                 if site_params is not None:  # use supplied site parameters to perform the update
-                    site_mean, site_cov = site_params[0][n], site_params[1][n]
+                    site_mean, site_cov = site_params_n
                 # modified Kalman update (see Nickish et. al. ICML 2018 or Wilkinson et. al. ICML 2019):
                 S = predict_cov + site_cov
                 K = solve(S, H @ P_).T  # HP(S^-1)
-                s.m = m_ + K @ (site_mean - predict_mean)
-                s.P = P_ - K @ S @ K.T
-                if mask is not None:  # note: this is a bit redundant but may come in handy in multi-output problems
-                    s.m = np.where(np.any(mask[n]), m_, s.m)
-                    s.P = np.where(np.any(mask[n]), P_, s.P)
-                    log_lik_n = np.where(mask[n][..., 0], np.zeros_like(log_lik_n), log_lik_n)
-                s.neg_log_marg_lik -= np.sum(log_lik_n)
-                if store:
-                    s.filtered_mean = index_add(s.filtered_mean, index[n, ...], s.m)
-                    s.filtered_cov = index_add(s.filtered_cov, index[n, ...], s.P)
-                    s.site_mean = index_add(s.site_mean, index[n, ...], site_mean)
-                    s.site_cov = index_add(s.site_cov, index[n, ...], site_cov)
+            m = m_ + K @ (site_mean - predict_mean)
+            P = P_ - K @ S @ K.T
+            if mask is not None:  # note: this is a bit redundant but may come in handy in multi-output problems
+                m = np.where(np.any(mask_n), m_, m)
+                P = np.where(np.any(mask_n), P_, P)
+                log_lik_n = np.where(mask_n[..., 0], np.zeros_like(log_lik_n), log_lik_n)
+            neg_log_marg_lik -= np.sum(log_lik_n)
+            # each step emits its intermediates, which are stacked by the scan
+            outputs = (m, P, site_mean, site_cov) if store else None
+            return (neg_log_marg_lik, m, P), outputs
+
+        (neg_log_marg_lik, _, _), outputs = checkpointed_scan(step, (np.array(0.0), self.minf, self.Pinf),
+                                                              (y, dt_index, r, mask, site_params),
+                                                              self.segment_length)
+        if store:
+            filtered_mean, filtered_cov, site_mean, site_cov = outputs
+            return neg_log_marg_lik, (filtered_mean, filtered_cov, (site_mean, site_cov))
+        return neg_log_marg_lik
+
+    @partial(jit, static_argnums=(4, 10))
+    def steady_state_kalman_filter(self, y, dt, params, store=False, mask=None, site_params=None, r=None,
+                                   steps=None, tol=1e-10, block_size=64):
+        """
+        Run the steady-state Kalman filter to get p(fₙ|y₁,...,yₙ) for regularly sampled data with a Gaussian
+        likelihood. In this setting the covariance recursion does not depend on the data, and the predictive
+        covariance converges to the solution of the discrete algebraic Riccati equation (see
+        utils.solve_discrete_riccati). The data are filtered in blocks of block_size steps. The covariances and gains
+        are computed exactly until the predictive covariance is within tol of the steady-state solution, after which
+        each block only runs the mean recursion with the steady-state gain, and the site updates of the block (which
+        no longer affect the gain) are vectorised across its steps. If the covariance never converges (e.g. long
+        lengthscales on a fine grid), every block is exact, so the result always matches kalman_filter() up to the
+        tolerance.
+        The steady-state gain is computed with the covariance of the first site, and a block is only run at steady
+        state if all of its site covariances equal it and all of its steps are the grid step. Any other block is
+        computed exactly, after which the convergence check starts again.
+        Missing data and test locations change the covariance recursion, so kalman_filter() falls back to the full
+        filter when a mask is supplied.
+        :param y: observed data [N, obs_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param store: flag to notify whether to store the intermediates
+        :param mask: not used
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
+        :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :param tol: the relative tolerance, max|Pₙ⁻ - P_ss| ≤ tol max|P_ss|, at which the gain is fixed
+        :param block_size: the number of steps per block, i.e. the granularity of the switch to the steady state
+        :return:
+            see kalman_filter()
+        """
+        theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
+        self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
+        A_table, dt_index = self.transition_table(dt, theta_prior, steps)
+        grid_index = A_table.shape[0] - 1
+        A = A_table[grid_index]  # the grid step
+        H = self.prior.measurement_model(r[0], theta_prior)
+        N = y.shape[0]
+        if site_params is None:  # the sites of the Gaussian likelihood have variance equal to the observation noise
+            R = theta_lik * np.eye(self.func_dim)
+            site_cov_all = np.tile(R, (N, 1, 1))
+        else:
+            R = site_params[1][0]
+            site_cov_all = site_params[1]
+        P_ss = solve_discrete_riccati(A, H, self.Pinf - A @ self.Pinf @ A.T, R)
+        S_ss = H @ P_ss @ H.T + R
+        K_ss = solve(S_ss, H @ P_ss).T
+        P_ss_filt = P_ss - K_ss @ S_ss @ K_ss.T
+        predict_cov_ss = H @ P_ss @ H.T
+        threshold = tol * np.max(np.abs(P_ss))
+        # pad to a whole number of blocks with steady steps, which do not contribute to the energy
+        num_blocks = -(-N // block_size)
+        pad = num_blocks * block_size - N
+        valid = np.arange(num_blocks * block_size) < N
+        y_blocks = np.concatenate([y, np.zeros((pad,) + y.shape[1:])])
+        dt_blocks = np.concatenate([dt_index, grid_index * np.ones(pad, dtype=dt_index.dtype)])
+        site_cov_blocks = np.concatenate([site_cov_all, np.tile(R, (pad, 1, 1))])
+        site_mean_blocks = None if site_params is None else np.concatenate(
+            [site_params[0], np.zeros((pad,) + site_params[0].shape[1:])])
+
+        def to_blocks(x):
+            return None if x is None else x.reshape((num_blocks, block_size) + x.shape[1:])
+
+        def exact_step(carry, inputs):
+            neg_log_marg_lik, m, P, converged = carry
+            y_n, dt_index_n, site_mean_n, site_cov_n, valid_n = inputs
+            A_n = A_table[dt_index_n]
+            P_ = A_n @ (P - self.Pinf) @ A_n.T + self.Pinf
+            converged = np.all(site_cov_n == R) & (np.max(np.abs(P_ - P_ss)) <= threshold)
+            m_ = A_n @ m
+            predict_mean = H @ m_
+            predict_cov = H @ P_ @ H.T
+            log_lik_n, site_mean, site_cov = self.sites.update(self.likelihood, y_n[..., np.newaxis], predict_mean,
+                                                               predict_cov, theta_lik, None)
+            if site_params is not None:  # use supplied site parameters to perform the update
+                site_mean, site_cov = site_mean_n, site_cov_n
+            S = H @ P_ @ H.T + site_cov
+            K = solve(S, H @ P_).T
+            m = m_ + K @ (site_mean - predict_mean)
+            P = P_ - K @ S @ K.T
+            neg_log_marg_lik -= np.where(valid_n, np.sum(log_lik_n), 0.)
+            outputs = (m, P, site_mean, site_cov) if store else None
+            return (neg_log_marg_lik, m, P, converged), outputs
+
+        def exact_block(inputs):
+            carry, block = inputs
+            carry, outputs = lax.scan(exact_step, carry, block)
+            return carry, outputs
+
+        def steady_block(inputs):
+            (neg_log_marg_lik, m, _, _), (y_b, _, site_mean_b, site_cov_b, valid_b) = inputs
+            if site_params is None:  # the sites of the Gaussian likelihood are exact
+                site_mean_b = y_b[..., np.newaxis]
+
+            def mean_step(m_prev, site_mean_n):
+                m_ = A @ m_prev
+                m_n = m_ + K_ss @ (site_mean_n - H @ m_)
+                return m_n, (m_, m_n)
+
+            m, (predict_mean_b, filter_mean_b) = lax.scan(mean_step, m, site_mean_b)
+            # the predictive covariance is fixed, so the site updates of the block are independent of each other
+            log_lik_b, site_mean_out, site_cov_out = vmap(
+                lambda y_n, m_n: self.sites.update(self.likelihood, y_n[..., np.newaxis], H @ m_n, predict_cov_ss,
+                                                   theta_lik, None)
+            )(y_b, predict_mean_b)
+            if site_params is not None:
+                site_mean_out, site_cov_out = site_mean_b, site_cov_b
+            neg_log_marg_lik -= np.sum(np.where(valid_b, np.sum(log_lik_b.reshape(block_size, -1), axis=1), 0.))
+            outputs = (filter_mean_b, np.tile(P_ss_filt, (block_size, 1, 1)), site_mean_out, site_cov_out) if store \
+                else None
+            return (neg_log_marg_lik, m, P_ss_filt, np.array(True)), outputs
+
+        def block_step(carry, block):
+            _, dt_index_b, _, site_cov_b, _ = block
+            steady = carry[3] & np.all(dt_index_b == grid_index) & np.all(site_cov_b == R)
+            # only one branch is run, so the converged blocks skip the O(state_dim³) covariance updates
+            return lax.cond(steady, (carry, block), steady_block, (carry, block), exact_block)
+
+        blocks = (to_blocks(y_blocks), to_blocks(dt_blocks), to_blocks(site_mean_blocks), to_blocks(site_cov_blocks),
+                  to_blocks(valid))
+        (neg_log_marg_lik, _, _, _), outputs = lax.scan(block_step,
+                                                        (np.array(0.0), self.minf, self.Pinf, np.array(False)),
+                                                        blocks)
         if store:
-            return s.neg_log_marg_lik, (s.filtered_mean, s.filtered_cov, (s.site_mean, s.site_cov))
-        return s.neg_log_marg_lik
+            filtered_mean, filtered_cov, site_mean, site_cov = [
+                x.reshape((num_blocks * block_size,) + x.shape[2:])[:N] for x in outputs]
+            return neg_log_marg_lik, (filtered_mean, filtered_cov, (site_mean, site_cov))
+        return neg_log_marg_lik
 
-    @partial(jit, static_argnums=(0, 5, 6))
+    @partial(jit, static_argnums=(5, 6, 11))
     def rauch_tung_striebel_smoother(self, params, m_filtered, P_filtered, dt, store=False, return_full=False,
-                                     y=None, site_params=None, r=None):
+                                     y=None, site_params=None, r=None, steps=None, batch_sites=False, mask=None):
         """
         Run the RTS smoother to get p(fₙ|y₁,...,y_N),
         i.e. compute p(f)𝚷ₙsₙ(fₙ) where sₙ(fₙ) are the sites (approx. likelihoods).
         If sites are provided, then it is assumed they are to be updated, which is done by
         calling the site-specific update() method.
+        Each site update depends only on the smoothed marginal and the previous site at that step, so if batch_sites
+        is True the smoother first emits all the marginals, and then updates all the sites in a single vmapped call,
+        rather than one update per step inside the sequential loop. The results are the same.
         :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
         :param m_filtered: the intermediate distribution means computed during filtering [N, state_dim, 1]
         :param P_filtered: the intermediate distribution covariances computed during filtering [N, state_dim, state_dim]
@@ -328,97 +1158,843 @@ class SDEGP(object):
         :param y: observed data [N, obs_dim]
         :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
         :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :param batch_sites: flag to notify whether to update the sites in one batch after the backward pass. The
+                            parallel smoother always does this, and the other engines ignore it
+        :param mask: boolean array signifying which elements of y are observed [N, obs_dim]. Only the Kronecker
+                     smoother uses it, since it re-forms the filter's updates
         :return:
             var_exp: the sum of the variational expectations [scalar]
             smoothed_mean: the posterior marginal means [N, obs_dim]
             smoothed_var: the posterior marginal variances [N, obs_dim]
             site_params: the updated sites [2, N, obs_dim]
         """
+        if self.square_root:
+            return self.square_root_rauch_tung_striebel_smoother(params, m_filtered, P_filtered, dt, store,
+                                                                 return_full, y, site_params, r, steps)
+        if self.decoupled:
+            return self.decoupled_rauch_tung_striebel_smoother(params, m_filtered, P_filtered, dt, store,
+                                                               return_full, y, site_params, r, steps)
+        if self.kronecker:
+            return self.kronecker_rauch_tung_striebel_smoother(params, m_filtered, P_filtered, dt, store,
+                                                               return_full, y, site_params, r, steps, mask)
+        if self.parallel:
+            return self.parallel_rauch_tung_striebel_smoother(params, m_filtered, P_filtered, dt, store, return_full,
+                                                              y, site_params, r, steps)
         theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
         self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
-        N = dt.shape[0]
-        dt = np.concatenate([dt[1:], np.array([0.0])], axis=0)
-        with loops.Scope() as s:
-            s.m, s.P = m_filtered[-1, ...], P_filtered[-1, ...]
-            if return_full:
-                s.smoothed_mean = np.zeros([N, self.state_dim, 1])
-                s.smoothed_cov = np.zeros([N, self.state_dim, self.state_dim])
-            else:
-                s.smoothed_mean = np.zeros([N, self.func_dim, 1])
-                s.smoothed_cov = np.zeros([N, self.func_dim, self.func_dim])
+        if steps is None:
+            dt = np.concatenate([dt[1:], np.array([0.0])], axis=0)
+        A_table, dt_index = self.transition_table(dt, theta_prior, steps)
+        if steps is not None:
+            dt_index = np.concatenate([dt_index[1:], np.array([0])], axis=0)  # index 0 is always Δt=0
+
+        def step(carry, inputs):
+            m, P = carry
+            m_filtered_n, P_filtered_n, dt_index_n, r_n, y_n, site_params_n = inputs
+            # --- First compute the smoothing distribution: ---
+            A = A_table[dt_index_n]  # closed form integration of transition matrix
+            m_predicted = A @ m_filtered_n
+            tmp_gain_cov = A @ P_filtered_n
+            P_predicted = A @ (P_filtered_n - self.Pinf) @ A.T + self.Pinf
+            # backward Kalman gain:
+            # G = F * A' * P^{-1}
+            # since both F(iltered) and P(redictive) are cov matrices, thus self-adjoint, we can take the transpose:
+            #   = (P^{-1} * A * F)'
+            G_transpose = solve(P_predicted, tmp_gain_cov)  # (P^-1)AF
+            m = m_filtered_n + G_transpose.T @ (m - m_predicted)
+            P = P_filtered_n + G_transpose.T @ (P - P_predicted) @ G_transpose
+            H = self.prior.measurement_model(r_n, theta_prior)
+            smoothed = None
+            if store:
+                if return_full:
+                    smoothed = (m, P)
+                else:
+                    smoothed = (H @ m, H @ P @ H.T)
+            # --- Now update the site parameters: ---
+            sites = None
             if site_params is not None:
-                s.site_mean = np.zeros([N, self.func_dim, 1])
-                s.site_var = np.zeros([N, self.func_dim, self.func_dim])
-            for n in s.range(N-1, -1, -1):
-                # --- First compute the smoothing distribution: ---
-                A = self.prior.state_transition(dt[n], theta_prior)  # closed form integration of transition matrix
-                m_predicted = A @ m_filtered[n, ...]
-                tmp_gain_cov = A @ P_filtered[n, ...]
-                P_predicted = A @ (P_filtered[n, ...] - self.Pinf) @ A.T + self.Pinf
-                # backward Kalman gain:
-                # G = F * A' * P^{-1}
-                # since both F(iltered) and P(redictive) are cov matrices, thus self-adjoint, we can take the transpose:
-                #   = (P^{-1} * A * F)'
-                G_transpose = solve(P_predicted, tmp_gain_cov)  # (P^-1)AF
-                s.m = m_filtered[n, ...] + G_transpose.T @ (s.m - m_predicted)
-                s.P = P_filtered[n, ...] + G_transpose.T @ (s.P - P_predicted) @ G_transpose
-                H = self.prior.measurement_model(r[n], theta_prior)
-                if store:
-                    if return_full:
-                        s.smoothed_mean = index_add(s.smoothed_mean, index[n, ...], s.m)
-                        s.smoothed_cov = index_add(s.smoothed_cov, index[n, ...], s.P)
-                    else:
-                        s.smoothed_mean = index_add(s.smoothed_mean, index[n, ...], H @ s.m)
-                        s.smoothed_cov = index_add(s.smoothed_cov, index[n, ...], H @ s.P @ H.T)
-                # --- Now update the site parameters: ---
-                if site_params is not None:
-                    # extract mean and var from state:
-                    post_mean, post_cov = H @ s.m, H @ s.P @ H.T
+                # extract mean and var from state:
+                post_mean, post_cov = H @ m, H @ P @ H.T
+                if batch_sites:  # emit the marginals, and update the sites after the loop
+                    sites = (post_mean, post_cov)
+                else:
                     # calculate the new sites
-                    _, site_mu, site_cov = self.sites.update(self.likelihood, y[n][..., np.newaxis],
-                                                             post_mean, post_cov, theta_lik,
-                                                             (site_params[0][n], site_params[1][n]))
-                    s.site_mean = index_add(s.site_mean, index[n, ...], site_mu)
-                    s.site_var = index_add(s.site_var, index[n, ...], site_cov)
+                    _, site_mu, site_cov = self.sites.update(self.likelihood, y_n[..., np.newaxis],
+                                                             post_mean, post_cov, theta_lik, site_params_n)
+                    sites = (site_mu, site_cov)
+            return (m, P), (smoothed, sites)
+
+        # run the scan backwards in time by flipping the inputs, and flip the stacked outputs back afterwards
+        flip = partial(tree_map, lambda x: x[::-1])
+        _, (smoothed, sites) = lax.scan(step, (m_filtered[-1, ...], P_filtered[-1, ...]),
+                                        flip((m_filtered, P_filtered, dt_index, r, y, site_params)))
+        smoothed, sites = flip((smoothed, sites))
+        if site_params is not None:
+            if batch_sites:
+                post_mean, post_cov = sites
+                _, site_mean, site_cov = vmap(
+                    lambda y_n, m_n, v_n, site_mean_n, site_cov_n: self.sites.update(self.likelihood, y_n, m_n, v_n,
+                                                                                     theta_lik,
+                                                                                     (site_mean_n, site_cov_n))
+                )(y[..., np.newaxis], post_mean, post_cov, site_params[0], site_params[1])
+                sites = (site_mean, site_cov)
+            site_params = sites
+        if store:
+            return site_params, smoothed[0], smoothed[1]
+        return site_params
+
+    @partial(jit, static_argnums=(4,))
+    def parallel_kalman_filter(self, y, dt, params, store=False, mask=None, site_params=None, r=None, steps=None):
+        """
+        Run the parallel-in-time Kalman filter to get p(fₙ|y₁,...,yₙ), see Särkkä & García-Fernández 2021
+        "Temporal Parallelization of Bayesian Smoothers".
+        Each time step is converted into an element of an associative operation (see utils.filtering_operator)
+        and the filtering distributions are computed with an associative scan, giving O(log N) sequential depth.
+        Requires the sites to be supplied, since site initialisation depends sequentially on the predictions.
+        The energy is computed exactly as in kalman_filter(), by evaluating the site update at the predictions.
+        :param y: observed data [N, obs_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param store: flag to notify whether to store the intermediates
+        :param mask: boolean array signifying which elements of y are observed [N, obs_dim]
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
+        :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            see kalman_filter()
+        """
+        theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
+        self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
+        site_mean, site_cov = site_params
+        site_mean = site_mean.reshape(site_cov.shape[:2] + (1,))  # posterior sampling supplies [N, func_dim] means
+        A_table, dt_index = self.transition_table(dt, theta_prior, steps)
+        A = A_table[dt_index]  # [N, state_dim, state_dim]
+        H = vmap(self.prior.measurement_model, (0, None))(r, theta_prior)  # [N, func_dim, state_dim]
+        Q = self.Pinf - A @ self.Pinf @ np.transpose(A, (0, 2, 1))  # process noise, Qₙ = Pinf - Aₙ Pinf Aₙ'
+        if mask is None:
+            observed = np.ones([dt.shape[0], 1, 1], dtype=bool)
+        else:
+            observed = ~np.any(mask, axis=1).reshape(-1, 1, 1)
+
+        def generic_element(A_n, Q_n, H_n, site_mean_n, site_cov_n, observed_n):
+            # conditioned on the previous state, the prediction is 𝓝(Aₙxₙ₋₁,Qₙ)
+            S = H_n @ Q_n @ H_n.T + site_cov_n
+            K = np.where(observed_n, solve(S, H_n @ Q_n).T, 0.)  # Kalman gain
+            HA = H_n @ A_n
+            HSinv = np.where(observed_n, solve(S, HA).T, 0.)  # Aₙ'Hₙ'S⁻¹
+            return (A_n - K @ HA, K @ site_mean_n, Q_n - K @ S @ K.T,
+                    HSinv @ site_mean_n, HSinv @ HA)
+
+        def first_element(A_n, H_n, site_mean_n, site_cov_n, observed_n):
+            # the first step is conditioned on the stationary state distribution 𝓝(minf,Pinf)
+            m_ = A_n @ self.minf
+            P_ = self.Pinf  # the stationary covariance is invariant under the transition
+            S = H_n @ P_ @ H_n.T + site_cov_n
+            K = np.where(observed_n, solve(S, H_n @ P_).T, 0.)
+            return (np.zeros_like(A_n), m_ + K @ (site_mean_n - H_n @ m_), P_ - K @ S @ K.T,
+                    np.zeros_like(m_), np.zeros_like(A_n))
+
+        elements = vmap(generic_element)(A, Q, H, site_mean, site_cov, observed)
+        first = first_element(A[0], H[0], site_mean[0], site_cov[0], observed[0])
+        elements = tuple(index_update(elem, index[0], elem_0) for elem, elem_0 in zip(elements, first))
+        _, filtered_mean, filtered_cov, _, _ = associative_scan(vmap(filtering_operator), elements)
+        # the energy is evaluated at the predictive distributions, which are obtained from the filtering distributions
+        m_prev = np.concatenate([self.minf[None], filtered_mean[:-1]])
+        P_prev = np.concatenate([self.Pinf[None], filtered_cov[:-1]])
+        m_ = A @ m_prev
+        P_ = A @ (P_prev - self.Pinf) @ np.transpose(A, (0, 2, 1)) + self.Pinf
+        predict_mean = H @ m_
+        predict_cov = H @ P_ @ np.transpose(H, (0, 2, 1))
+        y = y[..., np.newaxis]
+        if mask is not None:
+            y = np.where(mask[..., np.newaxis], predict_mean[:, :y.shape[1]], y)  # fill in masked obs with expectation
+        log_lik, _, _ = vmap(
+            lambda y_n, m_n, v_n: self.sites.update(self.likelihood, y_n, m_n, v_n, theta_lik, None)
+        )(y, predict_mean, predict_cov)
+        if mask is not None:
+            log_lik = np.where(mask[..., 0].reshape(log_lik.shape[:1] + (1,) * (log_lik.ndim - 1)),
+                               np.zeros_like(log_lik), log_lik)
+        neg_log_marg_lik = -np.sum(log_lik)
+        if store:
+            return neg_log_marg_lik, (filtered_mean, filtered_cov, (site_mean, site_cov))
+        return neg_log_marg_lik
+
+    @partial(jit, static_argnums=(5, 6))
+    def parallel_rauch_tung_striebel_smoother(self, params, m_filtered, P_filtered, dt, store=False, return_full=False,
+                                              y=None, site_params=None, r=None, steps=None):
+        """
+        Run the parallel-in-time RTS smoother to get p(fₙ|y₁,...,y_N), see Särkkä & García-Fernández 2021.
+        Each backward step is converted into an element of an associative operation (see utils.smoothing_operator)
+        and the smoothing distributions are computed with a reverse associative scan.
+        The site updates depend only on the smoothed marginals, so they are computed for all time steps at once.
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param m_filtered: the intermediate distribution means computed during filtering [N, state_dim, 1]
+        :param P_filtered: the intermediate distribution covariances computed during filtering [N, state_dim, state_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param store: a flag determining whether to store and return state mean and covariance
+        :param return_full: a flag determining whether to return the full state distribution or just the function(s)
+        :param y: observed data [N, obs_dim]
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
+        :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            see rauch_tung_striebel_smoother()
+        """
+        theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
+        self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
+        A_table, dt_index = self.transition_table(dt, theta_prior, steps)
+        A = A_table[dt_index[1:]]  # Aₙ₊₁ [N-1, state_dim, state_dim]
+
+        def generic_element(A_n, m_n, P_n):
+            P_predicted = A_n @ (P_n - self.Pinf) @ A_n.T + self.Pinf
+            E = solve(P_predicted, A_n @ P_n).T  # backward Kalman gain
+            return E, m_n - E @ A_n @ m_n, P_n - E @ A_n @ P_n
+
+        E, g, L = vmap(generic_element)(A, m_filtered[:-1], P_filtered[:-1])
+        # the final element is the final filtering distribution
+        E = np.concatenate([E, np.zeros_like(E[:1])])
+        g = np.concatenate([g, m_filtered[-1:]])
+        L = np.concatenate([L, P_filtered[-1:]])
+        # reverse scan: flip the elements in time and swap the order of the operator arguments
+        _, smoothed_mean, smoothed_cov = associative_scan(
+            vmap(lambda elem_i, elem_j: smoothing_operator(elem_j, elem_i)),
+            (E[::-1], g[::-1], L[::-1])
+        )
+        smoothed_mean, smoothed_cov = smoothed_mean[::-1], smoothed_cov[::-1]
+        H = vmap(self.prior.measurement_model, (0, None))(r, theta_prior)
+        post_mean = H @ smoothed_mean
+        post_cov = H @ smoothed_cov @ np.transpose(H, (0, 2, 1))
+        if site_params is not None:
+            _, site_mean, site_cov = vmap(
+                lambda y_n, m_n, v_n, site_mean_n, site_cov_n: self.sites.update(self.likelihood, y_n, m_n, v_n,
+                                                                                 theta_lik, (site_mean_n, site_cov_n))
+            )(y[..., np.newaxis], post_mean, post_cov, site_params[0], site_params[1])
+            site_params = (site_mean, site_cov)
+        if store:
+            if return_full:
+                return site_params, smoothed_mean, smoothed_cov
+            return site_params, post_mean, post_cov
+        return site_params
+
+    def square_root_tables(self, dt, theta_prior, steps=None):
+        """
+        Compute the transition matrices Aₙ and the Cholesky factors of the process noise Qₙ = Pinf - Aₙ Pinf Aₙ',
+        once per unique step size, as required by the square-root filter and smoother.
+        A small jitter, relative to the machine precision, is added to Qₙ since it is singular when Δtₙ=0.
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param theta_prior: the hyperparameters of the GP prior
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            A: the table of transition matrices [U, state_dim, state_dim]
+            Q_sqrt: the table of process noise Cholesky factors [U, state_dim, state_dim]
+            dt_index: the index of each step into the tables [N]
+        """
+        A, dt_index = self.transition_table(dt, theta_prior, steps)
+        Q = self.Pinf - A @ self.Pinf @ np.transpose(A, (0, 2, 1))
+        jitter = 10 * np.finfo(Q.dtype).eps * np.diag(np.diag(self.Pinf))  # relative to the scale of each state
+        Q_sqrt = np.linalg.cholesky(Q + jitter)
+        return A, Q_sqrt, dt_index
+
+    @partial(jit, static_argnums=(4,))
+    def square_root_kalman_filter(self, y, dt, params, store=False, mask=None, site_params=None, r=None,
+                                  steps=None):
+        """
+        Run the square-root Kalman filter to get p(fₙ|y₁,...,yₙ). Rather than the covariance Pₙ, the filter
+        propagates a lower-triangular factor Lₙ, Pₙ = Lₙ Lₙ', which is computed via QR decompositions
+        (see utils.tria), such that the implied covariances are always positive semi-definite. This makes
+        the filter stable in single precision. The sites must have positive definite covariance.
+        :param y: observed data [N, obs_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param store: flag to notify whether to store the intermediates
+        :param mask: boolean array signifying which elements of y are observed [N, obs_dim]
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
+        :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            see kalman_filter(), except that the Cholesky factors of the filtering covariances are returned
+        """
+        theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
+        self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
+        A_table, Q_sqrt_table, dt_index = self.square_root_tables(dt, theta_prior, steps)
+
+        def step(carry, inputs):
+            neg_log_marg_lik, m, L = carry
+            y_n, dt_index_n, r_n, mask_n, site_params_n = inputs
+            y_n = y_n[..., np.newaxis]
+            # -- KALMAN PREDICT --
+            #  mₙ⁻ = Aₙ mₙ₋₁
+            #  Lₙ⁻ = tria([Aₙ Lₙ₋₁, √Qₙ])
+            A, Q_sqrt = A_table[dt_index_n], Q_sqrt_table[dt_index_n]
+            m_ = A @ m
+            L_ = tria(np.concatenate([A @ L, Q_sqrt], axis=1))
+            # --- KALMAN UPDATE ---
+            H = self.prior.measurement_model(r_n, theta_prior)
+            HL = H @ L_
+            predict_mean = H @ m_
+            predict_cov = HL @ HL.T
+            if mask is not None:
+                y_n = np.where(mask_n[..., np.newaxis], predict_mean[:y_n.shape[0]], y_n)  # fill in masked obs with expectation
+            log_lik_n, site_mean, site_cov = self.sites.update(self.likelihood, y_n, predict_mean, predict_cov,
+                                                               theta_lik, None)
+            if site_params is not None:  # use supplied site parameters to perform the update
+                site_mean, site_cov = site_params_n
+            # triangularise the array [[√Rₙ, HₙLₙ⁻], [0, Lₙ⁻]] to get [[√Sₙ, 0], [K̄ₙ, Lₙ]], where Rₙ is the site
+            # covariance, Sₙ is the innovation covariance and Kₙ = K̄ₙ √Sₙ⁻¹ is the Kalman gain
+            R_sqrt = np.linalg.cholesky(site_cov)
+            pre_array = np.concatenate([np.concatenate([R_sqrt, HL], axis=1),
+                                        np.concatenate([np.zeros([self.state_dim, self.func_dim]), L_], axis=1)])
+            post_array = tria(pre_array)
+            S_sqrt = post_array[:self.func_dim, :self.func_dim]
+            K_bar = post_array[self.func_dim:, :self.func_dim]
+            m = m_ + K_bar @ solve_triangular(S_sqrt, site_mean - predict_mean, lower=True)
+            L = post_array[self.func_dim:, self.func_dim:]
+            if mask is not None:
+                m = np.where(np.any(mask_n), m_, m)
+                L = np.where(np.any(mask_n), L_, L)
+                log_lik_n = np.where(mask_n[..., 0], np.zeros_like(log_lik_n), log_lik_n)
+            neg_log_marg_lik -= np.sum(log_lik_n)
+            outputs = (m, L, site_mean, site_cov) if store else None
+            return (neg_log_marg_lik, m, L), outputs
+
+        (neg_log_marg_lik, _, _), outputs = checkpointed_scan(step, (np.array(0.0), self.minf,
+                                                                     np.linalg.cholesky(self.Pinf)),
+                                                              (y, dt_index, r, mask, site_params),
+                                                              self.segment_length)
+        if store:
+            filtered_mean, filtered_cov_sqrt, site_mean, site_cov = outputs
+            return neg_log_marg_lik, (filtered_mean, filtered_cov_sqrt, (site_mean, site_cov))
+        return neg_log_marg_lik
+
+    @partial(jit, static_argnums=(5, 6))
+    def square_root_rauch_tung_striebel_smoother(self, params, m_filtered, L_filtered, dt, store=False,
+                                                 return_full=False, y=None, site_params=None, r=None, steps=None):
+        """
+        Run the square-root RTS smoother to get p(fₙ|y₁,...,y_N). The smoothed covariance factors are computed
+        from the Joseph form of the RTS update,
+            Pₙ = (I - Gₙ Aₙ₊₁) Pₙᶠ (I - Gₙ Aₙ₊₁)' + Gₙ Qₙ₊₁ Gₙ' + Gₙ Pₙ₊₁ Gₙ',
+        which is triangularised via QR (see utils.tria).
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param m_filtered: the intermediate distribution means computed during filtering [N, state_dim, 1]
+        :param L_filtered: the Cholesky factors of the intermediate distribution covariances computed during
+                           filtering [N, state_dim, state_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param store: a flag determining whether to store and return state mean and covariance
+        :param return_full: a flag determining whether to return the full state distribution or just the function(s)
+        :param y: observed data [N, obs_dim]
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
+        :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            see rauch_tung_striebel_smoother()
+        """
+        theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
+        self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
+        if steps is None:
+            dt = np.concatenate([dt[1:], np.array([0.0])], axis=0)
+        A_table, Q_sqrt_table, dt_index = self.square_root_tables(dt, theta_prior, steps)
+        if steps is not None:
+            dt_index = np.concatenate([dt_index[1:], np.array([0])], axis=0)  # index 0 is always Δt=0
+
+        def step(carry, inputs):
+            m, L = carry
+            m_filtered_n, L_filtered_n, dt_index_n, r_n, y_n, site_params_n = inputs
+            # --- First compute the smoothing distribution: ---
+            A, Q_sqrt = A_table[dt_index_n], Q_sqrt_table[dt_index_n]
+            m_predicted = A @ m_filtered_n
+            AL = A @ L_filtered_n
+            L_predicted = tria(np.concatenate([AL, Q_sqrt], axis=1))
+            # backward Kalman gain: G = Pᶠ A' (P⁻)⁻¹
+            G = cho_solve((L_predicted, True), AL @ L_filtered_n.T).T
+            m = m_filtered_n + G @ (m - m_predicted)
+            L = tria(np.concatenate([L_filtered_n - G @ AL, G @ Q_sqrt, G @ L], axis=1))
+            H = self.prior.measurement_model(r_n, theta_prior)
+            HL = H @ L
+            smoothed = None
+            if store:
+                if return_full:
+                    smoothed = (m, L @ L.T)
+                else:
+                    smoothed = (H @ m, HL @ HL.T)
+            # --- Now update the site parameters: ---
+            sites = None
+            if site_params is not None:
+                # calculate the new sites
+                _, site_mu, site_cov = self.sites.update(self.likelihood, y_n[..., np.newaxis],
+                                                         H @ m, HL @ HL.T, theta_lik, site_params_n)
+                sites = (site_mu, site_cov)
+            return (m, L), (smoothed, sites)
+
+        # run the scan backwards in time by flipping the inputs, and flip the stacked outputs back afterwards
+        flip = partial(tree_map, lambda x: x[::-1])
+        _, (smoothed, sites) = lax.scan(step, (m_filtered[-1, ...], L_filtered[-1, ...]),
+                                        flip((m_filtered, L_filtered, dt_index, r, y, site_params)))
+        smoothed, sites = flip((smoothed, sites))
         if site_params is not None:
-            site_params = (s.site_mean, s.site_var)
+            site_params = sites
         if store:
-            return site_params, s.smoothed_mean, s.smoothed_cov
+            return site_params, smoothed[0], smoothed[1]
         return site_params
 
-    def prior_sample(self, num_samps, t=None):
+    @partial(jit, static_argnums=(4,))
+    def kronecker_kalman_filter(self, y, dt, params, store=False, mask=None, site_params=None, r=None, steps=None):
+        """
+        Run the Kalman filter to get p(fₙ|y₁,...,yₙ) for spatio-temporal priors whose state space model has
+        Kronecker structure,
+            A = I ⊗ A_time,  Pinf = Kmm ⊗ Pinf_time,  H = Kx ⊗ H_time,
+        where Kmm is the covariance of the M spatial points and A_time is the ν×ν temporal transition matrix.
+        The state covariance is stored as an [M, ν, M, ν] array, such that the prediction step costs O(M²ν³) and
+        the update step costs O(M³ν²), rather than O(M³ν³) for the dense filter. The covariance itself is dense
+        (the updates destroy the Kronecker structure), so the memory is O(M²ν²) per step, and the stored filtering
+        covariances are [N, M·ν, M·ν].
+        :param y: observed data [N, obs_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param store: flag to notify whether to store the intermediates
+        :param mask: boolean array signifying which elements of y are observed [N, obs_dim]
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
+        :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            see kalman_filter()
+        """
+        theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
+        Kmm, Pinf_time, H_time = self.prior.kronecker_factors(theta_prior)
+        M, nu = Kmm.shape[0], Pinf_time.shape[0]
+        Pinf = np.einsum('ab,ij->aibj', Kmm, Pinf_time)  # Kmm ⊗ Pinf_time [M, ν, M, ν]
+        h = H_time[0]
+        if steps is None:
+            steps = (dt, np.arange(dt.shape[0]))
+        A_table = vmap(self.prior.temporal_state_transition, (0, None))(steps[0], theta_prior)
+
+        def step(carry, inputs):
+            neg_log_marg_lik, m, P = carry
+            y_n, dt_index_n, r_n, mask_n, site_params_n = inputs
+            y_n = y_n[..., np.newaxis]
+            # -- KALMAN PREDICT --
+            #  mₙ⁻ = (I ⊗ A_time) mₙ₋₁
+            #  Pₙ⁻ = (I ⊗ A_time) (Pₙ₋₁ - Pinf) (I ⊗ A_time)' + Pinf
+            A = A_table[dt_index_n]
+            m_ = m @ A.T
+            P_ = np.einsum('aibk,lk->aibl', np.einsum('ij,ajbk->aibk', A, P - Pinf), A) + Pinf
+            # --- KALMAN UPDATE ---
+            Kx = self.prior.spatial_measurement_model(r_n, theta_prior)
+            HP = np.einsum('na,i,aibj->nbj', Kx, h, P_)  # H Pₙ⁻ [obs, M, ν]
+            predict_mean = Kx @ (m_ @ h)[:, np.newaxis]
+            predict_cov = np.einsum('nbj,mb,j->nm', HP, Kx, h)
+            if mask is not None:
+                y_n = np.where(mask_n[..., np.newaxis], predict_mean[:y_n.shape[0]], y_n)  # fill in masked obs with expectation
+            log_lik_n, site_mean, site_cov = self.sites.update(self.likelihood, y_n, predict_mean, predict_cov,
+                                                               theta_lik, None)
+            if site_params is not None:  # use supplied site parameters to perform the update
+                site_mean, site_cov = site_params_n
+            HP = HP.reshape(HP.shape[0], M * nu)
+            S = predict_cov + site_cov
+            K_transpose = solve(S, HP)  # (S⁻¹)HP
+            m = m_ + (K_transpose.T @ (site_mean - predict_mean)).reshape(M, nu)
+            P = P_ - (HP.T @ K_transpose).reshape(M, nu, M, nu)  # P - KSK' = P - PH'(S⁻¹)HP
+            if mask is not None:
+                m = np.where(np.any(mask_n), m_, m)
+                P = np.where(np.any(mask_n), P_, P)
+                log_lik_n = np.where(mask_n[..., 0], np.zeros_like(log_lik_n), log_lik_n)
+            neg_log_marg_lik -= np.sum(log_lik_n)
+            outputs = (m, P, site_mean, site_cov) if store else None
+            return (neg_log_marg_lik, m, P), outputs
+
+        (neg_log_marg_lik, _, _), outputs = checkpointed_scan(step, (np.array(0.0), np.zeros([M, nu]), Pinf),
+                                                              (y, steps[1], r, mask, site_params),
+                                                              self.segment_length)
+        if store:
+            filtered_mean, filtered_cov, site_mean, site_cov = outputs
+            N = filtered_mean.shape[0]
+            return neg_log_marg_lik, (filtered_mean.reshape(N, M * nu, 1), filtered_cov.reshape(N, M * nu, M * nu),
+                                      (site_mean, site_cov))
+        return neg_log_marg_lik
+
+    @partial(jit, static_argnums=(5, 6))
+    def kronecker_rauch_tung_striebel_smoother(self, params, m_filtered, P_filtered, dt, store=False,
+                                               return_full=False, y=None, site_params=None, r=None, steps=None,
+                                               mask=None):
         """
-        Sample from the model prior f~N(0,K) multiple times using a nested loop.
+        Run the smoother to get p(fₙ|y₁,...,y_N) for spatio-temporal priors with Kronecker structure
+        (see kronecker_kalman_filter).
+        When the sites are being updated (and the full state is not required), the smoother is run in the modified
+        Bryson-Frazier form, which avoids the RTS gain: the adjoint variables
+            λ̃ₙ = -H'S⁻¹vₙ + C'λ̂ₙ,  Λ̃ₙ = H'S⁻¹H + C'Λ̂ₙC,  C = I - KₙH,
+            λ̂ₙ₋₁ = A'λ̃ₙ,  Λ̂ₙ₋₁ = A'Λ̃ₙA,
+        are propagated backwards, and the smoothed state is mₙ = mᶠₙ - Pᶠₙλ̂ₙ, Pₙ = Pᶠₙ - PᶠₙΛ̂ₙPᶠₙ. Every product
+        is either with the structured transition matrix or has the (small) observation dimension on one side, so
+        each step costs O(M³ν² + M²ν³), as for the filter. Only the marginals HPₙH' are formed.
+        Otherwise (i.e. for prediction and sampling, which need the full state at the test points), the RTS gain
+        requires a solve with the dense predicted covariance, so each step costs O((M·ν)³), as for the dense
+        smoother. Only the decoupled engine, with a Gaussian likelihood on a fixed spatial grid, reaches
+        O(Mν³ + M²) per step (see decoupled_kalman_filter).
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param m_filtered: the intermediate distribution means computed during filtering [N, state_dim, 1]
+        :param P_filtered: the intermediate distribution covariances computed during filtering [N, state_dim, state_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param store: a flag determining whether to store and return state mean and covariance
+        :param return_full: a flag determining whether to return the full state distribution or just the function(s)
+        :param y: observed data [N, obs_dim]
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
+        :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :param mask: boolean array signifying which elements of y are observed [N, obs_dim]
+        :return:
+            see rauch_tung_striebel_smoother()
+        """
+        theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
+        Kmm, Pinf_time, H_time = self.prior.kronecker_factors(theta_prior)
+        M, nu = Kmm.shape[0], Pinf_time.shape[0]
+        Pinf = np.einsum('ab,ij->aibj', Kmm, Pinf_time)
+        h = H_time[0]
+        if site_params is not None and not return_full:
+            return self.kronecker_information_smoother(theta_prior, theta_lik, Kmm, Pinf, H_time, m_filtered,
+                                                       P_filtered, dt, store, y, site_params, r, steps, mask)
+        if steps is None:
+            steps = (np.concatenate([dt[1:], np.array([0.0])], axis=0), np.arange(dt.shape[0]))
+        else:
+            steps = (steps[0], np.concatenate([steps[1][1:], np.array([0])], axis=0))  # index 0 is always Δt=0
+        A_table = vmap(self.prior.temporal_state_transition, (0, None))(steps[0], theta_prior)
+        N = m_filtered.shape[0]
+        m_filtered = m_filtered.reshape(N, M, nu)
+        P_filtered = P_filtered.reshape(N, M, nu, M, nu)
+
+        def step(carry, inputs):
+            m, P = carry
+            m_filtered_n, P_filtered_n, dt_index_n, r_n, y_n, site_params_n = inputs
+            # --- First compute the smoothing distribution: ---
+            A = A_table[dt_index_n]
+            m_predicted = m_filtered_n @ A.T
+            tmp_gain_cov = np.einsum('ij,ajbk->aibk', A, P_filtered_n)  # A Pᶠ
+            P_predicted = np.einsum('aibk,lk->aibl', np.einsum('ij,ajbk->aibk', A, P_filtered_n - Pinf), A) + Pinf
+            G_transpose = solve(P_predicted.reshape(M * nu, M * nu),
+                                tmp_gain_cov.reshape(M * nu, M * nu)).reshape(M, nu, M, nu)  # (P^-1)AF
+            m = m_filtered_n + np.einsum('aibj,ai->bj', G_transpose, m - m_predicted)
+            P = P_filtered_n + np.einsum('aibj,aick,ckdl->bjdl', G_transpose, P - P_predicted, G_transpose)
+            Kx = self.prior.spatial_measurement_model(r_n, theta_prior)
+            post_mean = Kx @ (m @ h)[:, np.newaxis]
+            post_cov = np.einsum('na,i,aibj,mb,j->nm', Kx, h, P, Kx, h)
+            smoothed = None
+            if store:
+                if return_full:
+                    smoothed = (m.reshape(M * nu, 1), P.reshape(M * nu, M * nu))
+                else:
+                    smoothed = (post_mean, post_cov)
+            # --- Now update the site parameters: ---
+            sites = None
+            if site_params is not None:
+                _, site_mu, site_cov = self.sites.update(self.likelihood, y_n[..., np.newaxis],
+                                                         post_mean, post_cov, theta_lik, site_params_n)
+                sites = (site_mu, site_cov)
+            return (m, P), (smoothed, sites)
+
+        # run the scan backwards in time by flipping the inputs, and flip the stacked outputs back afterwards
+        flip = partial(tree_map, lambda x: x[::-1])
+        _, (smoothed, sites) = lax.scan(step, (m_filtered[-1, ...], P_filtered[-1, ...]),
+                                        flip((m_filtered, P_filtered, steps[1], r, y, site_params)))
+        smoothed, sites = flip((smoothed, sites))
+        if site_params is not None:
+            site_params = sites
+        if store:
+            return site_params, smoothed[0], smoothed[1]
+        return site_params
+
+    def kronecker_information_smoother(self, theta_prior, theta_lik, Kmm, Pinf, H_time, m_filtered, P_filtered, dt,
+                                       store, y, site_params, r, steps, mask):
+        """
+        The modified Bryson-Frazier form of kronecker_rauch_tung_striebel_smoother(), used to update the sites.
+        The backward pass at step n re-forms the filter's update at step n+1 from the filtering distribution and the
+        site at n+1, so the predicted covariance is never inverted. The products with H = Kx ⊗ H_time are applied
+        via its factors, which leaves two dense products per step, ΛK and (HPᶠ)Λ, each O(M³ν²). Steps at which any
+        observation is masked are skipped, as in the filter.
+        """
+        M, nu = Kmm.shape[0], H_time.shape[1]
+        D = M * nu
+        N = m_filtered.shape[0]
+        h = H_time[0]
+        if steps is None:
+            steps = (np.concatenate([dt[1:], np.array([0.0])], axis=0), np.arange(N))
+        else:
+            steps = (steps[0], np.concatenate([steps[1][1:], np.array([0])], axis=0))  # index 0 is always Δt=0
+        A_table = vmap(self.prior.temporal_state_transition, (0, None))(steps[0], theta_prior)
+        m_filtered = m_filtered.reshape(N, M, nu)
+        P_filtered = P_filtered.reshape(N, M, nu, M, nu)
+        # the inputs of the update at step n+1. The final step has no successor, so it is treated as unobserved
+        shift = partial(tree_map, lambda x: np.concatenate([x[1:], x[-1:]], axis=0))
+        r_next, site_params_next = shift((r, site_params))
+        if mask is None:
+            observed = np.ones(N, dtype=bool)
+        else:
+            observed = np.logical_not(np.any(mask.reshape(N, -1), axis=1))
+        observed_next = np.concatenate([observed[1:], np.array([False])], axis=0)
+
+        def step(carry, inputs):
+            lam, Lam = carry  # the adjoint variables λ̂ₙ₊₁, Λ̂ₙ₊₁ [M·ν, 1], [M·ν, M·ν]
+            (m_filtered_n, P_filtered_n, dt_index_n, r_n, y_n, site_params_n, r_next_n, site_params_next_n,
+             observed_next_n) = inputs
+            # --- First re-form the update at step n+1 and propagate the adjoint variables back to step n: ---
+            A = A_table[dt_index_n]
+            m_predicted = m_filtered_n @ A.T
+            P_predicted = np.einsum('aibk,lk->aibl', np.einsum('ij,ajbk->aibk', A, P_filtered_n - Pinf), A) + Pinf
+            Kx = self.prior.spatial_measurement_model(r_next_n, theta_prior)
+            HP = np.einsum('na,i,aibj->nbj', Kx, h, P_predicted)  # H Pₙ⁻ [obs, M, ν]
+            site_mean, site_cov = site_params_next_n
+            S = np.einsum('nbj,mb,j->nm', HP, Kx, h) + site_cov
+            K_transpose = solve(S, HP.reshape(HP.shape[0], D))  # (S⁻¹)HPₙ⁻
+            LamK = Lam @ K_transpose.T
+            KLamK = K_transpose @ LamK
+            H_transpose_LamK = np.einsum('na,i,nk->aik', Kx, h, LamK.T).reshape(D, D)  # H'K'Λ
+            # H'S⁻¹H and H'K'ΛKH are Kronecker products
+            Lam_tilde = (np.einsum('ab,i,j->aibj', Kx.T @ solve(S, Kx) + Kx.T @ KLamK @ Kx, h, h).reshape(D, D)
+                         + Lam - H_transpose_LamK - H_transpose_LamK.T)
+            v = site_mean - Kx @ (m_predicted @ h)[:, np.newaxis]
+            lam_tilde = lam - np.einsum('na,i,nk->aik', Kx, h, solve(S, v) + K_transpose @ lam).reshape(D, 1)
+            Lam_tilde = np.where(observed_next_n, Lam_tilde, Lam)
+            lam_tilde = np.where(observed_next_n, lam_tilde, lam)
+            lam = (lam_tilde.reshape(M, nu) @ A).reshape(D, 1)
+            Lam = np.einsum('akbl,lj->akbj', np.einsum('ki,akbl->aibl', A, Lam_tilde.reshape(M, nu, M, nu)),
+                            A).reshape(D, D)
+            # --- Now compute the smoothed marginal: ---
+            Kx = self.prior.spatial_measurement_model(r_n, theta_prior)
+            m = m_filtered_n - (P_filtered_n.reshape(D, D) @ lam).reshape(M, nu)
+            HP = np.einsum('na,i,aibj->nbj', Kx, h, P_filtered_n)  # H Pᶠₙ [obs, M, ν]
+            post_mean = Kx @ (m @ h)[:, np.newaxis]
+            post_cov = np.einsum('nbj,mb,j->nm', HP, Kx, h)
+            HP = HP.reshape(HP.shape[0], D)
+            post_cov = post_cov - HP @ Lam @ HP.T
+            smoothed = (post_mean, post_cov) if store else None
+            # --- Now update the site parameters: ---
+            _, site_mu, site_cov = self.sites.update(self.likelihood, y_n[..., np.newaxis],
+                                                     post_mean, post_cov, theta_lik, site_params_n)
+            return (lam, Lam), (smoothed, (site_mu, site_cov))
+
+        # run the scan backwards in time by flipping the inputs, and flip the stacked outputs back afterwards
+        flip = partial(tree_map, lambda x: x[::-1])
+        _, (smoothed, site_params) = lax.scan(step, (np.zeros([D, 1]), np.zeros([D, D])),
+                                              flip((m_filtered, P_filtered, steps[1], r, y, site_params, r_next,
+                                                    site_params_next, observed_next)))
+        smoothed, site_params = flip((smoothed, site_params))
+        if store:
+            return site_params, smoothed[0], smoothed[1]
+        return site_params
+
+    @partial(jit, static_argnums=(4,))
+    def decoupled_kalman_filter(self, y, dt, params, store=False, mask=None, site_params=None, r=None, steps=None):
+        """
+        Run the Kalman filter to get p(fₙ|y₁,...,yₙ) for spatio-temporal priors with Kronecker structure when the
+        data lie on a fixed spatial grid and the likelihood is Gaussian, i.e. the sites are 𝓝(fₙ|yₙ,σ²I).
+        Writing Kmm = V Λ V', the rotated state (V' ⊗ I) x has prior covariance Λ ⊗ Pinf_time, and the rotated
+        observations V'yₙ have noise σ²I, so the M spatial eigenmodes are independent ν-dimensional state space
+        models, which are filtered in parallel (vmapped). The rotation is orthogonal, so the marginal likelihood is
+        the sum of the marginal likelihoods of the modes. Each step costs O(Mν³) plus O(M²) for the rotation.
+        Time steps with missing data are skipped, as in the other filters.
+        :param y: observed data [N, obs_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param store: flag to notify whether to store the intermediates
+        :param mask: boolean array signifying which elements of y are observed [N, obs_dim]
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]. Only the site means are used.
+        :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            see kalman_filter(), except that the filtering distributions are those of the eigenmodes,
+            i.e. the means are [N, M, ν, 1] and the covariances are [N, M, ν, ν]
+        """
+        theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
+        Kmm, Pinf_time, H_time = self.prior.kronecker_factors(theta_prior)
+        eig, V = np.linalg.eigh(Kmm)
+        N, M, nu = y.shape[0], Kmm.shape[0], Pinf_time.shape[0]
+        if steps is None:
+            steps = (dt, np.arange(N))
+        A_table = vmap(self.prior.temporal_state_transition, (0, None))(steps[0], theta_prior)
+        site_mean = y if site_params is None else site_params[0].reshape(N, M)
+        if mask is None:
+            observed = np.ones(N, dtype=bool)
+        else:
+            observed = ~np.any(mask, axis=1)
+            site_mean = np.where(mask.reshape(N, M), 0., site_mean)
+        y_rotated = site_mean.reshape(N, M) @ V  # V'yₙ [N, M]
+
+        def mode_filter(y_mode, eig_mode):
+            Pinf = eig_mode * Pinf_time
+
+            def step(carry, inputs):
+                neg_log_marg_lik, m, P = carry
+                y_n, dt_index_n, observed_n = inputs
+                A = A_table[dt_index_n]
+                m_ = A @ m
+                P_ = A @ (P - Pinf) @ A.T + Pinf
+                predict_mean = H_time @ m_
+                S = H_time @ P_ @ H_time.T + theta_lik
+                K = P_ @ H_time.T / S
+                m = np.where(observed_n, m_ + K * (y_n - predict_mean), m_)
+                P = np.where(observed_n, P_ - K @ S @ K.T, P_)
+                log_lik_n = -0.5 * np.log(2 * pi * S) - 0.5 * (y_n - predict_mean) ** 2 / S
+                neg_log_marg_lik -= np.where(observed_n, np.sum(log_lik_n), 0.)
+                outputs = (m, P) if store else None
+                return (neg_log_marg_lik, m, P), outputs
+
+            (neg_log_marg_lik_mode, _, _), outputs = lax.scan(step, (np.array(0.0), np.zeros([nu, 1]), Pinf),
+                                                              (y_mode, steps[1], observed))
+            return neg_log_marg_lik_mode, outputs
+
+        neg_log_marg_lik, outputs = vmap(mode_filter, (1, 0))(y_rotated, eig)
+        neg_log_marg_lik = np.sum(neg_log_marg_lik)
+        if store:
+            filtered_mean, filtered_cov = outputs  # [M, N, ...]
+            if site_params is None:
+                site_params = (y[..., np.newaxis], theta_lik * np.tile(np.eye(M), (N, 1, 1)))
+            return neg_log_marg_lik, (np.swapaxes(filtered_mean, 0, 1), np.swapaxes(filtered_cov, 0, 1),
+                                      site_params)
+        return neg_log_marg_lik
+
+    @partial(jit, static_argnums=(5, 6))
+    def decoupled_rauch_tung_striebel_smoother(self, params, m_filtered, P_filtered, dt, store=False,
+                                               return_full=False, y=None, site_params=None, r=None, steps=None):
+        """
+        Run the RTS smoother to get p(fₙ|y₁,...,y_N) for the decoupled spatial eigenmodes
+        (see decoupled_kalman_filter), in parallel across the modes, and rotate the result back.
+        The Gaussian sites are exact, so they are not changed by the site update.
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param m_filtered: the eigenmode filtering means computed during filtering [N, M, ν, 1]
+        :param P_filtered: the eigenmode filtering covariances computed during filtering [N, M, ν, ν]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param store: a flag determining whether to store and return state mean and covariance
+        :param return_full: a flag determining whether to return the full state distribution or just the function(s)
+        :param y: observed data [N, obs_dim]
+        :param site_params: the Gaussian approximate likelihoods [2, N, obs_dim]
+        :param r: spatial input locations
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            see rauch_tung_striebel_smoother()
+        """
+        theta_prior, theta_lik = softplus_list(params[0]), softplus(params[1])
+        Kmm, Pinf_time, H_time = self.prior.kronecker_factors(theta_prior)
+        eig, V = np.linalg.eigh(Kmm)
+        N, M, nu = m_filtered.shape[0], Kmm.shape[0], Pinf_time.shape[0]
+        if steps is None:
+            steps = (np.concatenate([dt[1:], np.array([0.0])], axis=0), np.arange(N))
+        else:
+            steps = (steps[0], np.concatenate([steps[1][1:], np.array([0])], axis=0))  # index 0 is always Δt=0
+        A_table = vmap(self.prior.temporal_state_transition, (0, None))(steps[0], theta_prior)
+
+        def mode_smoother(m_filtered_mode, P_filtered_mode, eig_mode):
+            Pinf = eig_mode * Pinf_time
+
+            def step(carry, inputs):
+                m, P = carry
+                m_filtered_n, P_filtered_n, dt_index_n = inputs
+                A = A_table[dt_index_n]
+                m_predicted = A @ m_filtered_n
+                P_predicted = A @ (P_filtered_n - Pinf) @ A.T + Pinf
+                G_transpose = solve(P_predicted, A @ P_filtered_n)
+                m = m_filtered_n + G_transpose.T @ (m - m_predicted)
+                P = P_filtered_n + G_transpose.T @ (P - P_predicted) @ G_transpose
+                return (m, P), (m, P)
+
+            flip = partial(tree_map, lambda x: x[::-1])
+            _, smoothed = lax.scan(step, (m_filtered_mode[-1], P_filtered_mode[-1]),
+                                   flip((m_filtered_mode, P_filtered_mode, steps[1])))
+            return flip(smoothed)
+
+        smoothed_mean, smoothed_cov = vmap(mode_smoother, (1, 1, 0))(m_filtered, P_filtered, eig)  # [M, N, ...]
+        if site_params is not None:
+            site_params = (y[..., np.newaxis], theta_lik * np.tile(np.eye(M), (N, 1, 1)))
+        if store:
+            if return_full:
+                # rotate the state back, (V ⊗ I) x
+                full_mean = np.einsum('ai,injk->najk', V, smoothed_mean).reshape(N, M * nu, 1)
+                full_cov = np.einsum('ai,injk,bi->najbk', V, smoothed_cov, V).reshape(N, M * nu, M * nu)
+                return site_params, full_mean, full_cov
+            mode_mean = np.einsum('j,injk->ni', H_time[0], smoothed_mean)
+            mode_var = np.einsum('j,injk,k->ni', H_time[0], smoothed_cov, H_time[0])
+            post_mean = (mode_mean @ V.T)[..., np.newaxis]
+            post_cov = np.einsum('ai,ni,bi->nab', V, mode_var, V)
+            return site_params, post_mean, post_cov
+        return site_params
+
+    def prior_sample(self, num_samps, t=None, r=None, seed=0):
+        """
+        Sample from the model prior f~N(0,K) by simulating the state space model forwards in time (see
+        simulate_prior). Each sample is drawn with its own PRNG key, split from the seed.
         :param num_samps: the number of samples to draw [scalar]
         :param t: the input locations at which to sample (defaults to train+test set) [N_samp, 1]
+        :param r: the spatial input locations at which to sample [N_samp, R]
+        :param seed: the seed of the random number generator [scalar]
         :return:
-            f_sample: the prior samples [S, N_samp]
+            f_sample: the prior samples [N_samp, func_dim, S]
         """
-        self.update_model(softplus_list(self.prior.hyp))
         if t is None:
-            t = self.t_all
+            t, r = self.t_all, self.r_all
         else:
             x_ind = np.argsort(t[:, 0])
+            r = t[x_ind, 1:] if r is None else r[x_ind]
             t = t[x_ind]
         dt = np.concatenate([np.array([0.0]), np.diff(t[:, 0])])
-        N = dt.shape[0]
-        with loops.Scope() as s:
-            s.f_sample = np.zeros([N, self.func_dim, num_samps])
-            s.m = np.linalg.cholesky(self.Pinf) @ random.normal(random.PRNGKey(99), shape=[self.state_dim, 1])
-            for i in s.range(num_samps):
-                s.m = np.linalg.cholesky(self.Pinf) @ random.normal(random.PRNGKey(i), shape=[self.state_dim, 1])
-                for k in s.range(N):
-                    A = self.prior.state_transition(dt[k], self.prior.hyp)  # transition and noise process matrices
-                    Q = self.Pinf - A @ self.Pinf @ A.T
-                    C = np.linalg.cholesky(Q + 1e-6 * np.eye(self.state_dim))  # <--- can be a bit unstable
-                    # we need to provide a different PRNG seed every time:
-                    s.m = A @ s.m + C @ random.normal(random.PRNGKey(i*k+k), shape=[self.state_dim, 1])
-                    H = self.prior.measurement_model(t[k, 1:], softplus_list(self.prior.hyp))
-                    f = (H @ s.m).T
-                    s.f_sample = index_add(s.f_sample, index[k, ..., i], np.squeeze(f))
-        return s.f_sample
-
-    def posterior_sample(self, num_samps):
+        keys = random.split(random.PRNGKey(seed), num_samps)
+        return self.simulate_prior(self.prior.hyp, keys, dt, r, compress_steps(dt))
+
+    @jit
+    def simulate_prior(self, hyp_prior, keys, dt, r, steps):
+        """
+        Draw one sample from the prior per PRNG key by forward simulation of the state space model,
+            x₀ ~ 𝓝(0,Pinf),  xₙ = Aₙ xₙ₋₁ + chol(Qₙ) zₙ,  zₙ ~ 𝓝(0,I),  fₙ = H xₙ,
+        where Aₙ and the Cholesky factor of Qₙ are computed once per unique step size (see square_root_tables).
+        The Gaussian draws of each sample are generated in one call, and the samples are vmapped.
+        :param hyp_prior: the hyperparameters of the GP prior
+        :param keys: one PRNG key per sample [S, 2]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N]
+        :param r: spatial input locations [N, R]
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            f_sample: the prior samples [N, func_dim, S]
+        """
+        theta_prior = softplus_list(hyp_prior)
+        self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
+        A_table, Q_sqrt_table, dt_index = self.square_root_tables(dt, theta_prior, steps)
+        Pinf_sqrt = np.linalg.cholesky(self.Pinf)
+
+        def step(x, inputs):
+            dt_index_n, r_n, z_n = inputs
+            x = A_table[dt_index_n] @ x + Q_sqrt_table[dt_index_n] @ z_n
+            H = self.prior.measurement_model(r_n, theta_prior)
+            return x, H @ x
+
+        def sample(key):
+            z = random.normal(key, shape=[dt.shape[0] + 1, self.state_dim, 1])
+            _, f = lax.scan(step, Pinf_sqrt @ z[0], (dt_index, r, z[1:]))
+            return f[..., 0]
+
+        return np.moveaxis(vmap(sample)(keys), 0, -1)
+
+    @jit
+    def smooth_samples(self, params, y_samples, site_cov, dt, mask, r, steps):
+        """
+        Compute the posterior mean E[f|y*] of the auxiliary model p(y*|f) = 𝓝(y*|f,site_cov) for each sample of
+        auxiliary data y* (see posterior_sample). The site covariances are shared by all the samples, so every sample
+        is filtered and smoothed in a single vmapped pass.
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param y_samples: the auxiliary data [N, func_dim, S]
+        :param site_cov: the site covariances [N, func_dim, func_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param mask: boolean array signifying which elements of y are masked [N, obs_dim]
+        :param r: spatial input locations [N, R]
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :return:
+            smoothed_samples: the smoothed samples [N, func_dim, S]
+        """
+        def smooth(site_mean):
+            _, (filter_mean, filter_cov, _) = self.kalman_filter(np.zeros(site_mean.shape[:2]), dt, params, True, mask,
+                                                                 (site_mean, site_cov), r, steps)
+            _, smoothed_mean, _ = self.rauch_tung_striebel_smoother(params, filter_mean, filter_cov, dt, True, False,
+                                                                    None, None, r, steps)
+            return smoothed_mean[..., 0]
+
+        return np.moveaxis(vmap(smooth)(np.moveaxis(y_samples, -1, 0)[..., np.newaxis]), 0, -1)
+
+    def posterior_sample(self, num_samps, seed=0):
         """
         Sample from the posterior at the test locations.
         Posterior sampling works by smoothing samples from the prior using the approximate Gaussian likelihood
@@ -428,18 +2004,426 @@ class SDEGP(object):
          - add Gaussian noise to the prior samples using auxillary model p(y*|f*) = 𝓝(y*|f*,σ²*)
          - smooth the samples by computing the posterior p(f*|y*), i.e. the posterior samples
         See Arnaud Doucet's note "A Note on Efficient Conditional Simulation of Gaussian Distributions" for details.
+        The prior samples are drawn in parallel and all of the samples are smoothed in one batched pass, so the
+        cost grows with the number of samples only through the width of the batch.
         :param num_samps: the number of samples to draw [scalar]
+        :param seed: the seed of the random number generator [scalar]
         :return:
-            the posterior samples [N_test, num_samps]
+            the posterior samples [N_test, func_dim, num_samps]
         """
+        params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
+        key_noise, key_prior = random.split(random.PRNGKey(seed))
         post_mean, _, (site_mean, site_cov), _ = self.predict(site_params=self.sites.site_params, compute_nlpd=False)
-        prior_samp = self.prior_sample(num_samps, t=self.t_all)
-        prior_samp_y = sample_gaussian_noise(prior_samp, site_cov)
-        with loops.Scope() as ss:
-            ss.smoothed_sample = np.zeros(prior_samp_y.shape)
-            for i in ss.range(num_samps):
-                smoothed_sample_i, _, _, _ = self.predict(np.zeros_like(prior_samp_y[..., i]), self.dt_all, self.mask,
-                                                          (prior_samp_y[..., i], site_cov),
-                                                          sampling=True, compute_nlpd=False)
-                ss.smoothed_sample = index_add(ss.smoothed_sample, index[..., i], smoothed_sample_i[..., 0])
-        return prior_samp - ss.smoothed_sample + post_mean
+        prior_samp = self.simulate_prior(params[0], random.split(key_prior, num_samps), self.dt_all, self.r_all,
+                                         self.all_steps)
+        prior_samp_y = sample_gaussian_noise(prior_samp, site_cov, key_noise)
+        smoothed_samp = self.smooth_samples(params, prior_samp_y, site_cov, self.dt_all, self.mask, self.r_all,
+                                            self.all_steps)
+        return prior_samp - smoothed_samp + post_mean
+
+    def ffbs_sample(self, num_samps, t_query=None, r_query=None, seed=0):
+        """
+        Sample from the posterior by forward-filtering backward-sampling (FFBS). The data are filtered once with the
+        current sites, and the joint posterior trajectories are then drawn in a single backward pass over the stored
+        filtering distributions (see backward_sample). Unlike posterior_sample, no prior samples or auxiliary
+        smoothing passes are needed.
+        If query inputs are supplied, they are filtered alongside the training inputs without sites (as test
+        inputs), and the samples are returned at the query inputs only.
+        :param num_samps: the number of samples to draw [scalar]
+        :param t_query: the inputs at which to return the samples. Defaults to the training & test inputs [N*, 1]
+        :param r_query: the spatial inputs at which to return the samples [N*, R]
+        :param seed: the seed of the random number generator [scalar]
+        :return:
+            the posterior samples, in order of increasing t_query [N*, func_dim, num_samps]
+        """
+        if self.decoupled:
+            raise NotImplementedError('FFBS requires the dense filtering covariances, so is not implemented for the '
+                                      'decoupled filter')
+        params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
+        if t_query is None:
+            y, r, dt, train_id, query_id, mask = self.y_all, self.r_all, self.dt_all, self.train_id, None, self.mask
+        else:
+            _, y, r, _, _, _, _, dt, _, train_id, query_id, mask = input_admin(self.t_train, self.y_train,
+                                                                              self.r_train, t_query, None, r_query)
+        steps = compress_steps(dt)
+        site_params = self.sites.site_params
+        if site_params is not None:
+            site_params = self.expand_sites(site_params, dt.shape[0], train_id)
+        _, (filter_mean, filter_cov, _) = self.kalman_filter(y, dt, params, True, mask, site_params, r, steps)
+        if self.square_root:  # the square-root filter stores the Cholesky factors of the covariances
+            filter_cov = filter_cov @ np.transpose(filter_cov, (0, 2, 1))
+        f_samples = self.backward_sample(params, filter_mean, filter_cov, dt, r, steps, random.PRNGKey(seed),
+                                         num_samps)
+        return f_samples if query_id is None else f_samples[query_id]
+
+    @partial(jit, static_argnums=(8,))
+    def backward_sample(self, params, filter_mean, filter_cov, dt, r, steps, key, num_samps):
+        """
+        The backward pass of FFBS. The last state is drawn from the filtering distribution, xₙ ~ 𝓝(m_N,P_N), and
+        each earlier state is drawn conditioned on the sampled next state,
+            xₙ | xₙ₊₁ ~ 𝓝(mₙ + Gₙ(xₙ₊₁ - Aₙmₙ), Pₙ - Gₙ Pₙ₊₁⁻ Gₙ'),
+        where Pₙ₊₁⁻ = Aₙ(Pₙ - Pinf)Aₙ' + Pinf is the predicted covariance and Gₙ = PₙAₙ'(Pₙ₊₁⁻)⁻¹ is the smoother gain.
+        The gain and the conditional covariance do not depend on the sample, so they are computed once per step,
+        and all of the samples are propagated together as the columns of a [state_dim, S] matrix.
+        :param params: the model parameters, i.e the hyperparameters of the prior & likelihood
+        :param filter_mean: the filtering means [N, state_dim, 1]
+        :param filter_cov: the filtering covariances [N, state_dim, state_dim]
+        :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N, 1]
+        :param r: spatial input locations [N, R]
+        :param steps: the unique step sizes and the index of each step into them (see utils.compress_steps)
+        :param key: the PRNG key
+        :param num_samps: the number of samples to draw [scalar]
+        :return:
+            f_samples: the posterior samples [N, func_dim, S]
+        """
+        theta_prior = softplus_list(params[0])
+        self.update_model(theta_prior)  # all model components that are not static must be computed inside the function
+        A_table, dt_index = self.transition_table(dt, theta_prior, steps)
+        z = random.normal(key, shape=[filter_mean.shape[0], self.state_dim, num_samps])
+        # the conditional covariance is singular when Δt=0, so a small jitter is added relative to each state's scale
+        jitter = 1e-8 * np.diag(np.diag(self.Pinf))
+
+        def step(x, inputs):
+            m_n, P_n, dt_index_n, r_n, z_n = inputs  # dt_index_n is the index of the step tₙ -> tₙ₊₁
+            A = A_table[dt_index_n]
+            P_predicted = A @ (P_n - self.Pinf) @ A.T + self.Pinf
+            G_transpose = solve(P_predicted, A @ P_n)  # (P^-1)AF
+            mean = m_n + G_transpose.T @ (x - A @ m_n)
+            cov = P_n - G_transpose.T @ P_predicted @ G_transpose
+            x = mean + np.linalg.cholesky(0.5 * (cov + cov.T) + jitter) @ z_n
+            H = self.prior.measurement_model(r_n, theta_prior)
+            return x, H @ x
+
+        x_last = filter_mean[-1] + np.linalg.cholesky(filter_cov[-1] + jitter) @ z[-1]
+        flip = partial(tree_map, lambda x: x[::-1])
+        _, f_samples = lax.scan(step, x_last, flip((filter_mean[:-1], filter_cov[:-1], dt_index[1:], r[:-1], z[:-1])))
+        f_last = self.prior.measurement_model(r[-1], theta_prior) @ x_last
+        return np.concatenate([flip(f_samples), f_last[None]])
+
+
+def filter_series(model, store, y, dt, params, mask, site_params, r, steps):
+    """
+    The filter of a single series of a BatchedSDEGP (see BatchedSDEGP.map_series).
+    """
+    return SDEGP.kalman_filter(model, y, dt, params, store, mask, site_params, r, steps)
+
+
+def smoother_series(model, store, return_full, batch_sites, params, m_filtered, P_filtered, dt, y, site_params, r,
+                    steps, mask):
+    """
+    The smoother of a single series of a BatchedSDEGP (see BatchedSDEGP.map_series).
+    """
+    return SDEGP.rauch_tung_striebel_smoother(model, params, m_filtered, P_filtered, dt, store, return_full, y,
+                                              site_params, r, steps, batch_sites, mask)
+
+
+class BatchedSDEGP(SDEGP):
+    """
+    A batch of B independent time series, each modelled by an SDE-GP with the same prior and likelihood.
+    The data are stacked along a leading batch axis, and the filter, smoother and site updates are vmapped across
+    the series, so that a single compiled call processes the whole batch. Each series must have the same number of
+    training (and test) inputs. Missing observations, e.g. at the end of a shorter series, are passed as nans and
+    are masked per series.
+    The energy is the sum of the energies of the series. The hyperparameters are either shared across the batch, or
+    each series has its own hyperparameters (shared_hyp=False), stacked along the leading axis of prior.hyp and
+    likelihood.hyp. Since the series are independent, the gradient of the summed energy w.r.t. the hyperparameters
+    of a series is the gradient of that series' energy.
+    The training methods of SDEGP (run, run_two_stage, fit, train, precompile) apply directly to the batch.
+    A single XLA computation rarely uses all the cores of a CPU when the state dimension is small, so the series can
+    also be sharded across several devices (num_devices) with pmap, and vmapped within each device. On the CPU, the
+    number of host devices must be set before jax is imported, e.g.
+        os.environ['XLA_FLAGS'] = '--xla_force_host_platform_device_count=8'
+    The energies and gradients of the shards are gathered back to a single device for the optimiser. Note that
+    train() compiles each chunk of optimisation steps into a single computation, in which the shards are gathered
+    onto one device at every step, so run() or fit() should be used to train a sharded batch.
+    """
+    # the pmapped functions of the sharded series (see map_series), shared by all the models
+    sharded_functions = {}
+
+    def __init__(self, prior, likelihood, t, y, r=None, t_test=None, y_test=None, r_test=None, approx_inf=None,
+                 shared_hyp=True, parallel=False, square_root=False, num_devices=None, conjugate=False):
+        """
+        :param prior: the model prior p(f|0,k(t,t')) object which constructs the required state space model matrices
+        :param likelihood: the likelihood model object which performs parameter updates and evaluates p(y|f)
+        :param t: training inputs [B, N, 1]
+        :param y: training data / observations, with nans at missing observations [B, N, obs_dim]
+        :param r: training spatial points [B, N, R]
+        :param t_test: test inputs [B, N*, 1]
+        :param y_test: test data / observations [B, N*, obs_dim]
+        :param r_test: test spatial points [B, N*, R]
+        :param approx_inf: the approximate inference algorithm for computing the sites (EP, VI, UKS, ...)
+        :param shared_hyp: flag to notify whether the hyperparameters are shared by all the series
+        :param parallel: flag to notify whether to use the parallel-in-time filter and smoother
+        :param square_root: flag to notify whether to use the square-root filter and smoother
+        :param num_devices: if supplied, the series are sharded across this many devices, which must divide the
+                            number of series
+        :param conjugate: flag to notify whether to use the exact sites of the Gaussian likelihood (see SDEGP)
+        """
+        def series(x, b):
+            return None if x is None else nnp.asarray(x)[b]
+
+        num_series = nnp.asarray(t).shape[0]
+        data = [input_admin(series(t, b), series(y, b), series(r, b), series(t_test, b), series(y_test, b),
+                            series(r_test, b)) for b in range(num_series)]
+        super().__init__(prior, likelihood, series(t, 0), series(y, 0), series(r, 0), series(t_test, 0),
+                         series(y_test, 0), series(r_test, 0), approx_inf, parallel=parallel, square_root=square_root,
+                         conjugate=conjugate)
+        print('batching', num_series, 'series')
+        (self.t_all, self.y_all, self.r_all,
+         self.t_train, self.y_train, self.r_train,
+         self.r_test,
+         self.dt_all, self.dt_train,
+         self.train_id, self.test_id, self.mask
+         ) = [np.stack(x) for x in zip(*data)]
+        self.num_series = num_series
+        self.train_steps = stack_steps([compress_steps(dt) for dt in self.dt_train])
+        self.all_steps = stack_steps([compress_steps(dt) for dt in self.dt_all])
+        # the missing training observations are masked, and are set to zero so that they do not produce nans
+        train_mask = np.isnan(self.y_train)
+        self.mask = self.mask | np.isnan(self.y_all)
+        self.train_inputs = (np.where(train_mask, 0., self.y_train), self.dt_train, self.r_train, train_mask,
+                             self.train_steps)
+        self.hyp_axis = None if shared_hyp else 0  # the batch axis of the hyperparameters
+        if not shared_hyp:
+            print('using separate hyperparameters for each series')
+            self.prior.hyp, self.likelihood.hyp = tree_map(lambda x: np.tile(x, (num_series,) + (1,) * x.ndim),
+                                                           (self.prior.hyp, self.likelihood.hyp))
+        self.num_devices = num_devices
+        if self.num_devices is not None:
+            if self.num_devices > device_count():
+                raise ValueError('only %d devices are available (see XLA_FLAGS in the class docstring)'
+                                 % device_count())
+            if num_series % self.num_devices != 0:
+                raise ValueError('the number of series must be a multiple of the number of devices')
+            print('sharding the series across', self.num_devices, 'devices')
+
+    def map_series(self, f, in_axes, static=()):
+        """
+        Map f across the series in the batch, where f is called as f(model, *static, *args) with one series of each
+        mapped argument (in_axes=0), i.e. vmap(f, (None,) + in_axes). If num_devices is set, the batch axis is split
+        into [num_devices, B / num_devices], and a jitted vmap of f across each shard is mapped across the devices
+        with pmap. The model and the arguments that are not mapped (in_axes=None) are copied to every device, and
+        the outputs are gathered and reshaped back to [B, ...]. The sharded methods are not jitted themselves (a
+        pmap inside a jit is compiled into a single computation, which gathers every shard onto one device), so the
+        pmapped functions are cached in sharded_functions instead.
+        :param f: the function of a single series
+        :param in_axes: the batch axis of each argument of f after the static ones, 0 or None
+        :param static: the static (hashable) arguments of f, which are not mapped
+        :return:
+            the mapped function of the remaining arguments
+        """
+        in_axes = (None,) + tuple(in_axes)
+
+        def series_f(model, *args):
+            return f(model, *static, *args)
+
+        if self.num_devices is None:
+            return partial(vmap(series_f, in_axes), self)
+        key = (f, static, in_axes, self.num_devices)
+        if key not in self.sharded_functions:
+            self.sharded_functions[key] = pmap(jit(vmap(series_f, in_axes)))
+
+        def shard(x):
+            return x.reshape((self.num_devices, x.shape[0] // self.num_devices) + x.shape[1:])
+
+        def replicate(x):
+            return np.broadcast_to(x, (self.num_devices,) + np.shape(x))
+
+        def gather(x):
+            return x.reshape((x.shape[0] * x.shape[1],) + x.shape[2:])
+
+        def sharded_f(*args):
+            args = [tree_map(shard if axis == 0 else replicate, arg) for arg, axis in zip((self,) + args, in_axes)]
+            return tree_map(gather, self.sharded_functions[key](*args))
+
+        return sharded_f
+
+    def predict(self, site_params=None, compute_nlpd=True):
+        """
+        Calculate the posterior predictive distribution p(f*|f,y) of every series by filtering and smoothing across
+        the training & test locations.
+        :param site_params: the sites computed during a previous inference proceedure [2, B, N, obs_dim]
+        :param compute_nlpd: flag to notify whether to compute the negative log predictive density of the test data
+        :return:
+            posterior_mean: the posterior predictive mean [B, M, obs_dim]
+            posterior_cov: the posterior predictive (co)variance [B, M, obs_dim]
+            site_params: the site parameters. If none are provided then new sites are computed [2, B, M, obs_dim]
+            nlpd_test: the negative log predictive density of the test data of each series [B]
+        """
+        params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
+        site_params = self.sites.site_params if site_params is None else site_params
+        if site_params is not None:
+            # test site parameters are 𝓝(0,∞), and will not be used
+            site_mean = np.zeros(self.dt_all.shape[:2] + (self.func_dim, 1))
+            site_cov = 1e5 * np.tile(np.eye(self.func_dim), self.dt_all.shape[:2] + (1, 1))
+            site_mean = vmap(lambda x, i, x_: index_add(x, index[i], x_))(site_mean, self.train_id, site_params[0])
+            site_cov = vmap(lambda x, i, x_: index_update(x, index[i], x_))(site_cov, self.train_id, site_params[1])
+            site_params = (site_mean, site_cov)
+        _, (filter_mean, filter_cov, site_params) = self.kalman_filter(self.y_all, self.dt_all, params, True,
+                                                                       self.mask, site_params, self.r_all,
+                                                                       self.all_steps)
+        _, posterior_mean, posterior_cov = self.rauch_tung_striebel_smoother(params, filter_mean, filter_cov,
+                                                                             self.dt_all, True, False, None, None,
+                                                                             self.r_all, self.all_steps)
+        if compute_nlpd:
+            test_values = vmap(lambda x, i: x[i])
+            nlpd_test = vmap(
+                lambda t_, y_, m_, v_, params_: self.negative_log_predictive_density(t_, y_, m_, v_,
+                                                                                    softplus_list(params_[0]),
+                                                                                    softplus(params_[1]), False),
+                (0, 0, 0, 0, self.hyp_axis)
+            )(test_values(self.t_all, self.test_id), test_values(self.y_all, self.test_id),
+              test_values(posterior_mean, self.test_id), test_values(posterior_cov, self.test_id), params)
+        else:
+            nlpd_test = np.nan
+        return posterior_mean, posterior_cov, site_params, nlpd_test
+
+    def kalman_filter(self, y, dt, params, store=False, mask=None, site_params=None, r=None, steps=None):
+        """
+        Run the Kalman filter of every series in the batch (see SDEGP.kalman_filter), mapped across the leading
+        axis of the inputs, the sites and, if they are not shared, the hyperparameters (see map_series). The batch is
+        jitted as a whole, unless it is sharded across devices.
+        :return:
+            neg_log_marg_lik: the sum of the filter energies of the series [scalar]
+            if store is True, also the filtering means, covariances and sites of each series [B, N, ...]
+        """
+        if self.num_devices is None:
+            return self.jitted_kalman_filter(y, dt, params, store, mask, site_params, r, steps)
+        return self.mapped_kalman_filter(y, dt, params, store, mask, site_params, r, steps)
+
+    def mapped_kalman_filter(self, y, dt, params, store=False, mask=None, site_params=None, r=None, steps=None):
+        outputs = self.map_series(filter_series, (0, 0, self.hyp_axis, 0, 0, 0, 0), (store,))(y, dt, params, mask,
+                                                                                             site_params, r, steps)
+        if store:
+            neg_log_marg_lik, outputs = outputs
+            return np.sum(neg_log_marg_lik), outputs
+        return np.sum(outputs)
+
+    jitted_kalman_filter = partial(jit, static_argnums=(4,))(mapped_kalman_filter)
+
+    def rauch_tung_striebel_smoother(self, params, m_filtered, P_filtered, dt, store=False, return_full=False,
+                                     y=None, site_params=None, r=None, steps=None, batch_sites=False, mask=None):
+        """
+        Run the RTS smoother of every series in the batch (see SDEGP.rauch_tung_striebel_smoother), mapped across
+        the leading axis of the inputs, the sites and, if they are not shared, the hyperparameters (see map_series).
+        The batch is jitted as a whole, unless it is sharded across devices.
+        """
+        if self.num_devices is None:
+            return self.jitted_rauch_tung_striebel_smoother(params, m_filtered, P_filtered, dt, store, return_full,
+                                                            y, site_params, r, steps, batch_sites, mask)
+        return self.mapped_rauch_tung_striebel_smoother(params, m_filtered, P_filtered, dt, store, return_full, y,
+                                                        site_params, r, steps, batch_sites, mask)
+
+    def mapped_rauch_tung_striebel_smoother(self, params, m_filtered, P_filtered, dt, store=False, return_full=False,
+                                            y=None, site_params=None, r=None, steps=None, batch_sites=False,
+                                            mask=None):
+        return self.map_series(smoother_series, (self.hyp_axis, 0, 0, 0, 0, 0, 0, 0, 0),
+                               (store, return_full, batch_sites))(params, m_filtered, P_filtered, dt, y, site_params,
+                                                                  r, steps, mask)
+
+    jitted_rauch_tung_striebel_smoother = partial(jit, static_argnums=(5, 6, 11))(mapped_rauch_tung_striebel_smoother)
+
+    def bridge_fit(self, params=None):
+        raise NotImplementedError('bridge prediction is not implemented for batches of series')
+
+    def online_reset(self, params=None):
+        raise NotImplementedError('online filtering is not implemented for batches of series')
+
+    def posterior_sample(self, num_samps, seed=0):
+        raise NotImplementedError('posterior sampling is not implemented for batches of series')
+
+    def ffbs_sample(self, num_samps, t_query=None, r_query=None, seed=0):
+        raise NotImplementedError('posterior sampling is not implemented for batches of series')
+
+
+class CrossValidatedSDEGP(BatchedSDEGP):
+    """
+    K-fold cross-validation of an SDE-GP model in a single compiled pass. The folds share the same inputs and differ
+    only in which observations are held out, so each fold is a copy of the full data set in which its test
+    observations are masked, and the folds are trained and evaluated together as a batch of series (see
+    BatchedSDEGP). The filter, smoother, site updates and optimiser steps are therefore compiled once for all folds.
+    By default each fold has its own hyperparameters, as when the folds are fitted separately.
+    """
+    transient_attributes = BatchedSDEGP.transient_attributes + ('y_test', 'test_mask')
+
+    def __init__(self, prior, likelihood, t, y, folds, r=None, approx_inf=None, shared_hyp=False, parallel=False,
+                 square_root=False, num_devices=None, conjugate=False):
+        """
+        :param prior: the model prior p(f|0,k(t,t')) object which constructs the required state space model matrices
+        :param likelihood: the likelihood model object which performs parameter updates and evaluates p(y|f)
+        :param t: inputs [N, 1]
+        :param y: data / observations [N, obs_dim]
+        :param folds: the indices of the test inputs of each fold [F, N*]
+        :param r: spatial points [N, R]
+        :param approx_inf: the approximate inference algorithm for computing the sites (EP, VI, UKS, ...)
+        :param shared_hyp: flag to notify whether the hyperparameters are shared by all the folds
+        :param parallel: flag to notify whether to use the parallel-in-time filter and smoother
+        :param square_root: flag to notify whether to use the square-root filter and smoother
+        :param num_devices: if supplied, the folds are sharded across this many devices (see BatchedSDEGP)
+        :param conjugate: flag to notify whether to use the exact sites of the Gaussian likelihood (see SDEGP)
+        """
+        t, y = nnp.asarray(t, dtype=nnp.float64), nnp.asarray(y, dtype=nnp.float64)
+        t = t[:, None] if t.ndim < 2 else t
+        y = y[:, None] if y.ndim < 2 else y
+        folds = nnp.asarray(folds)
+        num_folds = folds.shape[0]
+        test_mask = nnp.zeros([num_folds, t.shape[0]], dtype=bool)
+        test_mask[nnp.arange(num_folds)[:, None], folds] = True
+
+        def stack(x):
+            return None if x is None else nnp.tile(nnp.asarray(x), (num_folds,) + (1,) * nnp.ndim(x))
+
+        print('running', num_folds, 'folds of cross-validation')
+        super().__init__(prior, likelihood, stack(t), nnp.where(test_mask[..., None], nnp.nan, y), stack(r),
+                         approx_inf=approx_inf, shared_hyp=shared_hyp, parallel=parallel, square_root=square_root,
+                         num_devices=num_devices, conjugate=conjugate)
+        # input_admin sorts the inputs, so we sort the held-out data and the test masks in the same way
+        ind = nnp.argsort(t[:, 0], axis=0)
+        self.y_test = np.array(nnp.nan_to_num(y[ind]))
+        self.test_mask = np.array(test_mask[:, ind] & ~nnp.any(nnp.isnan(y[ind]), axis=1))
+
+    def predict(self, site_params=None, compute_nlpd=True):
+        """
+        Calculate the posterior predictive distribution of every fold at all the inputs, and the negative log
+        predictive density (NLPD) of the held-out data of each fold.
+        :param site_params: the sites computed during a previous inference proceedure [2, F, N, obs_dim]
+        :param compute_nlpd: flag to notify whether to compute the NLPD of the held-out data
+        :return:
+            posterior_mean: the posterior predictive mean [F, N, obs_dim]
+            posterior_cov: the posterior predictive (co)variance [F, N, obs_dim]
+            site_params: the site parameters. If none are provided then new sites are computed [2, F, N, obs_dim]
+            nlpd_test: the NLPD of the held-out data of each fold [F]
+        """
+        posterior_mean, posterior_cov, site_params, _ = super().predict(site_params, compute_nlpd=False)
+        if compute_nlpd:
+            params = [self.prior.hyp.copy(), self.likelihood.hyp.copy()]
+            lpd_func = vmap(
+                self.likelihood.moment_match, (0, 0, 0, None, None, None)
+            )
+            log_predictive_density = vmap(
+                lambda m_, v_, params_: lpd_func(self.y_test, m_, v_, softplus(params_[1]), 1, None)[0],
+                (0, 0, self.hyp_axis)
+            )(posterior_mean, posterior_cov, params).reshape(self.test_mask.shape)
+            nlpd_test = -(np.sum(np.where(self.test_mask, log_predictive_density, 0.), axis=1)
+                          / np.sum(self.test_mask, axis=1))  # mean over the held-out data of each fold
+        else:
+            nlpd_test = np.nan
+        return posterior_mean, posterior_cov, site_params, nlpd_test
+
+    def cross_validate(self, optimiser=None, num_iters=250, chunk_size=50, two_stage=False, batch_sites=False,
+                       verbose=False):
+        """
+        Optimise the hyperparameters and sites of all the folds with the compiled training loop (see train), and
+        evaluate each fold on its held-out data.
+        :param optimiser: a (opt_init, opt_update, get_params) triple from jax.experimental.optimizers. If not
+                          supplied then Adam with step size 0.05 is used
+        :param num_iters: the number of optimisation steps [scalar]
+        :param chunk_size: the number of optimisation steps per compiled chunk [scalar]
+        :param two_stage: flag to notify whether to use the two-stage update (see run_two_stage)
+        :param batch_sites: flag to notify whether to batch the site updates in the smoother (see run)
+        :param verbose: flag to notify whether to print the energy after every chunk
+        :return:
+            nlpd_test: the negative log predictive density of the held-out data of each fold [F]
+        """
+        self.train(optimiser, num_iters, chunk_size, two_stage, batch_sites, verbose)
+        return self.predict()[3]
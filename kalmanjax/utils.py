@@ -1,7 +1,9 @@
 import jax.numpy as np
 from jax.scipy.special import erfc
 from jax.scipy.linalg import cho_factor, cho_solve
-from jax import random
+from jax import random, remat, lax
+from jax.lax import fori_loop
+from jax.tree_util import tree_map, tree_leaves, register_pytree_node
 from jax.ops import index_add, index
 import numpy as nnp
 from scipy.interpolate import interp1d
@@ -9,25 +11,120 @@ import matplotlib.pyplot as plt
 from matplotlib.colors import hsv_to_rgb, rgb_to_hsv, ListedColormap
 from numpy.polynomial.hermite import hermgauss
 import itertools
+from functools import partial
 pi = 3.141592653589793
 
 
 def solve(P, Q):
     """
-    Compute P^-1 Q, where P is a PSD matrix, using the Cholesky factoristion
+    Compute P^-1 Q, where P is a PSD matrix, using the Cholesky factoristion.
+    For scalar observations P is 1x1, in which case a division is used instead (the shape is static, so this
+    choice is made at trace time).
     """
+    if P.shape == (1, 1):
+        return Q / P[0, 0]
     L = cho_factor(P)
     return cho_solve(L, Q)
 
 
 def inv(P):
     """
-    Compute the inverse of a PSD matrix using the Cholesky factorisation
+    Compute the inverse of a PSD matrix using the Cholesky factorisation, or a division if P is 1x1
     """
+    if P.shape == (1, 1):
+        return 1. / P
     L = cho_factor(P)
     return cho_solve(L, np.eye(P.shape[0]))
 
 
+def filtering_operator(elem_i, elem_j):
+    """
+    The associative operator used to combine two filtering elements in the parallel-in-time Kalman filter,
+    see Särkkä & García-Fernández 2021 "Temporal Parallelization of Bayesian Smoothers".
+    Each element is a tuple (A, b, C, η, J) parameterising p(xₖ|xᵢ₋₁,yᵢ:ₖ) = 𝓝(xₖ|A xᵢ₋₁ + b, C) and
+    p(yᵢ:ₖ|xᵢ₋₁) ∝ 𝓝ᶜ(xᵢ₋₁|η, J) (in information form).
+    :param elem_i: the earlier element (Aᵢ, bᵢ, Cᵢ, ηᵢ, Jᵢ)
+    :param elem_j: the later element (Aⱼ, bⱼ, Cⱼ, ηⱼ, Jⱼ)
+    :return: the combined element (Aᵢⱼ, bᵢⱼ, Cᵢⱼ, ηᵢⱼ, Jᵢⱼ)
+    """
+    A_i, b_i, C_i, eta_i, J_i = elem_i
+    A_j, b_j, C_j, eta_j, J_j = elem_j
+    dim = A_i.shape[0]
+    M = np.eye(dim) + C_i @ J_j
+    # (I + CᵢJⱼ)⁻¹ applied to [Aᵢ, bᵢ + Cᵢηⱼ, Cᵢ]
+    tmp = np.linalg.solve(M, np.concatenate([A_i, b_i + C_i @ eta_j, C_i], axis=1))
+    A_ij = A_j @ tmp[:, :dim]
+    b_ij = A_j @ tmp[:, dim:dim + 1] + b_j
+    C_ij = A_j @ tmp[:, dim + 1:] @ A_j.T + C_j
+    # (I + JⱼCᵢ)⁻¹ = (I + CᵢJⱼ)⁻ᵀ applied to [ηⱼ - Jⱼbᵢ, JⱼAᵢ]
+    tmp = np.linalg.solve(M.T, np.concatenate([eta_j - J_j @ b_i, J_j @ A_i], axis=1))
+    eta_ij = A_i.T @ tmp[:, :1] + eta_i
+    J_ij = A_i.T @ tmp[:, 1:] + J_i
+    return A_ij, b_ij, 0.5 * (C_ij + C_ij.T), eta_ij, 0.5 * (J_ij + J_ij.T)
+
+
+def smoothing_operator(elem_i, elem_j):
+    """
+    The associative operator used to combine two smoothing elements in the parallel-in-time RTS smoother.
+    Each element is a tuple (E, g, L) parameterising p(xₖ|xₗ,y₁:ₙ) = 𝓝(xₖ|E xₗ + g, L).
+    :param elem_i: the earlier element (Eᵢ, gᵢ, Lᵢ)
+    :param elem_j: the later element (Eⱼ, gⱼ, Lⱼ)
+    :return: the combined element (Eᵢⱼ, gᵢⱼ, Lᵢⱼ)
+    """
+    E_i, g_i, L_i = elem_i
+    E_j, g_j, L_j = elem_j
+    E_ij = E_i @ E_j
+    g_ij = E_i @ g_j + g_i
+    L_ij = E_i @ L_j @ E_i.T + L_i
+    return E_ij, g_ij, 0.5 * (L_ij + L_ij.T)
+
+
+def associative_scan(fn, elems):
+    """
+    Compute the inclusive prefix scan of an associative operator over the leading axis of elems, with O(log N)
+    sequential depth (Blelloch 1990 "Prefix sums and their applications"). The elements are combined pairwise on
+    the way up (adjacent pairs are reduced, then the reduced sequence is scanned recursively) and the remaining
+    prefixes are filled in on the way down. jax 0.1.67 does not provide lax.associative_scan, so this is built
+    from slicing and concatenation, and the recursion is unrolled at trace time.
+    :param fn: the associative operator, applied elementwise to batches of elements, fn(earlier, later)
+    :param elems: a tuple of arrays, each with the elements stacked along the leading axis [N, ...]
+    :return: the tuple of prefixes (elems[0], fn(elems[0], elems[1]), ...) [N, ...]
+    """
+    num_elems = elems[0].shape[0]
+    if num_elems < 2:
+        return elems
+    # up-sweep: combine adjacent pairs and scan the reduced sequence
+    reduced = fn(tuple(elem[0:-1:2] for elem in elems), tuple(elem[1::2] for elem in elems))
+    odd_elems = associative_scan(fn, tuple(reduced))
+    # down-sweep: the even prefixes combine the preceding odd prefix with the current element
+    if num_elems % 2 == 0:
+        even_elems = fn(tuple(elem[:-1] for elem in odd_elems), tuple(elem[2::2] for elem in elems))
+    else:
+        even_elems = fn(odd_elems, tuple(elem[2::2] for elem in elems))
+    even_elems = [np.concatenate([elem[:1], even]) for elem, even in zip(elems, even_elems)]
+
+    def interleave(even, odd):
+        # even has either the same number of elements as odd, or one more
+        if even.shape[0] > odd.shape[0]:
+            odd = np.concatenate([odd, np.zeros_like(even[:1])])
+            return np.stack([even, odd], axis=1).reshape((-1,) + even.shape[1:])[:-1]
+        return np.stack([even, odd], axis=1).reshape((-1,) + even.shape[1:])
+
+    return tuple(interleave(even, odd) for even, odd in zip(even_elems, odd_elems))
+
+
+def tria(M):
+    """
+    Triangularisation via the QR decomposition, used in square-root filtering.
+    Computes a lower-triangular square root L of M M', i.e. L L' = M M', without forming M M'.
+    :param M: a (possibly non-square) matrix [dim, K], K ≥ dim
+    :return:
+        L: lower-triangular square root of M M' [dim, dim]
+    """
+    _, R = np.linalg.qr(M.T)
+    return R.T
+
+
 def softplus_list(x_):
     """
     Softplus positiviy mapping, used for transforming parameters.
@@ -156,6 +253,135 @@ def input_admin(t, y, r, t_test, y_test, r_test):
             np.array(train_id, dtype=np.int64), np.array(test_id, dtype=np.int64), np.array(mask, dtype=bool))
 
 
+def compress_steps(dt, rtol=1e-9):
+    """
+    Find the unique step sizes in a sequence of steps, so that the discrete-time model matrices need only be
+    computed once per unique step size. Steps that are equal up to a relative tolerance are merged.
+    A zero step is always included as the first unique value, since the smoother's final step uses Δt=0.
+    The table is padded to a power of two length by repeating its last value, so that data sets with similar numbers
+    of unique steps (e.g. the folds of a cross-validation) have the same shapes and share compiled functions.
+    Here we use non-JAX numpy since the steps are static.
+    :param dt: step sizes Δtₙ = tₙ - tₙ₋₁ [N]
+    :param rtol: relative tolerance used to merge step sizes that only differ due to floating point error
+    :return:
+        dt_unique: the unique step sizes [U]
+        dt_index: the index of each step into dt_unique [N]
+    """
+    dt = nnp.concatenate([nnp.array([0.0]), nnp.asarray(dt, dtype=nnp.float64).reshape(-1)])
+    tol = rtol * nnp.maximum(nnp.max(nnp.abs(dt)), 1e-300)
+    _, first_ind, dt_index = nnp.unique(nnp.round(dt / tol), return_index=True, return_inverse=True)
+    dt_unique = dt[first_ind]
+    num_pad = 2 ** int(nnp.ceil(nnp.log2(dt_unique.shape[0]))) - dt_unique.shape[0]
+    dt_unique = nnp.concatenate([dt_unique, nnp.repeat(dt_unique[-1:], num_pad)])
+    return np.array(dt_unique, dtype=np.float64), np.array(dt_index[1:], dtype=np.int64)
+
+
+def stack_steps(steps):
+    """
+    Stack the compressed step sizes of several time series (see compress_steps), padding each table of unique step
+    sizes to a common length by repeating its last value.
+    :param steps: a list of (dt_unique, dt_index) pairs, one per series, with dt_index of the same length N
+    :return:
+        dt_unique: the unique step sizes of each series [B, U]
+        dt_index: the index of each step into dt_unique [B, N]
+    """
+    num_unique = max([dt_unique.shape[0] for dt_unique, _ in steps])
+    dt_unique = [nnp.concatenate([dt_unique, nnp.repeat(dt_unique[-1:], num_unique - dt_unique.shape[0])])
+                 for dt_unique, _ in steps]
+    return np.array(nnp.stack(dt_unique), dtype=np.float64), np.stack([dt_index for _, dt_index in steps])
+
+
+def pad_to_bucket(x, bucket_size, value=None):
+    """
+    Pad the leading (time) axis of x up to the next multiple of bucket_size, so that data sets of similar sizes
+    have the same shapes and share compiled functions.
+    :param x: the array to be padded [N, ...]
+    :param bucket_size: the bucket size [scalar]
+    :param value: the value of the padded elements. If None then the last element of x is repeated
+    :return: the padded array [N + (-N mod bucket_size), ...]
+    """
+    num_pad = -x.shape[0] % bucket_size
+    if value is None:
+        pad = np.repeat(x[-1:], num_pad, axis=0)
+    else:
+        pad = np.full((num_pad,) + x.shape[1:], value, dtype=x.dtype)
+    return np.concatenate([x, pad])
+
+
+def checkpointed_scan(f, init, xs, segment_length=None):
+    """
+    A drop-in replacement for lax.scan(f, init, xs) with bounded memory under reverse-mode differentiation.
+    The time axis is split into segments of segment_length steps, and only the carry at the segment boundaries is
+    stored for the backward pass. The steps inside each segment are recomputed during the backward pass (remat).
+    The memory is then O(N / segment_length + segment_length) steps rather than O(N), i.e. O(√N) for
+    segment_length = √N, at the cost of one extra forward pass. The final segment is padded by repeating the last
+    input, and the padded steps leave the carry unchanged.
+    :param f: the scan step, f(carry, x) -> (carry, output)
+    :param init: the initial carry
+    :param xs: the scan inputs, a pytree of arrays with leading dimension N (None leaves are allowed)
+    :param segment_length: the number of steps per segment. If None then lax.scan is used [scalar]
+    :return:
+        carry: the final carry
+        outputs: the stacked outputs [N, ...]
+    """
+    if segment_length is None:
+        return lax.scan(f, init, xs)
+    N = tree_leaves(xs)[0].shape[0]
+    num_segments = -(-N // segment_length)
+    num_pad = num_segments * segment_length - N
+
+    def split(x):
+        x = np.concatenate([x, np.repeat(x[-1:], num_pad, axis=0)], axis=0)
+        return x.reshape((num_segments, segment_length) + x.shape[1:])
+
+    valid = (nnp.arange(num_segments * segment_length) < N).reshape(num_segments, segment_length)
+
+    def masked_step(carry, inputs):
+        x, valid_n = inputs
+        new_carry, output = f(carry, x)
+        carry = tree_map(lambda new, old: np.where(valid_n, new, old), new_carry, carry)
+        return carry, output
+
+    @remat
+    def segment(carry, inputs):
+        return lax.scan(masked_step, carry, inputs)
+
+    carry, outputs = lax.scan(segment, init, (tree_map(split, xs), valid))
+    outputs = tree_map(lambda x: x.reshape((num_segments * segment_length,) + x.shape[2:])[:N], outputs)
+    return carry, outputs
+
+
+def solve_discrete_riccati(A, H, Q, R, num_iters=30):
+    """
+    Solve the discrete algebraic Riccati equation (DARE) for the steady-state predictive covariance of a
+    time-invariant Kalman filter,
+        P = A P A' - A P H' (H P H' + R)⁻¹ H P A' + Q,
+    using the structure-preserving doubling algorithm, which converges quadratically, i.e. after k iterations
+    the solution is that of the filter after 2ᵏ steps.
+    :param A: the state transition matrix [state_dim, state_dim]
+    :param H: the measurement model [obs_dim, state_dim]
+    :param Q: the process noise covariance [state_dim, state_dim]
+    :param R: the measurement noise covariance [obs_dim, obs_dim]
+    :param num_iters: the number of doubling iterations [scalar]
+    :return:
+        P: the steady-state predictive covariance [state_dim, state_dim]
+    """
+    dim = A.shape[0]
+
+    def doubling_step(carry, _):
+        A_k, G_k, P_k = carry
+        W = np.eye(dim) + G_k @ P_k
+        WA = np.linalg.solve(W, A_k)
+        WG = np.linalg.solve(W, G_k)
+        return (A_k @ WA, G_k + A_k @ WG @ A_k.T, P_k + A_k.T @ P_k @ WA), None
+
+    G = H.T @ solve(R, H)
+    # a scan with a fixed length rather than fori_loop, which lowers to a while_loop that cannot be reverse-mode
+    # differentiated on older versions of JAX
+    (_, _, P), _ = lax.scan(doubling_step, (A.T, 0.5 * (G + G.T), Q), None, length=num_iters)
+    return 0.5 * (P + P.T)
+
+
 def logphi(z):
     """
     Calculate the log Gaussian CDF, used for closed form moment matching when the EP power is 1,
@@ -203,9 +429,10 @@ def gaussian_moment_match(y, m, v, hyp=None):
     return lZ, site_mean, site_var
 
 
-def sample_gaussian_noise(latent_mean, likelihood_cov):
+def sample_gaussian_noise(latent_mean, likelihood_cov, key=None):
+    key = random.PRNGKey(123) if key is None else key
     lik_std, _ = cho_factor(likelihood_cov)
-    gaussian_sample = latent_mean + lik_std * random.normal(random.PRNGKey(123), shape=latent_mean.shape)
+    gaussian_sample = latent_mean + lik_std * random.normal(key, shape=latent_mean.shape)
     return gaussian_sample
 
 
@@ -554,6 +781,80 @@ def symmetric_cubature_fifth_order(dim=1):
     return sigma_pts, weights
 
 
+class CubatureRule(object):
+    """
+    The sigma points and weights of a cubature rule, as a callable of the dimension (the cubature_func argument of
+    the likelihood methods). Rules with the same method and number of points compare equal, so they can be passed
+    as static arguments to jitted functions without a recompilation per approximate inference object.
+    """
+    def __init__(self, intmethod='GH', num_cub_pts=20):
+        if intmethod not in ['GH', 'UT3', 'UT5', 'UT']:
+            raise NotImplementedError('integration method not recognised')
+        self.intmethod = 'UT5' if intmethod == 'UT' else intmethod
+        self.num_cub_pts = num_cub_pts
+
+    def __call__(self, dim):
+        if self.intmethod == 'GH':
+            return gauss_hermite(dim, self.num_cub_pts)  # Gauss-Hermite
+        elif self.intmethod == 'UT3':
+            return symmetric_cubature_third_order(dim)  # Unscented transform (3rd order)
+        else:
+            return symmetric_cubature_fifth_order(dim)  # Unscented transform (5th order)
+
+    def __eq__(self, other):
+        return isinstance(other, CubatureRule) and (self.intmethod, self.num_cub_pts) == (other.intmethod,
+                                                                                         other.num_cub_pts)
+
+    def __hash__(self):
+        return hash((self.intmethod, self.num_cub_pts))
+
+
+def _is_traced(value):
+    """
+    Whether a model attribute is a leaf of the model pytree (arrays, sub-models, and lists / tuples of them), as
+    opposed to a static attribute (strings, numbers, flags, cubature rules, ...) which defines the model structure.
+    """
+    if isinstance(value, (list, tuple)):
+        return len(value) > 0 and all(_is_traced(v) for v in value)
+    return isinstance(value, PytreeModel) or hasattr(value, 'shape')
+
+
+def model_flatten(model):
+    """
+    Flatten a model into its traced attributes (the children) and its static attributes (the auxiliary data).
+    Attributes listed in the model's transient_attributes (e.g. cached results) are left out.
+    """
+    transient = getattr(model, 'transient_attributes', ())
+    attributes = sorted((k, v) for k, v in vars(model).items() if k not in transient)
+    traced_keys = tuple(k for k, v in attributes if _is_traced(v))
+    static = tuple((k, v) for k, v in attributes if not _is_traced(v))
+    return tuple(vars(model)[k] for k in traced_keys), (traced_keys, static)
+
+
+def model_unflatten(cls, aux_data, children):
+    """
+    Rebuild a model from its flattened form, without calling its constructor.
+    """
+    traced_keys, static = aux_data
+    model = object.__new__(cls)
+    model.__dict__.update(static)
+    model.__dict__.update(zip(traced_keys, children))
+    return model
+
+
+class PytreeModel(object):
+    """
+    Base class which registers each model class (priors, likelihoods, approximate inference methods and the SDE-GP
+    itself) as a pytree. The model methods are then jitted with the model as an ordinary (traced) argument rather
+    than a static one: the hyperparameters and data are inputs to the compiled function, and the static attributes
+    define its structure. Models with the same structure and array shapes therefore share compiled executables, so
+    building a new model (e.g. per cross-validation fold) does not trigger a recompilation.
+    """
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        register_pytree_node(cls, model_flatten, partial(model_unflatten, cls))
+
+
 # def sym_set(n, gen=None):
 #     # U = sym_set(n, gen)
 #     nonzero = 0
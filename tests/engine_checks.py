@@ -0,0 +1,81 @@
+import numpy as np
+from sde_gp import SDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+pi = 3.141592653589793
+
+
+def regression_model(N=60, regular=False, test=True, lengthscale=2.0, num_train=None, **kwargs):
+    """
+    A small regression task with a Gaussian likelihood, on either an irregular or a regular grid. If num_train is
+    given, only the first num_train inputs are used for training.
+    """
+    rng = np.random.RandomState(123)
+    if regular:
+        x = np.linspace(0., 0.25 * (N - 1), num=N)
+    else:
+        x = np.sort(np.linspace(-5., 25., num=N) + 0.2 * rng.randn(N))
+    y = np.sin(0.5 * x) + np.cos(0.2 * x + 0.33 * pi) + np.sqrt(0.1) * rng.randn(N)
+    x_test = x[:10] + 0.01 if test else None
+    y_test = y[:10] if test else None
+    prior = priors.Matern52(variance=1.0, lengthscale=lengthscale)
+    lik = likelihoods.Gaussian(variance=0.2)
+    return SDEGP(prior=prior, likelihood=lik, t=x[:num_train], y=y[:num_train], t_test=x_test, y_test=y_test,
+                 approx_inf=approx_inf.EP(), **kwargs)
+
+
+def spatial_model(num_time=30, num_space=4, fixed_grid=True, counts=True, **kwargs):
+    """
+    A small spatio-temporal task on a spatial grid, either with count data and a Poisson likelihood, or with a
+    Gaussian likelihood.
+    """
+    rng = np.random.RandomState(123)
+    t = np.linspace(0., 10., num=num_time)
+    z = np.linspace(-2., 2., num=num_space)
+    r = np.tile(z, (num_time, 1))
+    f = np.sin(t)[:, None] * np.cos(z)[None, :]
+    prior = priors.SpatioTemporalMatern52(variance=1.0, lengthscale_time=2.0, lengthscale_space=1.5, z=z,
+                                          fixed_grid=fixed_grid)
+    if counts:
+        y = rng.poisson(np.exp(f)).astype(float)
+        lik = likelihoods.Poisson()
+    else:
+        y = f + np.sqrt(0.1) * rng.randn(num_time, num_space)
+        lik = likelihoods.Gaussian(variance=0.2)
+    return SDEGP(prior=prior, likelihood=lik, t=t, y=y, r=r, approx_inf=approx_inf.ExtendedKalmanSmoother(),
+                 **kwargs)
+
+
+def assert_tree_close(actual, desired, rtol=1e-6, atol=1e-8):
+    if desired is None:
+        assert actual is None
+        return
+    for a, d in zip(actual, desired):
+        np.testing.assert_allclose(np.asarray(a), np.asarray(d), rtol=rtol, atol=atol)
+
+
+def assert_engine_matches_default(build, rtol=1e-6, atol=1e-8, **engine):
+    """
+    Check the energy, its gradient and the posterior of an alternative engine against the default filter and
+    smoother, both for a fresh model (no sites) and after the sites have been set by run().
+    """
+    reference, model = build(), build(**engine)
+    energy, gradients = model.neg_log_marg_lik()
+    reference_energy, reference_gradients = reference.neg_log_marg_lik()
+    assert np.isfinite(float(reference_energy))
+    np.testing.assert_allclose(float(energy), float(reference_energy), rtol=rtol)
+    assert_tree_close(gradients, reference_gradients, rtol, atol)
+    assert_tree_close(model.predict(compute_nlpd=False)[:2], reference.predict(compute_nlpd=False)[:2], rtol, atol)
+    for m in (reference, model):
+        m.run()
+    energy, gradients = model.run()
+    reference_energy, reference_gradients = reference.run()
+    np.testing.assert_allclose(float(energy), float(reference_energy), rtol=rtol)
+    assert_tree_close(gradients, reference_gradients, rtol, atol)
+    assert_tree_close(model.sites.site_params, reference.sites.site_params, rtol, atol)
+    energy, gradients = model.neg_log_marg_lik()
+    reference_energy, reference_gradients = reference.neg_log_marg_lik()
+    np.testing.assert_allclose(float(energy), float(reference_energy), rtol=rtol)
+    assert_tree_close(gradients, reference_gradients, rtol, atol)
+    assert_tree_close(model.predict(compute_nlpd=False)[:2], reference.predict(compute_nlpd=False)[:2], rtol, atol)
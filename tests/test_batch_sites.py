@@ -0,0 +1,20 @@
+import numpy as np
+from engine_checks import regression_model, spatial_model, assert_tree_close
+
+
+def check_batch_sites(build):
+    sequential, batched = build(), build()
+    for _ in range(3):
+        energy, gradients = sequential.run()
+        batched_energy, batched_gradients = batched.run(batch_sites=True)
+        np.testing.assert_allclose(float(batched_energy), float(energy), rtol=1e-8)
+        assert_tree_close(batched_gradients, gradients)
+        assert_tree_close(batched.sites.site_params, sequential.sites.site_params)
+
+
+def test_batch_sites_matches_sequential_updates():
+    check_batch_sites(lambda: regression_model(test=False))
+
+
+def test_batch_sites_matches_sequential_updates_for_spatial_counts():
+    check_batch_sites(spatial_model)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from sde_gp import SDEGP, BatchedSDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+
+B, N = 3, 40
+rng = np.random.RandomState(0)
+t = np.sort(10. * rng.rand(B, N, 1), axis=1)
+y = np.sin(t) + 0.3 * rng.randn(B, N, 1)
+y[1, -5:] = np.nan  # the second series is shorter
+t_test = np.sort(10. * rng.rand(B, 7, 1), axis=1)
+y_test = np.sin(t_test)
+
+
+def build(t_, y_, t_test_, y_test_, batched=False, **kwargs):
+    prior = priors.Matern32(variance=1.0, lengthscale=1.0)
+    lik = likelihoods.Gaussian(variance=0.5)
+    model = BatchedSDEGP if batched else SDEGP
+    return model(prior=prior, likelihood=lik, t=t_, y=y_, t_test=t_test_, y_test=y_test_, approx_inf=approx_inf.EP(),
+                 **kwargs)
+
+
+def separate_models():
+    models = []
+    for b in range(B):
+        observed = ~np.isnan(y[b, :, 0])
+        models.append(build(t[b][observed], y[b][observed], t_test[b], y_test[b]))
+    return models
+
+
+@pytest.mark.parametrize('num_devices', [None, 1])
+def test_batched_energy_and_gradients_match_separate_models(num_devices):
+    models = separate_models()
+    shared = build(t, y, t_test, y_test, batched=True, num_devices=num_devices)
+    separate = build(t, y, t_test, y_test, batched=True, shared_hyp=False, num_devices=num_devices)
+    for _ in range(2):  # without and then with sites
+        energies, gradients = zip(*[m.run() for m in models])
+        energy, (prior_gradients, lik_gradients) = shared.run()
+        # the energy is the sum of the energies, so the gradient of shared hyperparameters is the sum of the gradients
+        np.testing.assert_allclose(float(energy), float(sum(energies)), rtol=1e-8)
+        np.testing.assert_allclose(np.asarray(prior_gradients), np.sum([g[0] for g in gradients], axis=0), rtol=1e-6)
+        np.testing.assert_allclose(np.asarray(lik_gradients), np.sum([g[1] for g in gradients], axis=0), rtol=1e-6)
+        # and each series' own hyperparameters have the gradient of its own energy
+        energy, (prior_gradients, lik_gradients) = separate.run()
+        np.testing.assert_allclose(float(energy), float(sum(energies)), rtol=1e-8)
+        np.testing.assert_allclose(np.asarray(prior_gradients), np.stack([g[0] for g in gradients]), rtol=1e-6)
+        np.testing.assert_allclose(np.asarray(lik_gradients), np.stack([g[1] for g in gradients]), rtol=1e-6)
+    nlpd = separate.predict()[3]
+    np.testing.assert_allclose(np.asarray(nlpd), [float(m.predict()[3]) for m in models], rtol=1e-6)
@@ -0,0 +1,25 @@
+import numpy as np
+from sde_gp import SDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+
+
+def test_bridge_predict_matches_predict():
+    rng = np.random.RandomState(123)
+    x = np.sort(np.linspace(0., 20., num=50) + 0.1 * rng.randn(50))
+    y = np.sin(0.5 * x) + np.sqrt(0.1) * rng.randn(50)
+    # test inputs before, at, between and after the training inputs
+    x_test = np.array([-3., -0.5, x[0], 3.03, x[20], 11.11, x[-1], x[-1] + 0.7, 25.])
+    model = SDEGP(prior=priors.Matern52(variance=1.0, lengthscale=2.0), likelihood=likelihoods.Gaussian(variance=0.2),
+                  t=x, y=y, t_test=x_test, y_test=np.zeros_like(x_test), approx_inf=approx_inf.EP())
+    model.run()
+    model.run()
+    posterior_mean, posterior_var, _, _ = model.predict(compute_nlpd=False)
+    # predict() returns the training and test inputs in sorted order
+    order = np.argsort(x_test, kind='stable')
+    bridge_mean, bridge_var = model.bridge_predict(x_test[order])
+    np.testing.assert_allclose(np.asarray(bridge_mean).reshape(-1),
+                               np.asarray(posterior_mean)[model.test_id].reshape(-1), rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(np.asarray(bridge_var).reshape(-1),
+                               np.asarray(posterior_var)[model.test_id].reshape(-1), rtol=1e-6, atol=1e-8)
@@ -0,0 +1,11 @@
+from functools import partial
+from engine_checks import regression_model, spatial_model, assert_engine_matches_default
+
+
+def test_bucketing_matches_default():
+    # 60 training and 10 test inputs are padded to 64 and 80 steps
+    assert_engine_matches_default(partial(regression_model, N=60), bucket_size=16)
+
+
+def test_bucketing_matches_default_for_spatial_counts():
+    assert_engine_matches_default(spatial_model, bucket_size=16)
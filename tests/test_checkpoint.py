@@ -0,0 +1,10 @@
+from engine_checks import regression_model, assert_engine_matches_default
+
+
+def test_checkpointed_filter_matches_default():
+    # a segment length which does not divide the number of steps, so the last segment is padded
+    assert_engine_matches_default(regression_model, segment_length=7)
+
+
+def test_checkpointed_filter_sqrt_segments_matches_default():
+    assert_engine_matches_default(regression_model, segment_length='sqrt')
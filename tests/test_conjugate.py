@@ -0,0 +1,52 @@
+import numpy as np
+from engine_checks import regression_model
+
+
+def softplus(x):
+    return np.log(1. + np.exp(x))
+
+
+def dense_energy(model, params):
+    # -log 𝓝(y|0,K+σ²I) for the Matern-5/2 prior, computed directly
+    variance, lengthscale = softplus(np.asarray(params[0]))
+    noise = softplus(np.asarray(params[1]))
+    t, y = np.asarray(model.t_train)[:, 0], np.asarray(model.y_train)[:, 0]
+    r = np.sqrt(5.) * np.abs(t[:, None] - t[None]) / lengthscale
+    K = variance * (1. + r + r ** 2 / 3.) * np.exp(-r) + noise * np.eye(t.shape[0])
+    _, logdet = np.linalg.slogdet(K)
+    return 0.5 * (y @ np.linalg.solve(K, y) + logdet + t.shape[0] * np.log(2 * np.pi))
+
+
+def test_conjugate_energy_and_gradient():
+    model = regression_model(conjugate=True)
+    params = [np.asarray(model.prior.hyp), np.asarray(model.likelihood.hyp)]
+    energy, (prior_gradient, lik_gradient) = model.run(params)
+    np.testing.assert_allclose(float(energy), dense_energy(model, params), rtol=1e-8)
+    # central finite differences of the energy w.r.t. the (unconstrained) likelihood hyperparameter
+    eps = 1e-5
+    energy_plus = model.run([params[0], params[1] + eps])[0]
+    energy_minus = model.run([params[0], params[1] - eps])[0]
+    np.testing.assert_allclose(float(lik_gradient), (float(energy_plus) - float(energy_minus)) / (2 * eps), rtol=1e-5)
+    dense_gradient = (dense_energy(model, [params[0], params[1] + eps])
+                      - dense_energy(model, [params[0], params[1] - eps])) / (2 * eps)
+    np.testing.assert_allclose(float(lik_gradient), dense_gradient, rtol=1e-5)
+    for i in range(params[0].shape[0]):
+        shift = eps * np.eye(params[0].shape[0])[i]
+        dense_gradient = (dense_energy(model, [params[0] + shift, params[1]])
+                          - dense_energy(model, [params[0] - shift, params[1]])) / (2 * eps)
+        np.testing.assert_allclose(float(prior_gradient[i]), dense_gradient, rtol=1e-5)
+
+
+def test_conjugate_matches_converged_sites():
+    conjugate, sites = regression_model(conjugate=True), regression_model()
+    for _ in range(3):  # with a Gaussian likelihood, EP converges to the exact sites
+        energy, (sites_prior_gradient, sites_lik_gradient) = sites.run()
+    conjugate_energy, (prior_gradient, lik_gradient) = conjugate.run()
+    np.testing.assert_allclose(float(conjugate_energy), float(energy), rtol=1e-8)
+    np.testing.assert_allclose(np.asarray(prior_gradient), np.asarray(sites_prior_gradient), rtol=1e-6)
+    # the likelihood gradient of the site-based energy holds the sites fixed, even though the exact sites depend on
+    # the noise, so only the conjugate mode gives the gradient of the marginal likelihood w.r.t. the noise
+    assert not np.allclose(np.asarray(lik_gradient), np.asarray(sites_lik_gradient), rtol=1e-2)
+    posterior, conjugate_posterior = sites.predict(), conjugate.predict()
+    for i in (0, 1, 3):
+        np.testing.assert_allclose(np.asarray(conjugate_posterior[i]), np.asarray(posterior[i]), rtol=1e-6, atol=1e-8)
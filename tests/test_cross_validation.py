@@ -0,0 +1,28 @@
+import numpy as np
+from sde_gp import SDEGP, CrossValidatedSDEGP
+import approximate_inference as approx_inf
+import priors
+import likelihoods
+
+N, F = 60, 3
+rng = np.random.RandomState(123)
+x = np.sort(np.linspace(-5., 25., num=N) + 0.2 * rng.randn(N))
+y = np.sin(0.5 * x) + np.cos(0.2 * x + 0.33 * np.pi) + np.sqrt(0.1) * rng.randn(N)
+folds = rng.permutation(N).reshape(F, N // F)
+
+
+def build(model, *args, **kwargs):
+    prior = priors.Matern52(variance=1.0, lengthscale=2.0)
+    lik = likelihoods.Gaussian(variance=0.2)
+    return model(prior, lik, *args, approx_inf=approx_inf.EP(), **kwargs)
+
+
+def test_cross_validation_matches_separate_folds():
+    nlpd = []
+    for test in folds:
+        train = np.setdiff1d(np.arange(N), test)
+        model = build(SDEGP, x[train], y[train], t_test=x[test], y_test=y[test])
+        model.train(num_iters=10, chunk_size=5)
+        nlpd.append(float(model.predict()[3]))
+    cross_validated = build(CrossValidatedSDEGP, x, y, folds)
+    np.testing.assert_allclose(np.asarray(cross_validated.cross_validate(num_iters=10, chunk_size=5)), nlpd, rtol=1e-6)
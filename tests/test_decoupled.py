@@ -0,0 +1,14 @@
+from functools import partial
+import pytest
+from engine_checks import spatial_model, assert_engine_matches_default
+
+
+def test_decoupled_matches_default():
+    # the decoupled engine requires a Gaussian likelihood on a fixed grid, for which the sites are exact
+    assert_engine_matches_default(partial(spatial_model, counts=False, conjugate=True), decoupled=True)
+
+
+def test_decoupled_requires_exact_sites():
+    # otherwise the site covariances (e.g. damped or power EP sites) would be silently replaced by σ²I
+    with pytest.raises(NotImplementedError):
+        spatial_model(counts=False, decoupled=True)
@@ -0,0 +1,40 @@
+import numpy as np
+from jax.experimental import optimizers
+from engine_checks import regression_model
+
+
+def test_fit_log_matches_manual_loop():
+    model, reference = regression_model(test=False), regression_model(test=False)
+    fit_log = model.fit(num_iters=5, energy_tol=0., site_tol=0.)
+    assert [entry['iter'] for entry in fit_log] == list(range(5))
+    assert all(set(entry) == {'iter', 'time', 'energy', 'site_delta'} for entry in fit_log)
+    assert all(entry['time'] > 0. for entry in fit_log)
+    assert fit_log[0]['site_delta'] == np.inf  # the sites did not exist before the first sweep
+    # the same sweeps by hand: run() followed by an Adam step
+    opt_init, opt_update, get_params = optimizers.adam(step_size=5e-2)
+    opt_state = opt_init([reference.prior.hyp, reference.likelihood.hyp])
+    for i, entry in enumerate(fit_log):
+        prev_sites = reference.sites.site_params
+        energy, gradients = reference.run(get_params(opt_state))
+        opt_state = opt_update(i, gradients, opt_state)
+        np.testing.assert_allclose(entry['energy'], float(energy), rtol=1e-10)
+        if i > 0:
+            site_delta = max(np.max(np.abs(np.asarray(reference.sites.site_params[j] - prev_sites[j])))
+                             for j in range(2))
+            np.testing.assert_allclose(entry['site_delta'], site_delta, rtol=1e-10)
+    for fitted, expected in zip([model.prior.hyp, model.likelihood.hyp], get_params(opt_state)):
+        np.testing.assert_allclose(np.asarray(fitted), np.asarray(expected), rtol=1e-10)
+
+
+def test_fit_stops_early_once_converged():
+    model = regression_model(test=False)
+    energy_tol, site_tol = 1e-3, 1e-2
+    fit_log = model.fit(num_iters=200, energy_tol=energy_tol, site_tol=site_tol)
+    assert len(fit_log) < 200
+    last, previous = fit_log[-1], fit_log[-2]
+    assert abs(last['energy'] - previous['energy']) <= energy_tol * (1. + abs(last['energy']))
+    assert last['site_delta'] <= site_tol
+    # and not before: every earlier sweep fails one of the tests
+    for entry, prev in zip(fit_log[1:-1], fit_log[:-2]):
+        assert (abs(entry['energy'] - prev['energy']) > energy_tol * (1. + abs(entry['energy']))
+                or entry['site_delta'] > site_tol)
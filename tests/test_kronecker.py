@@ -0,0 +1,12 @@
+from functools import partial
+from engine_checks import spatial_model, assert_engine_matches_default
+
+
+def test_kronecker_matches_default():
+    assert_engine_matches_default(partial(spatial_model, fixed_grid=False), kronecker=True)
+
+
+def test_kronecker_matches_default_with_padding():
+    # the smoother re-forms the filter's updates, so it must skip the same (masked) padding steps
+    assert_engine_matches_default(partial(spatial_model, fixed_grid=False, bucket_size=16),
+                                  kronecker=True)
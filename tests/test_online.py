@@ -0,0 +1,25 @@
+import numpy as np
+from engine_checks import regression_model
+
+
+def test_online_update_matches_kalman_filter():
+    N = 60
+    model = regression_model(N=N, test=False)
+    online = regression_model(N=N, test=False, num_train=N // 2)
+    t, y = np.array(model.t_train[:, 0]), np.array(model.y_train)
+    # feed the second half of the data in micro-batches of different sizes, including a single point
+    for start, stop in [(N // 2, N // 2 + 1), (N // 2 + 1, N // 2 + 8), (N // 2 + 8, N)]:
+        neg_log_marg_lik, filter_mean, filter_cov = online.online_update(t[start:stop], y[start:stop])
+    params = [model.prior.hyp, model.likelihood.hyp]
+    y_, dt, r, mask, steps = model.train_inputs
+    energy, (filtered_mean, filtered_cov, _) = model.kalman_filter(y_, dt, params, True, mask, None, r, steps)
+    np.testing.assert_allclose(float(neg_log_marg_lik), float(energy), rtol=1e-8)
+    np.testing.assert_allclose(np.asarray(filter_mean), np.asarray(filtered_mean[-1]), rtol=1e-6, atol=1e-10)
+    np.testing.assert_allclose(np.asarray(filter_cov), np.asarray(filtered_cov[-1]), rtol=1e-6, atol=1e-10)
+
+
+def test_online_reset_matches_energy_after_run():
+    model = regression_model(N=40, test=False)
+    model.run()
+    model.run()
+    np.testing.assert_allclose(float(model.online_reset()), float(model.neg_log_marg_lik()[0]), rtol=1e-8)
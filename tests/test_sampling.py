@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from engine_checks import regression_model
+
+num_samps = 4000
+
+
+def check_sample_moments(samples, mean, var):
+    # with 4000 samples the sample mean is within 5 standard errors, and the sample variance within ~12%
+    sample_mean, sample_var = np.mean(samples, axis=-1), np.var(samples, axis=-1)
+    assert np.all(np.abs(sample_mean - mean) < 5. * np.sqrt(var / num_samps))
+    np.testing.assert_allclose(sample_var / var, 1., atol=0.12)
+
+
+@pytest.mark.parametrize('engine', [{}, {'square_root': True}, {'parallel': True}])
+def test_ffbs_sample_matches_posterior(engine):
+    model = regression_model(**engine)
+    model.run()
+    model.run()
+    posterior_mean, posterior_var, _, _ = model.predict(compute_nlpd=False)
+    posterior_mean, posterior_var = np.asarray(posterior_mean[:, 0, 0]), np.asarray(posterior_var[:, 0, 0])
+    samples = np.asarray(model.ffbs_sample(num_samps, seed=3))
+    check_sample_moments(samples[:, 0], posterior_mean, posterior_var)
+    np.testing.assert_array_equal(np.asarray(model.ffbs_sample(num_samps, seed=3)), samples)  # seeded
+    # at query inputs, the samples are those of the test inputs, returned in order of increasing input
+    test_id = np.asarray(model.test_id)
+    t_query = np.asarray(model.t_all)[test_id][::-1]
+    query_samples = np.asarray(model.ffbs_sample(num_samps, t_query=t_query, seed=3))
+    check_sample_moments(query_samples[:, 0], posterior_mean[test_id], posterior_var[test_id])
+
+
+def test_posterior_sample_matches_posterior():
+    model = regression_model()
+    model.run()
+    model.run()
+    posterior_mean, posterior_var, _, _ = model.predict(compute_nlpd=False)
+    samples = np.asarray(model.posterior_sample(num_samps, seed=2))
+    check_sample_moments(samples[:, 0], np.asarray(posterior_mean[:, 0, 0]), np.asarray(posterior_var[:, 0, 0]))
+    np.testing.assert_array_equal(np.asarray(model.posterior_sample(num_samps, seed=2)), samples)
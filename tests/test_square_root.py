@@ -0,0 +1,5 @@
+from engine_checks import regression_model, assert_engine_matches_default
+
+
+def test_square_root_matches_default():
+    assert_engine_matches_default(regression_model, square_root=True)
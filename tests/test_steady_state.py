@@ -0,0 +1,13 @@
+from engine_checks import regression_model, assert_engine_matches_default
+
+
+def test_steady_state_matches_default():
+    assert_engine_matches_default(lambda **kw: regression_model(N=200, regular=True, test=False, **kw),
+                                  steady_state=True)
+
+
+def test_steady_state_slow_convergence_matches_default():
+    # a long lengthscale relative to the grid, so the covariance has not converged for most of the steps
+    assert_engine_matches_default(lambda **kw: regression_model(N=200, regular=True, test=False, lengthscale=50.,
+                                                                **kw),
+                                  steady_state=True)
@@ -0,0 +1,27 @@
+import numpy as np
+from engine_checks import regression_model, spatial_model
+
+
+def check_train_matches_fit(build, warm_start, rtol):
+    fitted, trained = build(), build()
+    if warm_start:
+        fitted.run()
+        trained.run()
+    fit_log = fitted.fit(num_iters=20, energy_tol=0., site_tol=0.)
+    energies = trained.train(num_iters=20, chunk_size=8)  # chunks of different lengths
+    np.testing.assert_allclose(energies, [entry['energy'] for entry in fit_log], rtol=rtol)
+    for hyp, trained_hyp in zip([fitted.prior.hyp, fitted.likelihood.hyp], [trained.prior.hyp, trained.likelihood.hyp]):
+        np.testing.assert_allclose(np.asarray(trained_hyp), np.asarray(hyp), rtol=100 * rtol, atol=100 * rtol)
+
+
+def test_train_matches_fit_from_existing_sites():
+    check_train_matches_fit(lambda: regression_model(test=False), True, 1e-8)
+    check_train_matches_fit(spatial_model, True, 1e-8)
+
+
+def test_train_matches_fit_from_new_sites():
+    # without sites, train() initialises them with a filtering pass and then holds them fixed in its first step,
+    # whereas the first run() of fit() differentiates through the sites computed within the filter, so the first
+    # likelihood gradients differ and the trajectories drift apart slightly (by ~1e-2 in the energy after 20 steps)
+    check_train_matches_fit(lambda: regression_model(test=False), False, 5e-3)
+    check_train_matches_fit(spatial_model, False, 5e-3)